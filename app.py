@@ -1,13 +1,39 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, session
+from flask import Flask, render_template, redirect, url_for, request, flash, session, g, abort, jsonify
+from flask import has_request_context, before_render_template, template_rendered
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_wtf import FlaskForm
+from flask_wtf.csrf import generate_csrf
+from werkzeug.middleware.proxy_fix import ProxyFix
 from wtforms import StringField, PasswordField, SubmitField, TextAreaField, DateTimeField
 from wtforms.validators import DataRequired, Length, EqualTo
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 import functools
+import click
+import atexit
+import hmac
+import math
+from collections import Counter
+from pageviews import PageViewBuffer
+from comments import CommentQueue, DuplicateFilter, Moderator, RateLimiter, fingerprint
+from hyperloglog import HyperLogLog
+from spacesaving import SpaceSaving
+from migrations import upgrade
+from pagination import keyset_paginate
+from htmltext import make_excerpt
+from pagecache import PageCache
+from datacache import DataCache, SQLInvalidationLog
+from instrumentation import RequestStats, RequestMetrics, SlowRequestLog
+import search
+import tagging
+import related
+import retention
+import rendering
+import toplists
 
 # 加载环境变量
 load_dotenv()
@@ -18,10 +44,100 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['PERMANENT_SESSION_LIFETIME'] = 2678400  # 31天
+# 应用前面可信的反向代理层数（如只有Nginx时为1）。大于0时按X-Forwarded-For/-Proto/-Host取客户端地址、
+# 协议和主机名，评论限流和访问统计才能区分读者；直接对外提供服务时必须为0，否则客户端可以伪造地址
+app.config['TRUSTED_PROXY_HOPS'] = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+if app.config['TRUSTED_PROXY_HOPS']:
+    hops = app.config['TRUSTED_PROXY_HOPS']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+# 数据库连接池配置，多线程worker中每个线程同时最多占用一个连接
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 10))
+app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+# SQLite连接参数：WAL模式下读写互不阻塞，写入冲突时等待busy_timeout毫秒
+app.config['SQLITE_WAL'] = os.getenv('SQLITE_WAL', '1') == '1'
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+if app.config['SQLALCHEMY_DATABASE_URI'] not in (None, 'sqlite://', 'sqlite:///:memory:'):
+    # 内存数据库只能使用单连接池，不设置连接池大小
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': app.config['DB_POOL_SIZE'],
+        'max_overflow': app.config['DB_MAX_OVERFLOW'],
+        'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+    }
+# 列表分页配置
+app.config['POSTS_PER_PAGE'] = int(os.getenv('POSTS_PER_PAGE', 12))
+app.config['ADMIN_POSTS_PER_PAGE'] = int(os.getenv('ADMIN_POSTS_PER_PAGE', 20))
+app.config['SEARCH_RESULTS_PER_PAGE'] = int(os.getenv('SEARCH_RESULTS_PER_PAGE', 10))
+app.config['COMMENTS_PER_PAGE'] = int(os.getenv('COMMENTS_PER_PAGE', 20))
+# 页面缓存配置
+app.config['PAGE_CACHE_ENABLED'] = os.getenv('PAGE_CACHE_ENABLED', '1') == '1'
+app.config['PAGE_CACHE_MAX_ENTRIES'] = int(os.getenv('PAGE_CACHE_MAX_ENTRIES', 1000))
+app.config['PAGE_CACHE_MAX_BYTES'] = int(os.getenv('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+app.config['PAGE_CACHE_TTL'] = int(os.getenv('PAGE_CACHE_TTL', 300))  # 共享失效记录不可用时其他进程缓存的最长有效期
+# 分类列表、热门标签和登录用户等小数据的进程内缓存
+app.config['DATA_CACHE_ENABLED'] = os.getenv('DATA_CACHE_ENABLED', '1') == '1'
+app.config['DATA_CACHE_TTL'] = int(os.getenv('DATA_CACHE_TTL', 300))
+# sqlite：通过cache_invalidation表在多个进程（包括执行flask命令的进程）间同步数据缓存和页面缓存的失效；
+# local：只在进程内失效
+app.config['DATA_CACHE_BACKEND'] = os.getenv('DATA_CACHE_BACKEND', 'sqlite')
+app.config['DATA_CACHE_CHECK_INTERVAL'] = float(os.getenv('DATA_CACHE_CHECK_INTERVAL', 1.0))
+# 静态导出时为True，只在导出进程中设置
+app.config['STATIC_EXPORT'] = False
+# 访问统计配置
+app.config['TRACK_PAGE_VIEWS'] = os.getenv('TRACK_PAGE_VIEWS', '1') == '1'
+app.config['PAGE_VIEW_ASYNC'] = os.getenv('PAGE_VIEW_ASYNC', '1') == '1'
+app.config['PAGE_VIEW_QUEUE_SIZE'] = int(os.getenv('PAGE_VIEW_QUEUE_SIZE', 10000))
+app.config['PAGE_VIEW_BATCH_SIZE'] = int(os.getenv('PAGE_VIEW_BATCH_SIZE', 500))
+app.config['PAGE_VIEW_FLUSH_INTERVAL'] = float(os.getenv('PAGE_VIEW_FLUSH_INTERVAL', 1.0))
+# 一批记录写入失败后的重试次数和首次重试前等待的秒数（之后每次加倍）
+app.config['PAGE_VIEW_WRITE_RETRIES'] = int(os.getenv('PAGE_VIEW_WRITE_RETRIES', 2))
+app.config['PAGE_VIEW_RETRY_DELAY'] = float(os.getenv('PAGE_VIEW_RETRY_DELAY', 0.2))
+app.config['UV_SKETCH_ERROR'] = float(os.getenv('UV_SKETCH_ERROR', 0.02))  # UV估算的标准误差
+# 热门页面、文章、来源和浏览器的流式统计：每天每个维度保留的计数器数，增量保存到数据库的间隔秒数
+app.config['PAGE_VIEW_TOP_CAPACITY'] = int(os.getenv('PAGE_VIEW_TOP_CAPACITY', 200))
+app.config['PAGE_VIEW_TOP_SNAPSHOT_INTERVAL'] = float(os.getenv('PAGE_VIEW_TOP_SNAPSHOT_INTERVAL', 60))
+# 访问记录保留配置：超过保留天数的原始记录导出到归档目录后删除，汇总表不受影响
+app.config['PAGE_VIEW_RETENTION_DAYS'] = int(os.getenv('PAGE_VIEW_RETENTION_DAYS', 90))
+app.config['PAGE_VIEW_ARCHIVE_DIR'] = os.getenv('PAGE_VIEW_ARCHIVE_DIR', 'archive/page_views')
+app.config['PAGE_VIEW_PURGE_BATCH_SIZE'] = int(os.getenv('PAGE_VIEW_PURGE_BATCH_SIZE', 2000))
+# 评论提交配置：按IP和会话限流（每分钟条数和突发条数，0为不限制），重复检测和审核后批量写入
+app.config['COMMENT_ASYNC'] = os.getenv('COMMENT_ASYNC', '1') == '1'
+app.config['COMMENT_QUEUE_SIZE'] = int(os.getenv('COMMENT_QUEUE_SIZE', 1000))
+app.config['COMMENT_BATCH_SIZE'] = int(os.getenv('COMMENT_BATCH_SIZE', 50))
+app.config['COMMENT_FLUSH_INTERVAL'] = float(os.getenv('COMMENT_FLUSH_INTERVAL', 0.2))
+app.config['COMMENT_RATE_PER_MINUTE'] = float(os.getenv('COMMENT_RATE_PER_MINUTE', 6))
+app.config['COMMENT_RATE_BURST'] = int(os.getenv('COMMENT_RATE_BURST', 3))
+app.config['COMMENT_IP_RATE_PER_MINUTE'] = float(os.getenv('COMMENT_IP_RATE_PER_MINUTE', 30))
+app.config['COMMENT_IP_RATE_BURST'] = int(os.getenv('COMMENT_IP_RATE_BURST', 10))
+app.config['COMMENT_DUPLICATE_WINDOW'] = int(os.getenv('COMMENT_DUPLICATE_WINDOW', 3600))  # 秒，0为不检测
+app.config['COMMENT_MAX_LINKS'] = int(os.getenv('COMMENT_MAX_LINKS', 2))
+app.config['COMMENT_BLOCKED_WORDS'] = [
+    word.strip() for word in os.getenv('COMMENT_BLOCKED_WORDS', '').split(',') if word.strip()
+]
+# 性能统计配置
+app.config['INSTRUMENTATION_ENABLED'] = os.getenv('INSTRUMENTATION_ENABLED', '1') == '1'
+app.config['SERVER_TIMING'] = os.getenv('SERVER_TIMING', '1') == '1'  # 在响应头中输出各阶段耗时
+app.config['SLOW_REQUEST_MS'] = float(os.getenv('SLOW_REQUEST_MS', 500))
+app.config['SLOW_REQUEST_LOG'] = os.getenv('SLOW_REQUEST_LOG', 'logs/slow_requests.log')  # 为空时写入应用日志
+app.config['SLOW_REQUEST_LOG_MAX_BYTES'] = int(os.getenv('SLOW_REQUEST_LOG_MAX_BYTES', 10 * 1024 * 1024))
+app.config['SLOW_REQUEST_LOG_BACKUPS'] = int(os.getenv('SLOW_REQUEST_LOG_BACKUPS', 5))
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')  # 设置后可用Bearer令牌访问/admin/metrics
 
 # 初始化数据库
 db = SQLAlchemy(app)
 
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """连接池每新建一个SQLite连接时设置连接参数"""
+    cursor = dbapi_connection.cursor()
+    if app.config['SQLITE_WAL']:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        # WAL模式下NORMAL不会损坏数据库，只在断电时可能丢失最后提交的事务
+        cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={app.config["SQLITE_BUSY_TIMEOUT"]:d}')
+    cursor.execute(f'PRAGMA mmap_size={app.config["SQLITE_MMAP_SIZE"]:d}')
+    cursor.close()
+
 # 初始化登录管理器
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -53,6 +169,29 @@ class Post(db.Model):
     slug = db.Column(db.String(200), unique=True, nullable=False)
     category = db.Column(db.String(100), nullable=True)
     tags = db.Column(db.String(200), nullable=True)
+    excerpt = db.Column(db.String(300), nullable=True)  # 保存时生成的纯文本摘要
+    comment_count = db.Column(db.Integer, default=0, nullable=False)  # 发表评论时在同一事务中更新
+    # 保存时预渲染的正文（清理、目录、图片懒加载），content_hash为渲染规则版本和正文的哈希
+    rendered_html = db.Column(db.Text, nullable=True)
+    content_hash = db.Column(db.String(50), nullable=True)
+    reading_time = db.Column(db.Integer, nullable=True)  # 预计阅读分钟数
+    __table_args__ = (
+        db.Index('ix_post_category_created_at', 'category', 'created_at'),
+        db.Index('ix_post_created_at', 'created_at'),
+    )
+
+    @property
+    def tag_names(self):
+        return tagging.parse_tags(self.tags)
+
+    def render_content(self):
+        """正文变化或渲染规则变化时重新渲染，需在保存前调用"""
+        if self.content_hash == rendering.content_hash(self.content):
+            return
+        rendered = rendering.render(self.content, app.static_folder)
+        self.rendered_html = rendered.html
+        self.reading_time = rendered.reading_time
+        self.content_hash = rendered.content_hash
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -61,14 +200,105 @@ class Comment(db.Model):
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
     post = db.relationship('Post', backref=db.backref('comments', lazy=True))
     author = db.Column(db.String(100), nullable=False)
+    __table_args__ = (
+        db.Index('ix_comment_post_id_created_at', 'post_id', 'created_at'),
+    )
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    post_count = db.Column(db.Integer, default=0, nullable=False)  # 文章保存和删除时增量维护
+    __table_args__ = (
+        db.Index('ix_tag_post_count', 'post_count'),
+    )
+
+class PostTag(db.Model):
+    # 文章与标签的多对多关联，冗余文章的发布时间以便标签页按索引分页
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (
+        db.Index('ix_post_tag_tag_id_created_at', 'tag_id', 'created_at', 'post_id'),
+        db.Index('ix_post_tag_post_id', 'post_id'),
+    )
+
+class PostKeyword(db.Model):
+    # 相关文章计算用的文章特征（标签和正文关键词）及归一化后的权重
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    term = db.Column(db.String(100), primary_key=True)
+    weight = db.Column(db.Float, nullable=False)
+    __table_args__ = (
+        db.Index('ix_post_keyword_term', 'term', 'post_id', 'weight'),
+    )
+
+class RelatedPost(db.Model):
+    # 预计算的相关文章，每篇文章保存得分最高的若干篇
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    related_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    __table_args__ = (
+        db.Index('ix_related_post_related_id', 'related_id'),
+    )
+
+class UserAgent(db.Model):
+    # 访问记录中User-Agent的字典表，page_view只保存id
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.String(500), unique=True, nullable=False)
+
+class PageUrl(db.Model):
+    # 访问记录中URL的字典表
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.String(500), unique=True, nullable=False)
 
 class PageView(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     ip_address = db.Column(db.String(100), nullable=False)
-    user_agent = db.Column(db.String(500), nullable=True)
-    url = db.Column(db.String(500), nullable=False)
+    user_agent_id = db.Column(db.Integer, db.ForeignKey('user_agent.id'), nullable=True)
+    url_id = db.Column(db.Integer, db.ForeignKey('page_url.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     session_id = db.Column(db.String(200), nullable=True)
+    __table_args__ = (
+        db.Index('ix_page_view_created_at_session_id', 'created_at', 'session_id'),
+        # 归档按id记录进度，删除旧记录后id也不能重复使用
+        {'sqlite_autoincrement': True},
+    )
+
+class PageViewArchive(db.Model):
+    # 已导出到归档文件并从page_view中删除的访问记录，同一天可能有多个分段文件
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.DateTime, nullable=False, index=True)
+    path = db.Column(db.String(500), unique=True, nullable=False)  # 相对于归档目录的路径
+    rows = db.Column(db.Integer, nullable=False)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CacheInvalidation(db.Model):
+    # 数据缓存的失效记录，version全局递增，各进程读取新的记录后清除本地缓存
+    cache_key = db.Column(db.String(200), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, index=True)
+
+class PageViewRollup(db.Model):
+    # 按小时/天预聚合的PV和UV，period为'hour'或'day'，bucket为时段起始时间
+    period = db.Column(db.String(10), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    pv = db.Column(db.Integer, default=0, nullable=False)
+    uv = db.Column(db.Integer, default=0, nullable=False)
+    uv_sketch = db.Column(db.LargeBinary, nullable=True)  # HyperLogLog草图
+
+class PageViewUrlRollup(db.Model):
+    # 按天、按URL预聚合的PV和UV
+    bucket = db.Column(db.DateTime, primary_key=True)
+    url = db.Column(db.String(500), primary_key=True)
+    pv = db.Column(db.Integer, default=0, nullable=False)
+    uv = db.Column(db.Integer, default=0, nullable=False)
+    uv_sketch = db.Column(db.LargeBinary, nullable=True)
+
+class PageViewTopList(db.Model):
+    # 按天、按维度（toplists.DIMENSIONS）保存的Space-Saving草图，由写入访问记录的线程定期合并增量
+    bucket = db.Column(db.DateTime, primary_key=True)
+    dimension = db.Column(db.String(20), primary_key=True)
+    sketch = db.Column(db.LargeBinary, nullable=False)
 
 # 表单定义
 class LoginForm(FlaskForm):
@@ -89,9 +319,164 @@ class CommentForm(FlaskForm):
     submit = SubmitField('Submit Comment')
 
 # 访问统计中间件
+ROLLUP_PERIODS = ('hour', 'day')
+
+def rollup_bucket(created_at, period):
+    if period == 'hour':
+        return created_at.replace(minute=0, second=0, microsecond=0)
+    return created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def new_uv_sketch():
+    return HyperLogLog.from_error(app.config['UV_SKETCH_ERROR'])
+
+def apply_rollup(model, keys, counts):
+    """把{主键: (PV增量, 会话ID集合)}累加到汇总表，UV通过合并HyperLogLog草图得到"""
+    table = model.__table__
+    stmt = sqlite_insert(table).values([
+        dict(zip(keys, key), pv=pv, uv=0) for key, (pv, sessions) in counts.items()
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={'pv': table.c.pv + stmt.excluded.pv}
+    ))
+    for key, (pv, sessions) in counts.items():
+        if not sessions:
+            continue
+        where = [table.c[column] == value for column, value in zip(keys, key)]
+        data = db.session.execute(db.select(table.c.uv_sketch).where(*where)).scalar()
+        sketch = HyperLogLog.from_bytes(data) if data else new_uv_sketch()
+        sketch.update(sessions)
+        db.session.execute(table.update().where(*where).values(
+            uv_sketch=sketch.to_bytes(),
+            uv=sketch.count()
+        ))
+
+def count_rollups(rows):
+    """按汇总表的主键累计一批访问记录的PV和会话ID集合，返回(小时/天汇总, URL汇总)"""
+    periods = {}
+    urls = {}
+    for row in rows:
+        session_id = row.get('session_id')
+        for period in ROLLUP_PERIODS:
+            entry = periods.setdefault((period, rollup_bucket(row['created_at'], period)), [0, set()])
+            entry[0] += 1
+            if session_id:
+                entry[1].add(session_id)
+        entry = urls.setdefault((rollup_bucket(row['created_at'], 'day'), row['url']), [0, set()])
+        entry[0] += 1
+        if session_id:
+            entry[1].add(session_id)
+    return periods, urls
+
+def update_rollups(rows):
+    """把一批访问记录累加到小时/天及URL汇总表中，需在调用方的事务内执行"""
+    periods, urls = count_rollups(rows)
+    if not periods:
+        return
+    apply_rollup(PageViewRollup, ('period', 'bucket'), periods)
+    apply_rollup(PageViewUrlRollup, ('bucket', 'url'), urls)
+
+def insert_rollups(model, keys, counts):
+    """把{主键: (PV, 会话ID集合)}作为新行写入汇总表，用于重建时汇总行还不存在的情况"""
+    rows = []
+    for key, (pv, sessions) in counts.items():
+        row = dict(zip(keys, key), pv=pv, uv=0, uv_sketch=None)
+        if sessions:
+            sketch = new_uv_sketch().update(sessions)
+            row.update(uv=sketch.count(), uv_sketch=sketch.to_bytes())
+        rows.append(row)
+    if rows:
+        db.session.execute(model.__table__.insert(), rows)
+
+def save_top_lists(sketches):
+    """把{(天, 维度): 草图}合并进热门统计表，需在调用方的事务内执行
+
+    先尝试插入，已有草图时再读取、合并后更新，第一条语句就取得写锁，
+    多个进程同时保存时不会在读取之后才发现冲突。
+    """
+    table = PageViewTopList.__table__
+    for (bucket, dimension), sketch in sketches.items():
+        inserted = db.session.execute(sqlite_insert(table).values(
+            bucket=bucket, dimension=dimension, sketch=sketch.to_bytes()
+        ).on_conflict_do_nothing())
+        if inserted.rowcount:
+            continue
+        where = (table.c.bucket == bucket, table.c.dimension == dimension)
+        data = db.session.execute(db.select(table.c.sketch).where(*where)).scalar()
+        db.session.execute(table.update().where(*where).values(
+            sketch=SpaceSaving.from_bytes(data).merge(sketch).to_bytes()
+        ))
+
+top_list_stream = toplists.TopListStream(
+    capacity=app.config['PAGE_VIEW_TOP_CAPACITY'],
+    snapshot_interval=app.config['PAGE_VIEW_TOP_SNAPSHOT_INTERVAL']
+)
+
+def save_top_list_snapshot():
+    """立即保存进程内累计的热门统计增量，进程退出时在写入剩余访问记录之后调用"""
+    pending = top_list_stream.take()
+    if not pending:
+        return
+    with app.app_context():
+        try:
+            save_top_lists(pending)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            top_list_stream.restore(pending)
+            app.logger.exception('保存热门统计失败')
+
+# atexit按注册的相反顺序执行，先于page_view_buffer.close注册，在写入剩余访问记录之后才保存
+atexit.register(save_top_list_snapshot)
+
+page_view_user_agents = retention.ValueDictionary('user_agent')
+page_view_urls = retention.ValueDictionary('page_url')
+
+def write_page_views(rows):
+    """批量写入页面访问记录（单条多行INSERT），并在同一事务中更新汇总表
+
+    User-Agent和URL先换成字典表中的id再写入，汇总表仍按URL字符串统计。
+    提交后把这批记录计入热门统计，到了保存间隔时在写入下一批的事务中保存累计的增量。
+    """
+    with app.app_context():
+        pending = top_list_stream.take() if top_list_stream.due() else None
+        try:
+            user_agents = page_view_user_agents.ids(db.session, [row.get('user_agent') for row in rows])
+            urls = page_view_urls.ids(db.session, [row['url'] for row in rows])
+            db.session.execute(PageView.__table__.insert().values([
+                dict(ip_address=row['ip_address'], user_agent_id=user_agents.get(row.get('user_agent')),
+                     url_id=urls[row['url']], session_id=row.get('session_id'), created_at=row['created_at'])
+                for row in rows
+            ]))
+            update_rollups(rows)
+            if pending:
+                save_top_lists(pending)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # 字典表中新插入的值随事务回滚，缓存中可能留下了不存在的id
+            page_view_user_agents.clear()
+            page_view_urls.clear()
+            if pending:
+                top_list_stream.restore(pending)
+            raise
+        top_list_stream.observe(rows)
+
+page_view_buffer = PageViewBuffer(
+    write_page_views,
+    max_size=app.config['PAGE_VIEW_QUEUE_SIZE'],
+    batch_size=app.config['PAGE_VIEW_BATCH_SIZE'],
+    flush_interval=app.config['PAGE_VIEW_FLUSH_INTERVAL'],
+    retries=app.config['PAGE_VIEW_WRITE_RETRIES'],
+    retry_delay=app.config['PAGE_VIEW_RETRY_DELAY']
+)
+atexit.register(page_view_buffer.close)
+
 def track_page_view(app):
     @app.before_request
     def before_request():
+        if not app.config['TRACK_PAGE_VIEWS']:
+            return
         # 忽略静态文件和管理后台的请求
         if request.path.startswith('/static/') or request.path.startswith('/admin/') or request.path == '/login':
             return
@@ -103,20 +488,31 @@ def track_page_view(app):
             session.permanent = True
         
         # 创建页面访问记录
-        with app.app_context():
-            page_view = PageView(
-                ip_address=request.remote_addr,
-                user_agent=request.user_agent.string[:500],  # 限制长度
-                url=request.path,
-                session_id=session['session_id']
-            )
-            db.session.add(page_view)
-            db.session.commit()
+        row = dict(
+            ip_address=request.remote_addr or '',
+            user_agent=request.user_agent.string[:500],  # 限制长度
+            url=request.path[:500],
+            session_id=session['session_id'],
+            created_at=datetime.utcnow(),
+            # 来源只用于热门统计，不写入page_view表
+            referrer=(request.referrer or '')[:500],
+            host=request.host
+        )
+        if app.config['PAGE_VIEW_ASYNC']:
+            # 只放入内存队列，由后台线程批量写入
+            page_view_buffer.record(row)
+        else:
+            write_page_views([row])
 
 # 登录管理器回调
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # 每个登录用户的请求都要加载用户，缓存列值，每次构造一个不属于会话的User对象
+    user_id = int(user_id)
+    values = data_cache.get(f'user:{user_id}', lambda: db.session.execute(
+        db.select(User.__table__).where(User.id == user_id)
+    ).mappings().first())
+    return User(**values) if values else None
 
 # 创建admin_required装饰器
 def admin_required(func):
@@ -129,65 +525,423 @@ def admin_required(func):
         return func(*args, **kwargs)
     return decorated_view
 
-# 创建数据库表和默认管理员用户
+# 内存数据库只能在单个进程中使用，不需要共享失效记录
+shared_cache = (app.config['DATA_CACHE_BACKEND'] == 'sqlite' and
+                     app.config['SQLALCHEMY_DATABASE_URI'] not in (None, 'sqlite://', 'sqlite:///:memory:'))
+cache_invalidation_log = SQLInvalidationLog(lambda: db.engine) if shared_cache else None
+# 页面缓存，按标签失效的记录与数据缓存共用cache_invalidation表，标签带'page:'前缀
+page_cache = PageCache(
+    max_entries=app.config['PAGE_CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['PAGE_CACHE_MAX_BYTES'],
+    ttl=app.config['PAGE_CACHE_TTL'],
+    backend=cache_invalidation_log if app.config['PAGE_CACHE_ENABLED'] else None,
+    check_interval=app.config['DATA_CACHE_CHECK_INTERVAL']
+)
+# 数据缓存
+data_cache = DataCache(
+    ttl=app.config['DATA_CACHE_TTL'],
+    backend=cache_invalidation_log,
+    check_interval=app.config['DATA_CACHE_CHECK_INTERVAL'],
+    enabled=app.config['DATA_CACHE_ENABLED']
+)
+# 缓存中用占位符代替每个会话不同的CSRF令牌，返回时再替换
+CSRF_PLACEHOLDER = b'__CSRF_TOKEN_PLACEHOLDER__'
+
+def cached_page(func):
+    """缓存前台页面的渲染结果
+
+    视图通过g.cache_tags声明页面依赖的数据标签，通过g.last_modified声明最后修改时间，
+    未设置g.cache_tags的响应不会被缓存。有待显示的提示消息时跳过缓存。
+    不带表单的页面返回ETag和Last-Modified，支持条件请求；带表单的页面返回Cache-Control: no-cache, private。
+    """
+    @functools.wraps(func)
+    def decorated_view(*args, **kwargs):
+        if not app.config['PAGE_CACHE_ENABLED'] or request.method != 'GET' or session.get('_flashes'):
+            return func(*args, **kwargs)
+        key = request.full_path
+        entry = page_cache.get(key)
+        status = 'HIT'
+        if entry is None:
+            status = 'MISS'
+            response = app.make_response(func(*args, **kwargs))
+            if response.status_code != 200 or 'cache_tags' not in g:
+                return response
+            body = response.get_data()
+            if 'csrf_token' in g:
+                body = body.replace(g.csrf_token.encode(), CSRF_PLACEHOLDER)
+            entry = page_cache.set(key, body, g.cache_tags, g.get('last_modified'))
+        body = entry.body
+        response = app.response_class(mimetype='text/html')
+        response.headers['X-Cache'] = status
+        if CSRF_PLACEHOLDER in body:
+            # 带表单的页面包含当前会话的CSRF令牌，不能返回304或由浏览器直接复用，每次都返回完整页面
+            response.set_data(body.replace(CSRF_PLACEHOLDER, generate_csrf().encode()))
+            response.headers['Cache-Control'] = 'no-cache, private'
+            return response
+        response.set_data(body)
+        response.set_etag(entry.etag)
+        if entry.last_modified:
+            response.last_modified = entry.last_modified
+        return response.make_conditional(request)
+    return decorated_view
+
+def category_exists(category):
+    return db.session.query(Post.id).filter_by(category=category).first() is not None
+
+def category_counts():
+    """返回{分类: 文章数}，按分类名排序"""
+    return data_cache.get('categories', lambda: dict(
+        db.session.query(Post.category, db.func.count()).filter(Post.category.isnot(None)).group_by(
+            Post.category
+        ).order_by(Post.category).all()
+    ))
+
+def popular_tags():
+    """标签云：按文章数取前20个标签的(name, post_count)"""
+    return data_cache.get('popular_tags', lambda: db.session.query(Tag.name, Tag.post_count).filter(
+        Tag.post_count > 0
+    ).order_by(Tag.post_count.desc()).limit(20).all())
+
+def invalidate_post_pages(post_id, categories, existed, post_tags=(), related_ids=()):
+    """文章新建、修改或删除后清除受影响的缓存页面
+
+    包括文章详情页、首页、涉及分类的列表页、涉及标签的标签页以及相关文章列表有变化的文章详情页；
+    existed为写入前各分类是否存在，分类出现或消失时清除所有带分类导航的页面。
+    """
+    tags = {'index', f'post:{post_id}'}
+    tags.update(f'tag:{name}' for name in post_tags)
+    tags.update(f'post:{id}' for id in related_ids)
+    for category in categories:
+        tags.add(f'category:{category}')
+        if category_exists(category) != existed[category]:
+            tags.add('categories')
+    page_cache.invalidate(*tags)
+    data_cache.invalidate('categories', 'popular_tags')
+
+# 评论提交
+comment_ip_limiter = RateLimiter(app.config['COMMENT_IP_RATE_PER_MINUTE'] / 60, app.config['COMMENT_IP_RATE_BURST'])
+comment_session_limiter = RateLimiter(app.config['COMMENT_RATE_PER_MINUTE'] / 60, app.config['COMMENT_RATE_BURST'])
+comment_duplicates = DuplicateFilter(app.config['COMMENT_DUPLICATE_WINDOW'])
+comment_moderator = Moderator(app.config['COMMENT_MAX_LINKS'], app.config['COMMENT_BLOCKED_WORDS'])
+
+def write_comments(rows):
+    """在一个事务中写入一批已通过审核的评论并更新文章评论数，返回写入的条数
+
+    审核在提交时完成，重试和逐条写入时不再重复审核。created_at在写入时设置，而不是提交评论时：
+    排队期间执行的增量静态导出记录的导出时间晚于提交时间，按提交时间记录的评论会被之后的导出漏掉。
+    """
+    with app.app_context():
+        # 排队期间被删除的文章不再写入评论
+        post_ids = set(db.session.execute(
+            db.select(Post.id).where(Post.id.in_({row['post_id'] for row in rows}))
+        ).scalars())
+        rows = [row for row in rows if row['post_id'] in post_ids]
+        if not rows:
+            return 0
+        counts = Counter(row['post_id'] for row in rows)
+        post = Post.__table__
+        now = datetime.utcnow()
+        try:
+            db.session.execute(Comment.__table__.insert(), [dict(row, created_at=now) for row in rows])
+            # 评论不算文章修改，显式保持updated_at不变
+            db.session.execute(post.update().where(post.c.id == db.bindparam('post')).values(
+                comment_count=post.c.comment_count + db.bindparam('count'),
+                updated_at=post.c.updated_at
+            ), [{'post': post_id, 'count': count} for post_id, count in counts.items()])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        page_cache.invalidate(*(f'post:{post_id}' for post_id in counts))
+        return len(rows)
+
+def write_failed_comments(rows):
+    """一批评论重试后仍然写入失败时逐条写入，避免一条评论拖累整批，返回写入的条数
+
+    仍然写入失败的评论从重复检测中移除，读者重新提交时不会被当作重复提交而丢弃。
+    """
+    written = 0
+    for row in rows:
+        try:
+            written += write_comments([row])
+        except Exception:
+            comment_duplicates.forget(fingerprint(row['post_id'], row['content']))
+            app.logger.exception('写入文章%s的评论失败，已丢弃，读者可以重新提交', row['post_id'])
+    return written
+
+comment_queue = CommentQueue(
+    write_comments,
+    max_size=app.config['COMMENT_QUEUE_SIZE'],
+    batch_size=app.config['COMMENT_BATCH_SIZE'],
+    flush_interval=app.config['COMMENT_FLUSH_INTERVAL'],
+    discard=write_failed_comments
+)
+atexit.register(comment_queue.close)
+
+def comment_rate_wait():
+    """按IP和会话限制发表评论的频率，返回需要等待的秒数，未超出限制时返回0"""
+    wait = comment_ip_limiter.acquire(request.remote_addr or '')
+    session_id = session.get('session_id')
+    if session_id:
+        wait = max(wait, comment_session_limiter.acquire(session_id))
+    return wait
+
+def too_many_comments(wait):
+    response = app.response_class('Too many comments, please try again later.', status=429, mimetype='text/plain')
+    response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
+
+def comment_stats():
+    stats = {f'queue_{name}': value for name, value in comment_queue.stats().items()}
+    stats.update((f'ip_{name}', value) for name, value in comment_ip_limiter.stats().items())
+    stats.update((f'session_{name}', value) for name, value in comment_session_limiter.stats().items())
+    stats.update(comment_duplicates.stats())
+    stats.update(comment_moderator.stats())
+    return stats
+
+# 请求级性能统计
+request_metrics = RequestMetrics()
+slow_request_log = SlowRequestLog(
+    app.config['SLOW_REQUEST_LOG'],
+    max_bytes=app.config['SLOW_REQUEST_LOG_MAX_BYTES'],
+    backup_count=app.config['SLOW_REQUEST_LOG_BACKUPS'],
+    fallback=app.logger
+)
+
+def current_request_stats():
+    # 后台线程（如访问记录写入）中执行的查询不属于任何请求
+    return g.get('request_stats') if has_request_context() else None
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request_stats()
+    if stats is not None:
+        stats.query_started()
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request_stats()
+    if stats is not None:
+        stats.query_finished(statement)
+
+@before_render_template.connect_via(app)
+def render_started(sender, **extra):
+    stats = current_request_stats()
+    if stats is not None:
+        stats.render_started()
+
+@template_rendered.connect_via(app)
+def render_finished(sender, **extra):
+    stats = current_request_stats()
+    if stats is not None:
+        stats.render_finished()
+
+def instrument_requests(app):
+    @app.before_request
+    def start_request_stats():
+        if app.config['INSTRUMENTATION_ENABLED']:
+            g.request_stats = RequestStats()
+
+    # 最先注册的after_request最后执行，统计的耗时包含其他钩子
+    @app.after_request
+    def finish_request_stats(response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        duration = stats.elapsed()
+        slow = duration * 1000 >= app.config['SLOW_REQUEST_MS']
+        request_metrics.observe(request.endpoint or 'unknown', request.method, response.status_code,
+                                duration, stats, slow)
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = stats.server_timing(duration, response.headers.get('X-Cache'))
+        if slow:
+            slow_request_log.write(request.method, request.full_path.rstrip('?'), response.status_code,
+                                   duration, stats)
+        return response
+
+# 导入时只创建引擎对象、不连接数据库；建表、迁移和创建管理员由flask init-db等命令显式执行
 with app.app_context():
-    db.create_all()
-    
-    # 创建默认管理员用户（首次运行时）
-    if not User.query.filter_by(username='admin').first():
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', configure_sqlite_connection)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(db.engine, 'after_cursor_execute', after_cursor_execute)
+
+def ensure_admin(username='admin', password='admin123'):
+    """确保存在管理员用户，不存在时用给定密码创建，返回是否新建了用户"""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
         from werkzeug.security import generate_password_hash
-        admin_user = User(username='admin', password=generate_password_hash('admin123'), is_admin=True)
-        db.session.add(admin_user)
+        user = User(username=username, password=generate_password_hash(password), is_admin=True)
+        db.session.add(user)
         db.session.commit()
-    else:
-        # 确保现有admin用户有管理员权限
-        admin_user = User.query.filter_by(username='admin').first()
-        if not admin_user.is_admin:
-            admin_user.is_admin = True
-            db.session.commit()
+        data_cache.invalidate(f'user:{user.id}')
+        return True
+    # 确保现有用户有管理员权限
+    if not user.is_admin:
+        user.is_admin = True
+        db.session.commit()
+        data_cache.invalidate(f'user:{user.id}')
+    return False
+
+def upgrade_database(echo=print):
+    """创建新增的表、执行迁移，再用当前代码补全迁移新增的表和字段的数据，需在应用上下文中调用
+
+    迁移只变更表结构，标签、摘要、搜索索引、相关文章和预渲染正文由下面的函数生成，
+    与对应的命令（如flask rerender-posts）相同，中断后可以单独执行这些命令。
+    """
+    backfills = {
+        'post_tags': sync_post_tags,
+        'excerpts': fill_excerpts,
+        'search_index': index_posts,
+        'related_posts': compute_related_posts,
+        'rendered_html': render_posts,
+    }
+    for name in upgrade(db.engine, db.metadata, echo):
+        echo(f'已补全数据 {name}: {backfills[name]()} 篇文章')
 
-# 启用访问统计
-if app.config.get('TRACK_PAGE_VIEWS', True):
-    track_page_view(app)
+def init_database(echo=print):
+    """创建数据表、执行迁移并创建默认管理员用户，需在应用上下文中调用"""
+    upgrade_database(echo)
+    if ensure_admin():
+        echo('已创建默认管理员用户：用户名=admin，密码=admin123，请登录后立即修改')
+
+# 启用性能统计（先注册，使统计的耗时包含访问记录等其他钩子）和访问统计
+instrument_requests(app)
+track_page_view(app)
 
 # 路由定义
 # 前台路由（带后缀）
+def listing_query():
+    """文章列表查询：不加载正文，作者通过JOIN一次取出"""
+    return Post.query.options(db.defer(Post.content), db.defer(Post.rendered_html), db.joinedload(Post.author))
+
+def comment_page(post_id, after=None):
+    """按发表时间倒序取一页评论，after为上一页最后一条评论的游标"""
+    return keyset_paginate(
+        Comment.query.filter_by(post_id=post_id), Comment.created_at, Comment.id,
+        app.config['COMMENTS_PER_PAGE'], after=after
+    )
+
+def paginate_posts(query, per_page, created_at=Post.created_at, id=Post.id):
+    """按发布时间倒序对文章做游标分页，游标取自请求参数after/before"""
+    return keyset_paginate(
+        query, created_at, id, per_page,
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+
 @app.route('/blog/')
+@cached_page
 def index():
-    posts = Post.query.order_by(Post.created_at.desc()).all()
-    # 获取所有分类（去重并排除空分类）
-    categories = db.session.query(Post.category).filter(Post.category.isnot(None)).distinct().all()
-    categories = [category[0] for category in categories]
-    return render_template('index.html', posts=posts, categories=categories)
+    posts = paginate_posts(listing_query(), app.config['POSTS_PER_PAGE'])
+    g.cache_tags = {'index', 'categories'}
+    g.last_modified = max((post.updated_at for post in posts), default=None)
+    return render_template('index.html', posts=posts, categories=list(category_counts()), popular_tags=popular_tags())
 
-@app.route('/blog/post/<slug>')
+@app.route('/blog/post/<slug>', methods=['GET', 'POST'])
+@cached_page
 def post_detail(slug):
-    post = Post.query.filter_by(slug=slug).first_or_404()
+    # 超出频率限制的评论在访问数据库之前拒绝
+    if request.method == 'POST':
+        wait = comment_rate_wait()
+        if wait:
+            return too_many_comments(wait)
+    # 详情页输出保存时渲染的正文，不加载原始正文
+    post = Post.query.options(db.defer(Post.content)).filter_by(slug=slug).first_or_404()
     form = CommentForm()
     if form.validate_on_submit():
-        comment = Comment(content=form.content.data, author=form.author.data, post_id=post.id)
-        db.session.add(comment)
-        db.session.commit()
-        flash('Comment added successfully!', 'success')
+        row = dict(post_id=post.id, author=form.author.data, content=form.content.data)
+        key = fingerprint(post.id, row['content'])
+        if comment_moderator.check(row['content']):
+            # 每条评论只在提交时审核一次，拒绝的评论不计入重复检测
+            flash('Your comment was rejected.', 'danger')
+        elif comment_duplicates.check(key):
+            # 重复提交（如连续点击提交按钮）不再写入
+            flash('Comment added successfully!', 'success')
+        elif app.config['COMMENT_ASYNC']:
+            if not comment_queue.record(row):
+                comment_duplicates.forget(key)
+                return too_many_comments(app.config['COMMENT_FLUSH_INTERVAL'])
+            flash('Comment submitted, it will appear shortly.', 'success')
+        else:
+            try:
+                write_comments([row])
+            except Exception:
+                # 写入失败时允许重新提交
+                comment_duplicates.forget(key)
+                raise
+            flash('Comment added successfully!', 'success')
         return redirect(url_for('post_detail', slug=slug))
     
-    # 获取相关文章（基于相同分类）
-    related_posts = []
-    if post.category:
-        related_posts = Post.query.filter(
-            Post.category == post.category, 
-            Post.id != post.id
-        ).order_by(Post.created_at.desc()).limit(3).all()
+    # 获取相关文章（读取预计算的结果）
+    related_posts = Post.query.options(db.defer(Post.content), db.defer(Post.rendered_html)).join(
+        RelatedPost, RelatedPost.related_id == Post.id
+    ).filter(RelatedPost.post_id == post.id).order_by(RelatedPost.score.desc()).limit(3).all()
+    
+    # 首屏只渲染第一页评论，更多评论由页面通过post_comments接口按需加载
+    comments = comment_page(post.id)
     
-    return render_template('post_detail.html', post=post, form=form, related_posts=related_posts)
+    # 没有渲染结果的文章（如直接导入数据库的）临时渲染，不保存
+    content_html = post.rendered_html
+    if content_html is None:
+        content_html = rendering.render(post.content, app.static_folder).html
+    
+    g.cache_tags = {f'post:{post.id}'}
+    g.last_modified = max([post.updated_at] + [comment.created_at for comment in comments])
+    g.csrf_token = generate_csrf()
+    return render_template('post_detail.html', post=post, form=form, related_posts=related_posts, comments=comments,
+                           content_html=content_html)
+
+@app.route('/blog/post/<slug>/comments')
+def post_comments(slug):
+    post_id = db.session.query(Post.id).filter_by(slug=slug).scalar()
+    if post_id is None:
+        abort(404)
+    comments = comment_page(post_id, request.args.get('after'))
+    return jsonify(
+        comments=[dict(
+            id=comment.id,
+            author=comment.author,
+            content=comment.content,
+            created_at=comment.created_at.strftime('%Y-%m-%d %H:%M')
+        ) for comment in comments],
+        next_cursor=comments.next_cursor
+    )
 
 @app.route('/blog/category/<category>')
+@cached_page
 def category_posts(category):
-    posts = Post.query.filter_by(category=category).order_by(Post.created_at.desc()).all()
-    # 获取所有分类（去重并排除空分类）
-    all_categories = db.session.query(Post.category).filter(Post.category.isnot(None)).distinct().all()
-    all_categories = [cat[0] for cat in all_categories]
-    return render_template('category.html', posts=posts, category=category, categories=all_categories)
+    posts = paginate_posts(listing_query().filter_by(category=category), app.config['POSTS_PER_PAGE'])
+    counts = category_counts()
+    total = counts.get(category, 0)
+    all_categories = list(counts)
+    g.cache_tags = {f'category:{category}', 'categories'}
+    g.last_modified = max((post.updated_at for post in posts), default=None)
+    return render_template('category.html', posts=posts, total=total, category=category, categories=all_categories)
+
+@app.route('/blog/tag/<path:tag>')  # 标签名中可以有'/'（如CI/CD）
+@cached_page
+def tag_posts(tag):
+    tag = Tag.query.filter(Tag.name == tag, Tag.post_count > 0).first_or_404()
+    query = listing_query().join(PostTag, PostTag.post_id == Post.id).filter(PostTag.tag_id == tag.id)
+    posts = paginate_posts(query, app.config['POSTS_PER_PAGE'], PostTag.created_at, PostTag.post_id)
+    g.cache_tags = {f'tag:{tag.name}'}
+    g.last_modified = max((post.updated_at for post in posts), default=None)
+    return render_template('tag.html', posts=posts, tag=tag)
+
+@app.route('/blog/search')
+def search_posts():
+    query = request.args.get('q', '').strip()[:100]
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = app.config['SEARCH_RESULTS_PER_PAGE']
+    results = []
+    has_next = False
+    if query:
+        # 多取一条用于判断是否有下一页
+        ids = search.search_ids(db.session, query, per_page + 1, (page - 1) * per_page)
+        has_next = len(ids) > per_page
+        ids = ids[:per_page]
+        posts = {post.id: post for post in Post.query.options(db.joinedload(Post.author)).filter(Post.id.in_(ids))}
+        results = [(posts[id], search.highlight(posts[id].content, query)) for id in ids if id in posts]
+    return render_template('search.html', query=query, results=results, page=page, has_next=has_next)
 
 # 首页重定向到前台路由
 @app.route('/')
@@ -213,32 +967,70 @@ def logout():
     logout_user()
     return redirect(url_for('login'))
 
+def top_lists(days=7, limit=10):
+    """合并最近days天（含今天）的热门统计草图，返回各维度的前limit项[(名称, 次数)]和爬虫访问的比例
+
+    次数是上界，误差不超过当天草图中最小的计数。文章按slug统计，返回时换成文章对象，已删除的文章不显示。
+    """
+    start = rollup_bucket(datetime.utcnow(), 'day') - timedelta(days=days - 1)
+    sketches = {}
+    for dimension, data in db.session.query(PageViewTopList.dimension, PageViewTopList.sketch).filter(
+        PageViewTopList.bucket >= start
+    ):
+        sketches.setdefault(dimension, []).append(SpaceSaving.from_bytes(data))
+    merged = {dimension: SpaceSaving.merge_all(sketches.get(dimension, ())) for dimension in toplists.DIMENSIONS}
+    result = {dimension: [(item, count) for item, count, error in sketch.top(limit)]
+              for dimension, sketch in merged.items()}
+    slugs = [slug for slug, count in result['post']]
+    posts = {post.slug: post for post in Post.query.options(db.defer(Post.content), db.defer(Post.rendered_html))
+             .filter(Post.slug.in_(slugs))} if slugs else {}
+    result['post'] = [(posts[slug], count) for slug, count in result['post'] if slug in posts]
+    user_agents = merged['user_agent']
+    bots = sum(count for family, (count, error) in user_agents.counters.items()
+               if family.startswith(toplists.BOT_PREFIX))
+    result['bot_ratio'] = bots / user_agents.total if user_agents.total else 0
+    return result
+
 @app.route('/admin')
 @admin_required
 def admin_dashboard():
-    posts = Post.query.order_by(Post.created_at.desc()).all()
+    posts = paginate_posts(Post.query.options(db.defer(Post.content), db.defer(Post.rendered_html)), app.config['ADMIN_POSTS_PER_PAGE'])
     # 获取统计数据
     total_posts = Post.query.count()
     
-    # 计算本月发布的文章数量
-    from datetime import datetime
-    current_month = datetime.utcnow().month
-    current_year = datetime.utcnow().year
+    # 计算本月发布的文章数量（按时间范围过滤以便使用created_at索引）
+    month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
     posts_this_month = Post.query.filter(
-        db.extract('month', Post.created_at) == current_month,
-        db.extract('year', Post.created_at) == current_year
+        Post.created_at >= month_start,
+        Post.created_at < next_month
     ).count()
     
     total_comments = Comment.query.count()
-    total_categories = db.session.query(Post.category).filter(Post.category.isnot(None)).distinct().count()
+    total_categories = len(category_counts())
     
-    # 获取PV和UV统计数据
-    total_pv = PageView.query.count()
-    total_uv = db.session.query(PageView.session_id).distinct().count()
+    # 获取PV和UV统计数据（读取预聚合的汇总表）
+    total_pv = db.session.query(db.func.coalesce(db.func.sum(PageViewRollup.pv), 0)).filter(
+        PageViewRollup.period == 'day'
+    ).scalar()
+    # 总UV由每天的HyperLogLog草图合并估算
+    total_uv = HyperLogLog.merge_all(
+        (HyperLogLog.from_bytes(data) for (data,) in db.session.query(PageViewRollup.uv_sketch).filter(
+            PageViewRollup.period == 'day',
+            PageViewRollup.uv_sketch.isnot(None)
+        )),
+        new_uv_sketch().p
+    ).count()
     
     # 获取最近7天的PV和UV数据
-    from datetime import datetime, timedelta
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
+    seven_days_ago = rollup_bucket(datetime.utcnow() - timedelta(days=7), 'day')
+    daily = {
+        rollup.bucket: rollup for rollup in PageViewRollup.query.filter(
+            PageViewRollup.period == 'day',
+            PageViewRollup.bucket >= seven_days_ago,
+            PageViewRollup.bucket < seven_days_ago + timedelta(days=7)
+        )
+    }
     
     # 准备日期列表
     date_list = []
@@ -247,25 +1039,10 @@ def admin_dashboard():
     
     for i in range(7):
         current_date = seven_days_ago + timedelta(days=i)
-        date_str = current_date.strftime('%Y-%m-%d')
-        date_list.append(date_str)
-        
-        # 获取当天的PV
-        start_date = datetime.strptime(date_str, '%Y-%m-%d')
-        end_date = start_date + timedelta(days=1)
-        
-        day_pv = PageView.query.filter(
-            PageView.created_at >= start_date,
-            PageView.created_at < end_date
-        ).count()
-        pv_data.append(day_pv)
-        
-        # 获取当天的UV
-        day_uv = db.session.query(PageView.session_id).filter(
-            PageView.created_at >= start_date,
-            PageView.created_at < end_date
-        ).distinct().count()
-        uv_data.append(day_uv)
+        date_list.append(current_date.strftime('%Y-%m-%d'))
+        rollup = daily.get(current_date)
+        pv_data.append(rollup.pv if rollup else 0)
+        uv_data.append(rollup.uv if rollup else 0)
     
     return render_template('admin/dashboard.html', 
                           posts=posts, 
@@ -277,7 +1054,31 @@ def admin_dashboard():
                           total_uv=total_uv,
                           date_list=date_list,
                           pv_data=pv_data,
-                          uv_data=uv_data)
+                          uv_data=uv_data,
+                          page_cache_stats=page_cache.stats(),
+                          data_cache_stats=data_cache.stats(),
+                          comment_stats=comment_stats(),
+                          top=top_lists())
+
+def metrics_response():
+    gauges = [(f'blog_page_cache_{name}', f'页面缓存{name}', value) for name, value in page_cache.stats().items()]
+    gauges += [(f'blog_data_cache_{name}', f'数据缓存{name}', value) for name, value in data_cache.stats().items()]
+    gauges += [(f'blog_page_view_buffer_{name}', f'访问记录缓冲区{name}', value)
+               for name, value in page_view_buffer.stats().items()]
+    gauges += [(f'blog_comments_{name}', f'评论提交{name}', value) for name, value in comment_stats().items()]
+    gauges += [(f'blog_top_lists_{name}', f'热门统计{name}', value) for name, value in top_list_stream.stats().items()]
+    pool = db.engine.pool
+    if hasattr(pool, 'checkedout'):
+        gauges.append(('blog_db_pool_checked_out', '已借出的数据库连接数', pool.checkedout()))
+    return app.response_class(request_metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/metrics')
+def metrics():
+    """Prometheus格式的性能指标；设置了METRICS_TOKEN时监控系统可用Bearer令牌访问，否则需要管理员登录"""
+    token = app.config['METRICS_TOKEN']
+    if token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return metrics_response()
+    return admin_required(metrics_response)()
 
 @app.route('/admin/post/new', methods=['GET', 'POST'])
 @admin_required
@@ -294,13 +1095,22 @@ def new_post():
         post = Post(
             title=form.title.data,
             content=form.content.data,
+            excerpt=make_excerpt(form.content.data),
             author_id=current_user.id,
             slug=slug,
             category=form.category.data or None,
             tags=form.tags.data or None
         )
+        post.render_content()
+        categories = {post.category} - {None}
+        existed = {category: category_exists(category) for category in categories}
         db.session.add(post)
+        db.session.flush()
+        search.index_post(db.session, post.id, post.title, post.tags, post.content)
+        changed_tags = tagging.sync_post(db.session, post.id, post.tag_names)
+        related_ids = related.update_post(db.session, post.id, post.title, post.tags, post.content)
         db.session.commit()
+        invalidate_post_pages(post.id, categories, existed, changed_tags, related_ids)
         flash('Post created successfully!', 'success')
         return redirect(url_for('admin_dashboard'))
     return render_template('admin/edit_post.html', form=form, title='New Post')
@@ -314,9 +1124,22 @@ def edit_post(post_id):
         return redirect(url_for('admin_dashboard'))
     form = PostForm(obj=post)
     if form.validate_on_submit():
+        old_category = post.category
         form.populate_obj(post)
+        post.category = post.category or None
+        post.tags = post.tags or None
+        post.excerpt = make_excerpt(post.content)
+        post.render_content()
         post.updated_at = datetime.utcnow()
+        categories = {old_category, post.category} - {None}
+        with db.session.no_autoflush:
+            existed = {category: category_exists(category) for category in categories}
+        search.index_post(db.session, post.id, post.title, post.tags, post.content)
+        # 未变化的标签页中文章的标题和摘要也可能变化，一并清除
+        post_tags = tagging.sync_post(db.session, post.id, post.tag_names) | set(post.tag_names)
+        related_ids = related.update_post(db.session, post.id, post.title, post.tags, post.content)
         db.session.commit()
+        invalidate_post_pages(post.id, categories, existed, post_tags, related_ids)
         flash('Post updated successfully!', 'success')
         return redirect(url_for('admin_dashboard'))
     return render_template('admin/edit_post.html', form=form, title='Edit Post', post=post)
@@ -328,12 +1151,363 @@ def delete_post(post_id):
     if post.author_id != current_user.id:
         flash('You are not authorized to delete this post', 'danger')
         return redirect(url_for('admin_dashboard'))
+    categories = {post.category} - {None}
+    existed = {category: category_exists(category) for category in categories}
     # 删除相关评论
     Comment.query.filter_by(post_id=post_id).delete()
+    search.remove_post(db.session, post_id)
+    post_tags = tagging.remove_post(db.session, post_id)
+    related_ids = related.remove_post(db.session, post_id)
     db.session.delete(post)
     db.session.commit()
+    invalidate_post_pages(post_id, categories, existed, post_tags, related_ids)
     flash('Post deleted successfully!', 'success')
     return redirect(url_for('admin_dashboard'))
 
+@app.cli.command('init-db')
+def init_db():
+    """首次部署时创建数据表、执行迁移并创建默认管理员用户"""
+    init_database(click.echo)
+
+@app.cli.command('upgrade-db')
+def upgrade_db():
+    """创建新增的表、执行未执行的数据库迁移并补全新增表和字段的数据"""
+    upgrade_database(click.echo)
+
+@app.cli.command('create-admin')
+@click.option('--username', default='admin', show_default=True)
+@click.password_option(help='新建用户时使用的密码')
+def create_admin(username, password):
+    """创建管理员用户，用户已存在时只授予管理员权限"""
+    if ensure_admin(username, password):
+        click.echo(f'已创建管理员用户 {username}')
+    else:
+        click.echo(f'用户 {username} 已存在，已确保其有管理员权限')
+
+def rebuild_rollups(batch_size=5000, echo=print, start=None, end=None):
+    """根据已有的访问记录重建[start, end)内的小时/天汇总表和热门统计，返回处理的记录数
+
+    按天处理：删除当天的汇总，流式读取当天的访问记录，在内存中累计PV和会话ID，
+    每个汇总行只计算一次草图、写入一次，然后提交。每个事务只包含一天的数据，持有写锁的时间
+    不随重建范围增长，其他进程写入访问记录时不会等到busy_timeout；重建过程中未处理到的日期保留原来的汇总。
+    访问记录中没有保存来源，来源的热门统计保持不变。
+    start和end为某天的零点；不指定start时从最后一个已归档日期的次日开始，
+    已归档日期的原始记录已经删除，保留它们的汇总。
+    """
+    if start is None:
+        last_archived = db.session.query(db.func.max(PageViewArchive.day)).scalar()
+        if last_archived is not None:
+            start = last_archived + timedelta(days=1)
+
+    def bounded(model, column):
+        query = model.query
+        if model is PageViewTopList:
+            query = query.filter(PageViewTopList.dimension != 'referrer')
+        elif model is PageViewRollup:
+            # 主键以period开头，列出period后可以按主键查找时段
+            query = query.filter(PageViewRollup.period.in_(ROLLUP_PERIODS))
+        if start is not None:
+            query = query.filter(column >= start)
+        if end is not None:
+            query = query.filter(column < end)
+        return query
+
+    # 需要处理的日期范围：访问记录和已有汇总所在的日期
+    tables = ((PageView, PageView.created_at), (PageViewRollup, PageViewRollup.bucket),
+              (PageViewUrlRollup, PageViewUrlRollup.bucket), (PageViewTopList, PageViewTopList.bucket))
+    firsts, lasts = [], []
+    for model, column in tables:
+        first, last = bounded(model, column).with_entities(db.func.min(column), db.func.max(column)).one()
+        if first is not None:
+            firsts.append(first)
+            lasts.append(last)
+    db.session.commit()
+    if not firsts:
+        return 0
+
+    query = db.select(
+        PageView.created_at, PageUrl.value.label('url'), PageView.session_id, UserAgent.value.label('user_agent')
+    ).join(PageUrl, PageUrl.id == PageView.url_id).outerjoin(
+        UserAgent, UserAgent.id == PageView.user_agent_id
+    ).order_by(PageView.created_at)
+    total = 0
+    day = rollup_bucket(min(firsts), 'day')
+    last_day = rollup_bucket(max(lasts), 'day')
+    while day <= last_day:
+        next_day = day + timedelta(days=1)
+        for model, column in tables[1:]:
+            bounded(model, column).filter(column >= day, column < next_day).delete()
+        rows = [row._asdict() for row in db.session.execute(
+            query.where(PageView.created_at >= day, PageView.created_at < next_day)
+            .execution_options(yield_per=batch_size)
+        )]
+        if rows:
+            periods, urls = count_rollups(rows)
+            insert_rollups(PageViewRollup, ('period', 'bucket'), periods)
+            insert_rollups(PageViewUrlRollup, ('bucket', 'url'), urls)
+            save_top_lists(toplists.count_top_lists(rows, app.config['PAGE_VIEW_TOP_CAPACITY']))
+        db.session.commit()
+        if rows:
+            total += len(rows)
+            echo(f'已处理 {total} 条访问记录（{day:%Y-%m-%d}）')
+        day = next_day
+    return total
+
+def archive_page_views(retention_days, archive_dir, batch_size=2000, pause=0.05, echo=print):
+    """把保留期限之前的访问记录按天导出到归档目录并分批删除，返回(归档的天数, 删除的记录数)
+
+    删除前确认该天的天汇总PV与原始记录数一致，不一致时（如导入数据后没有重建汇总）先重建该天的汇总，
+    删除后PV/UV统计仍然完整。每天的导出和登记在一个事务中提交，删除按batch_size分批提交。
+    """
+    cutoff = rollup_bucket(datetime.utcnow(), 'day') - timedelta(days=retention_days)
+    first = db.session.query(db.func.min(PageView.created_at)).filter(PageView.created_at < cutoff).scalar()
+    days = 0
+    deleted = 0
+    day = rollup_bucket(first, 'day') if first else cutoff
+    while day < cutoff:
+        next_day = day + timedelta(days=1)
+        count = PageView.query.filter(PageView.created_at >= day, PageView.created_at < next_day).count()
+        if not count:
+            day = next_day
+            continue
+        after_id, parts = retention.archived_last_id(db.session, day)
+        if not parts:
+            pv = db.session.query(PageViewRollup.pv).filter_by(period='day', bucket=day).scalar() or 0
+            if pv != count:
+                echo(f'{day:%Y-%m-%d} 的汇总PV为 {pv}，原始记录 {count} 条，重建该天的汇总')
+                rebuild_rollups(echo=lambda message: None, start=day, end=next_day)
+        exported = retention.export_day(db.session, day, archive_dir, after_id)
+        db.session.commit()
+        if exported:
+            path, rows, after_id = exported
+            echo(f'{day:%Y-%m-%d}: 已导出 {rows} 条访问记录到 {path}')
+        purged = retention.purge_day(db.session, day, after_id, batch_size, pause, db.session.commit)
+        echo(f'{day:%Y-%m-%d}: 已删除 {purged} 条访问记录')
+        days += 1
+        deleted += purged
+        day = next_day
+    return days, deleted
+
+@app.cli.command('backfill-rollups')
+@click.option('--batch-size', default=5000, show_default=True, help='每批处理的访问记录数')
+def backfill_rollups(batch_size):
+    """根据已有的访问记录重建小时/天汇总表"""
+    rebuild_rollups(batch_size, click.echo)
+    click.echo('汇总表重建完成')
+
+@app.cli.command('archive-page-views')
+@click.option('--days', type=int, default=None, help='保留最近多少天的原始访问记录，默认为PAGE_VIEW_RETENTION_DAYS')
+@click.option('--archive-dir', default=None, help='归档目录，默认为PAGE_VIEW_ARCHIVE_DIR')
+@click.option('--batch-size', type=int, default=None, help='每个删除事务的记录数，默认为PAGE_VIEW_PURGE_BATCH_SIZE')
+@click.option('--pause', default=0.05, show_default=True, help='两批删除之间暂停的秒数')
+@click.option('--vacuum', is_flag=True, help='完成后执行VACUUM收缩数据库文件（期间会阻塞写入）')
+def archive_page_views_command(days, archive_dir, batch_size, pause, vacuum):
+    """归档并删除保留期限之前的访问记录"""
+    days = app.config['PAGE_VIEW_RETENTION_DAYS'] if days is None else days
+    archive_dir = archive_dir or app.config['PAGE_VIEW_ARCHIVE_DIR']
+    batch_size = batch_size or app.config['PAGE_VIEW_PURGE_BATCH_SIZE']
+    archived, deleted = archive_page_views(days, archive_dir, batch_size, pause, click.echo)
+    click.echo(f'已归档 {archived} 天、删除 {deleted} 条访问记录')
+    if vacuum and deleted:
+        with db.engine.connect() as conn:
+            conn.execution_options(isolation_level='AUTOCOMMIT').exec_driver_sql('VACUUM')
+        click.echo('数据库文件已收缩')
+
+@app.cli.command('generate-data')
+@click.option('--preset', type=click.Choice(['small', 'medium', 'large']), default='small', show_default=True,
+              help='数据规模，下面的数量参数可单独覆盖')
+@click.option('--users', type=int, help='用户数')
+@click.option('--posts', type=int, help='文章数')
+@click.option('--comments', type=int, help='评论数')
+@click.option('--page-views', type=int, help='访问记录数')
+@click.option('--days', type=int, help='数据覆盖的天数')
+@click.option('--seed', default=0, show_default=True, help='随机种子，相同参数和种子生成相同的数据')
+@click.option('--batch-size', default=20000, show_default=True, help='每个事务写入的行数')
+@click.option('--skip-related', is_flag=True, help='不计算相关文章')
+@click.option('--skip-rollups', is_flag=True, help='不重建访问汇总表')
+def generate_data(preset, seed, batch_size, skip_related, skip_rollups, **counts):
+    """批量生成测试用的用户、文章、评论和访问记录"""
+    import time
+    import datagen
+    options = dict(datagen.PRESETS[preset])
+    options.update((key, value) for key, value in counts.items() if value is not None)
+    upgrade_database(click.echo)
+    result = datagen.generate(db.session, seed=seed, batch_size=batch_size, echo=click.echo, **options)
+    for name, (count, seconds) in result.items():
+        click.echo(f'{name}: {count} 行，耗时 {seconds:.1f} 秒（{count / max(seconds, 1e-6):.0f} 行/秒）')
+    if not skip_related:
+        started = time.perf_counter()
+        related.rebuild(db.session)
+        db.session.commit()
+        click.echo(f'相关文章计算完成，耗时 {time.perf_counter() - started:.1f} 秒')
+    if not skip_rollups:
+        started = time.perf_counter()
+        rebuild_rollups(echo=lambda message: None)
+        click.echo(f'访问汇总表重建完成，耗时 {time.perf_counter() - started:.1f} 秒')
+    # 数据是绕过应用写入的，清空页面缓存和所有进程的数据缓存
+    page_cache.clear()
+    data_cache.clear()
+
+@app.cli.command('export-static')
+@click.option('--output', default='dist', show_default=True, help='输出目录')
+@click.option('--workers', type=int, default=None, help='渲染进程数，默认为CPU核数')
+@click.option('--full', is_flag=True, help='重新渲染所有页面，而不仅是有变化的')
+def export_static(output, workers, full):
+    """把前台页面导出为静态HTML文件"""
+    from static_export import export
+    export(output, workers=workers, full=full, echo=click.echo)
+
+def index_posts(batch_size=500):
+    """重建文章全文搜索索引，返回文章数"""
+    db.session.execute(db.text('DELETE FROM post_fts'))
+    last_id = 0
+    total = 0
+    while True:
+        batch = db.session.query(Post.id, Post.title, Post.tags, Post.content).filter(
+            Post.id > last_id
+        ).order_by(Post.id).limit(batch_size).all()
+        if not batch:
+            break
+        for row in batch:
+            search.index_post(db.session, row.id, row.title, row.tags, row.content)
+        db.session.commit()
+        last_id = batch[-1].id
+        total += len(batch)
+    db.session.commit()
+    return total
+
+@app.cli.command('rebuild-search-index')
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的文章数')
+def rebuild_search_index(batch_size):
+    """重建文章全文搜索索引"""
+    click.echo(f'已为 {index_posts(batch_size)} 篇文章建立索引')
+
+def compute_related_posts():
+    """全量重新计算所有文章的相关文章，返回文章数"""
+    total = related.rebuild(db.session)
+    db.session.commit()
+    return total
+
+@app.cli.command('rebuild-related-posts')
+def rebuild_related_posts():
+    """全量重新计算所有文章的相关文章"""
+    import time
+    started = time.perf_counter()
+    total = compute_related_posts()
+    click.echo(f'已为 {total} 篇文章计算相关文章，耗时 {time.perf_counter() - started:.1f} 秒')
+
+def render_posts(rerender_all=False, workers=None, batch_size=200):
+    """渲染正文或渲染规则有变化的文章（rerender_all时渲染所有文章），返回渲染的文章数"""
+    import multiprocessing
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    workers = workers or os.cpu_count() or 1
+
+    def batches():
+        # 按id分批读取，只保留内容哈希与当前渲染规则不一致的文章
+        last_id = 0
+        while True:
+            rows = db.session.query(Post.id, Post.content, Post.content_hash).filter(
+                Post.id > last_id
+            ).order_by(Post.id).limit(batch_size).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            stale = [row for row in rows if rerender_all or row.content_hash != rendering.content_hash(row.content)]
+            if stale:
+                yield [row.id for row in stale], [row.content for row in stale]
+
+    total = 0
+
+    def save(ids, results):
+        nonlocal total
+        # 渲染结果变化算作文章修改：更新updated_at，增量静态导出和Last-Modified才能发现
+        now = datetime.utcnow()
+        db.session.execute(db.update(Post), [
+            dict(id=id, rendered_html=result.html, reading_time=result.reading_time, content_hash=result.content_hash,
+                 updated_at=now)
+            for id, result in zip(ids, results)
+        ])
+        db.session.commit()
+        total += len(ids)
+
+    if workers == 1:
+        for ids, contents in batches():
+            save(ids, rendering.render_many(contents, app.static_folder))
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            # 最多同时提交workers*2个任务，内存占用不随文章数增长
+            pending = deque()
+            for ids, contents in batches():
+                pending.append((ids, pool.submit(rendering.render_many, contents, app.static_folder)))
+                if len(pending) >= workers * 2:
+                    ids, future = pending.popleft()
+                    save(ids, future.result())
+            while pending:
+                ids, future = pending.popleft()
+                save(ids, future.result())
+    # 详情页的正文变化，清空页面缓存
+    page_cache.clear()
+    return total
+
+@app.cli.command('rerender-posts')
+@click.option('--all', 'rerender_all', is_flag=True, help='重新渲染所有文章，而不仅是正文或渲染规则有变化的')
+@click.option('--workers', type=int, default=None, help='渲染进程数，默认为CPU核数')
+@click.option('--batch-size', default=200, show_default=True, help='每个渲染任务的文章数')
+def rerender_posts(rerender_all, workers, batch_size):
+    """用当前的渲染规则重新渲染文章正文"""
+    import time
+    started = time.perf_counter()
+    total = render_posts(rerender_all, workers, batch_size)
+    click.echo(f'已重新渲染 {total} 篇文章，耗时 {time.perf_counter() - started:.1f} 秒')
+
+def fill_excerpts(rebuild_all=False, batch_size=500):
+    """为缺少摘要的文章（rebuild_all时为所有文章）生成摘要，返回文章数"""
+    last_id = 0
+    total = 0
+    while True:
+        query = db.session.query(Post.id, Post.content).filter(Post.id > last_id)
+        if not rebuild_all:
+            query = query.filter(Post.excerpt.is_(None))
+        batch = query.order_by(Post.id).limit(batch_size).all()
+        if not batch:
+            break
+        db.session.execute(db.update(Post), [dict(id=row.id, excerpt=make_excerpt(row.content)) for row in batch])
+        db.session.commit()
+        last_id = batch[-1].id
+        total += len(batch)
+    return total
+
+@app.cli.command('backfill-excerpts')
+@click.option('--all', 'rebuild_all', is_flag=True, help='重新生成所有文章的摘要，而不仅是缺失的')
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的文章数')
+def backfill_excerpts(rebuild_all, batch_size):
+    """为文章生成摘要"""
+    click.echo(f'已生成 {fill_excerpts(rebuild_all, batch_size)} 篇文章的摘要')
+
+def sync_post_tags(batch_size=500):
+    """把文章的标签字符串同步到tag和post_tag表，已同步的文章不变，返回文章数"""
+    last_id = 0
+    total = 0
+    while True:
+        batch = db.session.query(Post.id, Post.tags).filter(Post.id > last_id).order_by(Post.id).limit(batch_size).all()
+        if not batch:
+            break
+        for row in batch:
+            tagging.sync_post(db.session, row.id, tagging.parse_tags(row.tags))
+        db.session.commit()
+        last_id = batch[-1].id
+        total += len(batch)
+    data_cache.invalidate('categories', 'popular_tags')
+    return total
+
+@app.cli.command('rebuild-tags')
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的文章数')
+def rebuild_tags(batch_size):
+    """根据文章的标签字符串更新tag和post_tag表"""
+    click.echo(f'已更新 {sync_post_tags(batch_size)} 篇文章的标签')
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,154 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """后台线程批量写入的有界内存队列
+
+    请求线程只把记录放进有界队列，后台线程按数量或时间阈值取出一批交给写入函数，
+    避免每个请求都占用一次SQLite写锁。队列满时直接丢弃并计数。
+    写入失败（如数据库被锁）时按retry_delay、2*retry_delay……等待后重试，最多retries次，
+    仍然失败才记录日志并交给discard(batch)处理（如逐条写入、通知调用方），没有设置discard时直接丢弃；
+    discard可以返回其中实际写入的条数。子类通过thread_name区分后台线程。
+    """
+
+    thread_name = 'batch-writer'
+
+    def __init__(self, flush, max_size=10000, batch_size=500, flush_interval=1.0, retries=2, retry_delay=0.2,
+                 discard=None):
+        self._flush = flush
+        self._discard = discard
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        # 统计计数
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.retried = 0
+        self.errors = 0
+
+    def record(self, row):
+        """放入一条记录，队列已满时返回False"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def _ensure_started(self):
+        # fork出的worker进程不会继承父进程的线程，需要按进程重新启动
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+
+    def _take_batch(self, timeout):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        for attempt in range(self.retries + 1):
+            try:
+                # 写入函数可以返回实际写入的条数（如过滤掉了一部分记录）
+                written = self._flush(batch)
+            except Exception:
+                if attempt < self.retries:
+                    self.retried += 1
+                    logger.warning('%s写入%d条记录失败，第%d次重试', self.thread_name, len(batch), attempt + 1)
+                    time.sleep(self.retry_delay * 2 ** attempt)
+                    continue
+                self.errors += 1
+                logger.exception('%s写入%d条记录失败，已重试%d次，放弃这一批', self.thread_name, len(batch), self.retries)
+                self._give_up(batch)
+                return
+            self.written += len(batch) if written is None else written
+            self.batches += 1
+            return
+
+    def _give_up(self, batch):
+        if self._discard is None:
+            return
+        try:
+            written = self._discard(batch)
+        except Exception:
+            logger.exception('%s处理写入失败的%d条记录时出错', self.thread_name, len(batch))
+            return
+        self.written += written or 0
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        self._write(batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._write(self._take_batch(self.flush_interval))
+        self._drain()
+
+    def flush(self):
+        """在当前线程中立即写入队列中的全部记录"""
+        self._drain()
+
+    def close(self, timeout=5.0):
+        """停止后台线程并写入剩余记录，进程退出时调用"""
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and thread.is_alive():
+            self._stop.set()
+            thread.join(timeout)
+        self._thread = None
+        self._drain()
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'written': self.written,
+            'batches': self.batches,
+            'retried': self.retried,
+            'errors': self.errors,
+        }
@@ -0,0 +1,207 @@
+"""评论洪峰期间的读请求延迟
+
+用生成的数据启动Gunicorn，读连接持续请求文章详情页，先单独测量一段时间，再同时以--rate条/秒
+发表评论（同一IP、同一会话，模拟刷评论），比较两段时间内读请求的延迟分位数。每种模式使用一份新的数据库：
+
+- legacy：每条评论立即写入并提交（关闭限流、重复检测和队列，相当于原来的实现）；
+- batched：评论进入队列批量写入，不限流；
+- limited：默认配置，限流、重复检测后批量写入。
+
+用法: python benchmarks/bench_comment_burst.py [--rate 1000] [--duration 10] [--readers 4]
+"""
+import argparse
+import http.client
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from load_test import CSRF_TOKEN, POST_LINK, percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {
+    'legacy': {'COMMENT_ASYNC': '0', 'COMMENT_RATE_PER_MINUTE': '0', 'COMMENT_IP_RATE_PER_MINUTE': '0',
+               'COMMENT_DUPLICATE_WINDOW': '0'},
+    'batched': {'COMMENT_RATE_PER_MINUTE': '0', 'COMMENT_IP_RATE_PER_MINUTE': '0', 'COMMENT_DUPLICATE_WINDOW': '0'},
+    'limited': {},
+}
+
+
+def app_env(db_path, port, extra=()):
+    env = dict(os.environ, SECRET_KEY=os.environ.get('SECRET_KEY', 'bench'), DATABASE_URL='sqlite:///' + db_path,
+               BIND=f'127.0.0.1:{port}', ACCESS_LOG='/dev/null', FLASK_APP='app')
+    env.update(extra)
+    return env
+
+
+def prepare(data_dir, posts):
+    db_path = os.path.join(data_dir, 'seed.db')
+    env = app_env(db_path, 0)
+    flask = [sys.executable, '-m', 'flask']
+    subprocess.run(flask + ['init-db'], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(flask + ['generate-data', '--users', '5', '--posts', str(posts), '--comments', str(posts * 10),
+                            '--page-views', '0', '--skip-related'],
+                   cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    return db_path
+
+
+class Client:
+    """保持连接和会话Cookie的HTTP客户端"""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        self.cookie = None
+
+    def request(self, method, url, body=None):
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.conn.request(method, url, body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+            return None, b''
+        if self.cookie is None and response.getheader('Set-Cookie'):
+            self.cookie = response.getheader('Set-Cookie').split(';')[0]
+        return response.status, data
+
+
+def reader(port, posts, stop, timings, seed):
+    rng = random.Random(seed)
+    client = Client(port)
+    while not stop.is_set():
+        started = time.perf_counter()
+        status, _ = client.request('GET', quote(rng.choice(posts)))
+        if status == 200:
+            timings.append((time.monotonic(), time.perf_counter() - started))
+
+
+def spammer(port, posts, rate, stop, statuses, seed):
+    """按固定速率发表评论，落后于计划时不等待"""
+    rng = random.Random(seed)
+    client = Client(port)
+    url = quote(posts[0])
+    _, html = client.request('GET', url)
+    token = CSRF_TOKEN.search(html.decode()).group(1)
+    interval = 1.0 / rate
+    next_at = time.monotonic()
+    sent = 0
+    while not stop.is_set():
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        next_at += interval
+        sent += 1
+        body = urllib.parse.urlencode({
+            'csrf_token': token, 'author': 'spam', 'content': f'广告评论 {seed}-{sent} {rng.random()}',
+        })
+        status, _ = client.request('POST', quote(rng.choice(posts)), body)
+        statuses.append(status)
+
+
+def quote(path):
+    return urllib.parse.quote(path)
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status, html = Client(port).request('GET', '/blog/')
+        if status == 200:
+            return html.decode()
+        time.sleep(0.2)
+    raise SystemExit('服务没有启动')
+
+
+def summarize(timings, start, end):
+    values = [latency * 1000 for at, latency in timings if start <= at < end]
+    if not values:
+        return 0, 0, 0, 0
+    return len(values), percentile(values, 50), percentile(values, 95), percentile(values, 99)
+
+
+def run_mode(mode, seed_db, data_dir, args):
+    db_path = os.path.join(data_dir, f'{mode}.db')
+    shutil.copy(seed_db, db_path)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'], cwd=ROOT,
+        env=app_env(db_path, args.port, dict(MODES[mode], WEB_CONCURRENCY=str(args.workers))),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        posts = sorted(set(POST_LINK.findall(wait_ready(args.port))))
+        stop = threading.Event()
+        burst_stop = threading.Event()
+        timings = []
+        statuses = []
+        readers = [threading.Thread(target=reader, args=(args.port, posts, stop, timings, i), daemon=True)
+                   for i in range(args.readers)]
+        for thread in readers:
+            thread.start()
+        time.sleep(1)  # 预热页面缓存
+        quiet_start = time.monotonic()
+        time.sleep(args.duration)
+        burst_start = time.monotonic()
+        spammers = [threading.Thread(target=spammer, daemon=True,
+                                     args=(args.port, posts, args.rate / args.spammers, burst_stop, statuses, i))
+                    for i in range(args.spammers)]
+        for thread in spammers:
+            thread.start()
+        time.sleep(args.duration)
+        burst_stop.set()
+        burst_end = time.monotonic()
+        stop.set()
+        for thread in readers + spammers:
+            thread.join()
+        time.sleep(1)  # 等待队列中的评论写入
+        with sqlite3.connect(db_path) as conn:
+            stored = conn.execute('SELECT count(*) FROM comment').fetchone()[0]
+        with sqlite3.connect(seed_db) as conn:
+            stored -= conn.execute('SELECT count(*) FROM comment').fetchone()[0]
+    finally:
+        server.terminate()
+        server.wait()
+    counts = {status: statuses.count(status) for status in set(statuses)}
+    return (summarize(timings, quiet_start, burst_start), summarize(timings, burst_start, burst_end),
+            len(statuses) / (burst_end - burst_start), counts, stored)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rate', type=float, default=1000, help='评论洪峰的目标速率（条/秒）')
+    parser.add_argument('--duration', type=float, default=10, help='平稳阶段和洪峰阶段各自的时长（秒）')
+    parser.add_argument('--readers', type=int, default=4, help='读连接数')
+    parser.add_argument('--spammers', type=int, default=8, help='发表评论的连接数')
+    parser.add_argument('--workers', type=int, default=2, help='Gunicorn进程数')
+    parser.add_argument('--posts', type=int, default=50)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp()
+    try:
+        seed_db = prepare(data_dir, args.posts)
+        print(f'{"mode":<9}{"phase":<7}{"reads":>7}{"p50(ms)":>9}{"p95(ms)":>9}{"p99(ms)":>9}'
+              f'{"comments/s":>12}  statuses                 stored')
+        for mode in args.modes.split(','):
+            quiet, burst, rate, counts, stored = run_mode(mode, seed_db, data_dir, args)
+            print(f'{mode:<9}{"quiet":<7}{quiet[0]:>7}{quiet[1]:>9.1f}{quiet[2]:>9.1f}{quiet[3]:>9.1f}')
+            statuses = ' '.join(f'{status}:{count}' for status, count in sorted(counts.items(), key=str))
+            print(f'{"":<9}{"burst":<7}{burst[0]:>7}{burst[1]:>9.1f}{burst[2]:>9.1f}{burst[3]:>9.1f}'
+                  f'{rate:>12.0f}  {statuses:<24} {stored}')
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
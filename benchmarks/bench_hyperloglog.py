@@ -0,0 +1,50 @@
+"""比较HyperLogLog估算的UV与精确值，并测量按天草图合并的耗时
+
+用法: python benchmarks/bench_hyperloglog.py [误差] [天数] [每天会话数]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hyperloglog import HyperLogLog
+
+
+def main():
+    error = float(sys.argv[1]) if len(sys.argv) > 1 else 0.02
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    per_day = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+    rng = random.Random(42)
+    population = [f'session-{i}' for i in range(days * per_day)]
+
+    exact_total = set()
+    sketches = []
+    worst = 0.0
+    print(f'{"day":<6}{"exact":>10}{"estimate":>10}{"error":>9}')
+    for day in range(days):
+        # 每天的访客中有一部分是老访客
+        sessions = set(rng.sample(population, per_day))
+        sketch = HyperLogLog.from_error(error).update(sessions)
+        sketches.append(HyperLogLog.from_bytes(sketch.to_bytes()))
+        exact_total |= sessions
+        relative = abs(sketch.count() - len(sessions)) / len(sessions)
+        worst = max(worst, relative)
+        if day < 5:
+            print(f'{day:<6}{len(sessions):>10}{sketch.count():>10}{relative:>9.2%}')
+
+    start = time.perf_counter()
+    merged = HyperLogLog.merge_all(sketches)
+    elapsed = (time.perf_counter() - start) * 1000
+    total_error = abs(merged.count() - len(exact_total)) / len(exact_total)
+    print(f'precision p={merged.p}, target error {error:.2%}, worst daily error {worst:.2%}')
+    print(f'all-time: exact {len(exact_total)}, estimate {merged.count()}, error {total_error:.2%}')
+    print(f'merged {days} daily sketches in {elapsed:.2f} ms, '
+          f'{sum(len(s.to_bytes()) for s in sketches) / days:.0f} bytes per sketch')
+    if total_error > 3 * error:
+        sys.exit('estimate outside 3 standard errors')
+
+
+if __name__ == '__main__':
+    main()
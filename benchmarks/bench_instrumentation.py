@@ -0,0 +1,67 @@
+"""测量请求级性能统计的开销
+
+在生成的数据上交替关闭和开启INSTRUMENTATION_ENABLED请求同一组页面，比较两者的耗时中位数。
+
+用法: python benchmarks/bench_instrumentation.py [每轮请求数]，默认200
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'instrumentation.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['TRACK_PAGE_VIEWS'] = '0'
+os.environ['PAGE_CACHE_ENABLED'] = '0'
+# 不让慢请求日志影响测量
+os.environ['SLOW_REQUEST_MS'] = '1000000'
+
+from app import app, db, Post, init_database
+import datagen
+import related
+
+ROUNDS = 5
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def main():
+    per_round = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with app.app_context():
+        init_database(lambda message: None)
+        datagen.generate(db.session, users=5, posts=500, comments=5000, page_views=0, days=60,
+                         echo=lambda message: None)
+        related.rebuild(db.session)
+        db.session.commit()
+        busiest = Post.query.order_by(Post.comment_count.desc()).first()
+    urls = ['/blog/', f'/blog/post/{busiest.slug}', f'/blog/post/{busiest.slug}/comments', '/blog/search?q=Python']
+    client = app.test_client()
+    timings = {url: {False: [], True: []} for url in urls}
+    for url in urls:
+        for _ in range(20):
+            client.get(url)
+    # 交替测量，抵消机器负载的波动
+    for _ in range(ROUNDS):
+        for enabled in (False, True):
+            app.config['INSTRUMENTATION_ENABLED'] = enabled
+            for url in urls:
+                for _ in range(per_round // ROUNDS):
+                    started = time.perf_counter()
+                    client.get(url)
+                    timings[url][enabled].append((time.perf_counter() - started) * 1000)
+
+    print(f'{"url":<40}{"off p50":>10}{"on p50":>10}{"overhead":>10}')
+    for url in urls:
+        off = percentile(timings[url][False], 50)
+        on = percentile(timings[url][True], 50)
+        print(f'{url[:40]:<40}{off:>10.3f}{on:>10.3f}{(on - off) / off * 100:>9.1f}%')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""对比 /blog/ 在关闭访问统计、同步写入、异步批量写入三种模式下的延迟
+
+用法: python benchmarks/bench_pageviews.py [请求数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['PAGE_CACHE_ENABLED'] = '0'
+
+from app import app, db, User, Post, PageView, page_view_buffer, init_database
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def seed():
+    with app.app_context():
+        admin = User.query.filter_by(username='admin').first()
+        for i in range(20):
+            db.session.add(Post(title=f'Post {i}', content='<p>内容</p>' * 50,
+                                author_id=admin.id, slug=f'post-{i}', category='技术'))
+        db.session.commit()
+
+
+def run(mode, requests):
+    app.config['TRACK_PAGE_VIEWS'] = mode != 'off'
+    app.config['PAGE_VIEW_ASYNC'] = mode == 'async'
+    client = app.test_client()
+    client.get('/blog/')
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get('/blog/')
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    with app.app_context():
+        init_database(lambda message: None)
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    seed()
+    print(f'{"mode":<8}{"p50(ms)":>10}{"p99(ms)":>10}{"req/s":>10}')
+    for mode in ('off', 'sync', 'async'):
+        timings = run(mode, requests)
+        print(f'{mode:<8}{percentile(timings, 50):>10.2f}{percentile(timings, 99):>10.2f}'
+              f'{len(timings) / (sum(timings) / 1000):>10.0f}')
+    page_view_buffer.close()
+    with app.app_context():
+        print(f'page views stored: {PageView.query.count()}, buffer: {page_view_buffer.stats()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""比较文章列表全量加载与游标分页在不同数据量下的耗时
+
+用法: python benchmarks/bench_pagination.py [文章数 ...]，默认10000和100000
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['TRACK_PAGE_VIEWS'] = '0'
+
+from app import app, db, Post, paginate_posts, init_database
+
+CONTENT = '<p>' + '这是一段用于测试的文章内容。' * 200 + '</p>'
+
+
+def seed(total):
+    """补足文章数量到total"""
+    with app.app_context():
+        existing = Post.query.count()
+        start = datetime(2020, 1, 1)
+        rows = [
+            dict(title=f'Post {i}', content=CONTENT, author_id=1, slug=f'post-{i}',
+                 category=f'分类{i % 10}', created_at=start + timedelta(minutes=i), updated_at=start)
+            for i in range(existing, total)
+        ]
+        for i in range(0, len(rows), 5000):
+            db.session.execute(Post.__table__.insert(), rows[i:i + 5000])
+        db.session.commit()
+
+
+def measure(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        db.session.expunge_all()
+    return min(timings), peak / 1024 / 1024
+
+
+def main():
+    with app.app_context():
+        init_database(lambda message: None)
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    print(f'{"posts":>8} {"strategy":<22}{"ms":>10}{"peak MB":>10}')
+    for size in sizes:
+        seed(size)
+        with app.test_request_context('/blog/'):
+            results = [
+                ('full load', measure(lambda: Post.query.order_by(Post.created_at.desc()).all())),
+                ('keyset first page', measure(lambda: paginate_posts(Post.query, app.config['POSTS_PER_PAGE']))),
+            ]
+            middle = paginate_posts(Post.query.filter(Post.id <= size // 2), 1).next_cursor
+        with app.test_request_context('/blog/', query_string={'after': middle}):
+            results.append(
+                ('keyset middle page', measure(lambda: paginate_posts(Post.query, app.config['POSTS_PER_PAGE'])))
+            )
+        for name, (elapsed, peak) in results:
+            print(f'{size:>8} {name:<22}{elapsed:>10.2f}{peak:>10.1f}')
+
+if __name__ == '__main__':
+    main()
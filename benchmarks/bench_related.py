@@ -0,0 +1,121 @@
+"""测量相关文章的全量计算耗时和单篇文章保存时的增量更新耗时
+
+用法: python benchmarks/bench_related.py [文章数 ...]，默认10000和50000
+"""
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['TRACK_PAGE_VIEWS'] = '0'
+os.environ['PAGE_CACHE_ENABLED'] = '0'
+
+from sqlalchemy import text
+from app import app, db, Post, RelatedPost, init_database
+import related
+import search
+from htmltext import strip_html
+from tagging import parse_tags
+
+CHARS = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处理世车'
+_rng = random.Random(0)
+WORDS = list(dict.fromkeys(_rng.choice(CHARS) + _rng.choice(CHARS) for _ in range(4000)))[:3000]
+# 词频服从Zipf分布
+CUM_WEIGHTS = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(WORDS))))
+TAGS = [f'标签{i}' for i in range(500)]
+TAG_WEIGHTS = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(TAGS))))
+CATEGORIES = ['技术', '生活', '读书', '旅行', '随笔', '工具', '前端', '数据库']
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def seed(start_id, total, rng):
+    """补足文章到total篇，同时写入全文索引和标签表"""
+    start = datetime(2020, 1, 1)
+    with app.app_context():
+        for offset in range(start_id, total, 5000):
+            posts = []
+            entries = []
+            for i in range(offset, min(total, offset + 5000)):
+                title = ''.join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=3))
+                tags = ', '.join(rng.choices(TAGS, cum_weights=TAG_WEIGHTS, k=3))
+                content = '<p>' + '，'.join(''.join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=6)) for _ in range(40)) + '。</p>'
+                posts.append(dict(id=i + 1, title=title, content=content, author_id=1, slug=f'post-{i}',
+                                  category=rng.choice(CATEGORIES), tags=tags,
+                                  created_at=start + timedelta(minutes=i), updated_at=start))
+                entries.append(dict(id=i + 1, title=search.index_text(title), tags=search.index_text(tags),
+                                    content=search.index_text(strip_html(content))))
+            db.session.execute(Post.__table__.insert(), posts)
+            db.session.execute(
+                text('INSERT INTO post_fts (rowid, title, tags, content) VALUES (:id, :title, :tags, :content)'),
+                entries
+            )
+            links = [dict(post_id=post['id'], name=name) for post in posts for name in parse_tags(post['tags'])]
+            db.session.execute(text('INSERT INTO tag (name, post_count) VALUES (:name, 0) ON CONFLICT (name) DO NOTHING'),
+                               [dict(name=name) for name in Counter(link['name'] for link in links)])
+            db.session.execute(text(
+                'INSERT INTO post_tag (tag_id, post_id, created_at) '
+                'SELECT tag.id, post.id, post.created_at FROM tag, post WHERE tag.name = :name AND post.id = :post_id'
+            ), links)
+            db.session.commit()
+        db.session.execute(text(
+            'UPDATE tag SET post_count = (SELECT count(*) FROM post_tag WHERE post_tag.tag_id = tag.id)'
+        ))
+        db.session.commit()
+
+
+def measure(total):
+    with app.app_context():
+        started = time.perf_counter()
+        related.rebuild(db.session)
+        db.session.commit()
+        rebuild_seconds = time.perf_counter() - started
+
+        rng = random.Random(2)
+        updates = []
+        for post_id in rng.sample(range(1, total + 1), 30):
+            post = db.session.get(Post, post_id)
+            started = time.perf_counter()
+            related.update_post(db.session, post.id, post.title, post.tags, post.content)
+            db.session.commit()
+            updates.append((time.perf_counter() - started) * 1000)
+
+        lookups = []
+        for post_id in rng.sample(range(1, total + 1), 200):
+            started = time.perf_counter()
+            Post.query.options(db.defer(Post.content)).join(
+                RelatedPost, RelatedPost.related_id == Post.id
+            ).filter(RelatedPost.post_id == post_id).order_by(RelatedPost.score.desc()).limit(3).all()
+            lookups.append((time.perf_counter() - started) * 1000)
+        db.session.remove()
+    print(f'{total:>8}{rebuild_seconds:>14.1f}{percentile(updates, 50):>13.1f}{percentile(updates, 99):>13.1f}'
+          f'{percentile(lookups, 50):>13.2f}')
+
+
+def main():
+    with app.app_context():
+        init_database(lambda message: None)
+    sizes = sorted(int(arg) for arg in sys.argv[1:]) or [10000, 50000]
+    rng = random.Random(1)
+    print(f'{"posts":>8}{"rebuild(s)":>14}{"update p50":>13}{"update p99":>13}{"lookup p50":>13}')
+    seeded = 0
+    for total in sizes:
+        seed(seeded, total, rng)
+        seeded = total
+        measure(total)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""各路由的基准测试和性能回归检查
+
+在不同规模的生成数据（datagen.PRESETS）上用Flask测试客户端请求app.py中的每个页面，记录每个路由的
+延迟分位数、SQL查询数和查询返回的总行数，并与保存的基线比较：延迟超过基线的(1+阈值)倍、
+查询数增加或返回行数超过阈值时，输出差异报告并以非零状态退出。
+
+生成的数据库缓存在--data-dir中，再次运行时直接复用。应用导入时就确定了数据库地址，
+因此每种规模在单独的子进程中测量。页面缓存关闭，数据缓存（分类、标签、用户）只在进程内失效，
+测量的是页面缓存未命中时的耗时。只请求GET页面，测量过程不修改数据；
+发表评论、保存和删除文章以及退出登录不在测试范围内。
+
+用法:
+    python benchmarks/bench_routes.py                       # 与基线比较
+    python benchmarks/bench_routes.py --update-baseline     # 记录新的基线
+    python benchmarks/bench_routes.py --sizes small,medium --threshold 0.3 --repeat 50
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baselines', 'routes.json')
+LATENCY_METRICS = ('p50', 'p95', 'p99')
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def prepare(size, seed):
+    """数据库为空时按预设规模生成数据，返回[(路由名, URL, 是否需要登录, 预期的状态码)]"""
+    from app import app, db, Post, Comment, Tag, User, init_database, rebuild_rollups
+    from pagination import encode_cursor
+    import datagen
+    import related
+
+    with app.app_context():
+        init_database(lambda message: None)
+        if not Post.query.count():
+            echo = lambda message: print(message, file=sys.stderr)
+            datagen.generate(db.session, seed=seed, echo=echo, **datagen.PRESETS[size])
+            related.rebuild(db.session)
+            db.session.commit()
+            rebuild_rollups(echo=echo)
+            # 生成的文章都属于普通用户，管理员只能编辑自己的文章，把排在中间的一篇交给管理员
+            middle = Post.query.order_by(Post.created_at.desc(), Post.id.desc()).offset(Post.query.count() // 2).first()
+            middle.author_id = User.query.filter_by(username='admin').first().id
+            db.session.commit()
+
+        admin = User.query.filter_by(username='admin').first()
+        editable = Post.query.filter_by(author_id=admin.id).order_by(Post.created_at.desc(), Post.id.desc()).first()
+        if editable is None:
+            raise SystemExit(f'{size}规模的数据中没有管理员的文章，请删除缓存的数据库后重新生成')
+        busiest = Post.query.order_by(Post.comment_count.desc(), Post.id).first()
+        middle = Post.query.order_by(Post.created_at.desc(), Post.id.desc()).offset(Post.query.count() // 2).first()
+        second_page = Comment.query.filter_by(post_id=busiest.id).order_by(
+            Comment.created_at.desc(), Comment.id.desc()
+        ).offset(app.config['COMMENTS_PER_PAGE'] - 1).first()
+        category = db.session.query(Post.category).group_by(Post.category).order_by(
+            db.func.count().desc()
+        ).limit(1).scalar()
+        tag = Tag.query.order_by(Tag.post_count.desc()).first()
+        common_word = datagen.Vocabulary(random.Random(seed)).words[0]
+
+        routes = [
+            ('home', '/', False, 302),
+            ('index', '/blog/', False, 200),
+            ('index (deep page)', f'/blog/?after={encode_cursor(middle.created_at, middle.id)}', False, 200),
+            ('post_detail (most comments)', f'/blog/post/{busiest.slug}', False, 200),
+            ('post_detail (median)', f'/blog/post/{middle.slug}', False, 200),
+            ('post_comments (page 2)', f'/blog/post/{busiest.slug}/comments'
+                                       f'?after={encode_cursor(second_page.created_at, second_page.id)}'
+                                       if second_page else f'/blog/post/{busiest.slug}/comments', False, 200),
+            ('category_posts', f'/blog/category/{category}', False, 200),
+            ('tag_posts', f'/blog/tag/{tag.name}', False, 200),
+            ('search_posts (common)', f'/blog/search?q={common_word}', False, 200),
+            ('search_posts (rare)', '/blog/search?q=不存在的词', False, 200),
+            ('login', '/login', False, 200),
+            ('admin_dashboard', '/admin', True, 200),
+            ('new_post', '/admin/post/new', True, 200),
+            ('edit_post', f'/admin/post/{editable.id}/edit', True, 200),
+        ]
+        return routes, admin.id
+
+
+def measure_route(client, url, repeat):
+    """返回(状态码, 延迟列表ms, 查询数, 返回行数)"""
+    from sqlalchemy import event
+    from app import app, db
+
+    for _ in range(2):
+        client.get(url)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            status = client.get(url).status_code
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        # 在计时之外重新执行每条查询，统计返回的行数
+        rows = 0
+        with db.engine.connect() as conn:
+            for statement, parameters in statements:
+                if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+                    rows += conn.exec_driver_sql(f'SELECT count(*) FROM ({statement})', parameters).scalar()
+    return status, timings, len(statements), rows
+
+
+def run_size(size, seed, repeat):
+    """在当前进程的数据库上测量所有路由（子进程中执行）"""
+    from app import app
+
+    routes, admin_id = prepare(size, seed)
+    anonymous = app.test_client()
+    admin = app.test_client()
+    with admin.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+
+    results = {}
+    for name, url, login, expected in routes:
+        status, timings, queries, rows = measure_route(admin if login else anonymous, url, repeat)
+        if status != expected:
+            # 重定向或错误页的耗时不能代表该路由，直接失败
+            raise SystemExit(f'{size} {name} 返回 {status}，应为 {expected}')
+        results[name] = dict(url=url, status=status, p50=round(percentile(timings, 50), 3),
+                             p95=round(percentile(timings, 95), 3), p99=round(percentile(timings, 99), 3),
+                             queries=queries, rows=rows)
+        print(f'{size:<8}{name:<30}{results[name]["p50"]:>9.2f}{results[name]["p99"]:>9.2f}'
+              f'{queries:>9}{rows:>9}', file=sys.stderr)
+    return results
+
+
+def run_child(size, args):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(args.data_dir, f'{size}-{args.seed}.db'),
+               TRACK_PAGE_VIEWS='0', PAGE_CACHE_ENABLED='0', DATA_CACHE_BACKEND='local')
+    env.setdefault('SECRET_KEY', 'bench')
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', size, '--seed', str(args.seed),
+         '--repeat', str(args.repeat)],
+        cwd=ROOT, env=env, check=True, stdout=subprocess.PIPE, text=True
+    ).stdout
+    return json.loads(output)
+
+
+def compare(baseline, current, threshold, min_delta_ms, gated=('p50',)):
+    """比较两次结果，返回(报告行, 失败数)；每个路由一行，列出各指标的基线值和本次的值
+
+    延迟只检查gated中的分位数：请求次数不多时高分位数波动大，默认只用中位数判断回归。
+    """
+    metrics = ('p50', 'p95', 'queries', 'rows')
+    lines = [f'{"size":<8}{"route":<30}' + ''.join(f'{metric:>23}' for metric in metrics) + '  status']
+    failures = 0
+    for size, routes in current.items():
+        for name, result in routes.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                lines.append(f'{size:<8}{name:<30}' + ''.join(f'{result[metric]:>23}' for metric in metrics) + '  new')
+                continue
+            regressed = []
+            if result['status'] != base['status']:
+                regressed.append(f'status {base["status"]}->{result["status"]}')
+            for metric in gated:
+                if result[metric] > base[metric] * (1 + threshold) and result[metric] - base[metric] > min_delta_ms:
+                    regressed.append(metric)
+            if result['queries'] > base['queries']:
+                regressed.append('queries')
+            if result['rows'] > base['rows'] * (1 + threshold):
+                regressed.append('rows')
+            cells = []
+            for metric in metrics:
+                old, new = base[metric], result[metric]
+                change = f' ({(new - old) / old * 100:+.0f}%)' if old and new != old else ''
+                cells.append(f'{f"{old}->{new}{change}":>23}')
+            failures += bool(regressed)
+            lines.append(f'{size:<8}{name:<30}' + ''.join(cells) + '  ' + ('FAIL ' + ', '.join(regressed) if regressed else 'ok'))
+    return lines, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='small,medium', help='逗号分隔的数据规模（datagen的预设名）')
+    parser.add_argument('--seed', type=int, default=0, help='生成数据的随机种子')
+    parser.add_argument('--repeat', type=int, default=30, help='每个路由计时的请求次数')
+    parser.add_argument('--threshold', type=float, default=0.25, help='允许超出基线的比例')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='延迟增加不超过该毫秒数时不算回归')
+    parser.add_argument('--gate', default='p50', help='参与回归判断的延迟分位数，逗号分隔，可选p50、p95、p99')
+    parser.add_argument('--baseline', default=BASELINE, help='基线文件')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'blog-bench-data'),
+                        help='缓存生成的数据库的目录')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果写入基线文件')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    gated = args.gate.split(',')
+    if not set(gated) <= set(LATENCY_METRICS):
+        parser.error(f'--gate 只能包含 {", ".join(LATENCY_METRICS)}')
+
+    if args.child:
+        sys.path.insert(0, ROOT)
+        print(json.dumps(run_size(args.child, args.seed, args.repeat)))
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    current = {size: run_child(size, args) for size in args.sizes.split(',')}
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline.update(current)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'基线已写入 {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        raise SystemExit(f'基线文件 {args.baseline} 不存在，请先使用 --update-baseline 记录基线')
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    lines, failures = compare(baseline, current, args.threshold, args.min_delta_ms, gated)
+    print('\n'.join(lines))
+    if failures:
+        print(f'{failures} 个路由超出基线（阈值 {args.threshold:.0%}）')
+        sys.exit(1)
+    print('所有路由均未超出基线')
+
+
+if __name__ == '__main__':
+    main()
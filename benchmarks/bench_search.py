@@ -0,0 +1,90 @@
+"""测量全文搜索在大量文章上的查询延迟
+
+用法: python benchmarks/bench_search.py [文章数]，默认50000
+"""
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['TRACK_PAGE_VIEWS'] = '0'
+
+from sqlalchemy import text
+from app import app, db, Post, init_database
+import search
+from htmltext import strip_html
+
+CHARS = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处理世车'
+_rng = random.Random(0)
+WORDS = list(dict.fromkeys(_rng.choice(CHARS) + _rng.choice(CHARS) for _ in range(4000)))[:3000]
+WORDS += 'Python Flask SQLite Redis Linux Docker Nginx Tailwind'.split()
+# 词频服从Zipf分布
+CUM_WEIGHTS = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(WORDS))))
+QUERIES = [WORDS[0], WORDS[10], WORDS[500], WORDS[2500], f'{WORDS[1]} {WORDS[50]}',
+           'Flask', CHARS[5], '不存在的词']
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def seed(total):
+    rng = random.Random(1)
+    start = datetime(2020, 1, 1)
+    started = time.perf_counter()
+    with app.app_context():
+        for offset in range(0, total, 5000):
+            posts = []
+            entries = []
+            for i in range(offset, min(total, offset + 5000)):
+                title = ''.join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=3))
+                tags = ', '.join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=2))
+                content = '<p>' + '，'.join(''.join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=6)) for _ in range(40)) + '。</p>'
+                posts.append(dict(id=i + 1, title=title, content=content, author_id=1, slug=f'post-{i}',
+                                  tags=tags, created_at=start + timedelta(minutes=i), updated_at=start))
+                entries.append(dict(id=i + 1, title=search.index_text(title), tags=search.index_text(tags),
+                                    content=search.index_text(strip_html(content))))
+            db.session.execute(Post.__table__.insert(), posts)
+            db.session.execute(
+                text('INSERT INTO post_fts (rowid, title, tags, content) VALUES (:id, :title, :tags, :content)'),
+                entries
+            )
+            db.session.commit()
+    print(f'indexed {total} posts in {time.perf_counter() - started:.1f} s')
+
+
+def main():
+    with app.app_context():
+        init_database(lambda message: None)
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    seed(total)
+    client = app.test_client()
+    print(f'{"query":<14}{"hits":>6}{"p50(ms)":>10}{"p99(ms)":>10}{"route p50":>11}')
+    for query in QUERIES:
+        with app.app_context():
+            hits = len(search.search_ids(db.session, query, 10))
+            timings = []
+            for _ in range(30):
+                started = time.perf_counter()
+                search.search_ids(db.session, query, 10)
+                timings.append((time.perf_counter() - started) * 1000)
+        route = []
+        for _ in range(10):
+            started = time.perf_counter()
+            client.get('/blog/search', query_string={'q': query})
+            route.append((time.perf_counter() - started) * 1000)
+        print(f'{query:<14}{hits:>6}{percentile(timings, 50):>10.2f}{percentile(timings, 99):>10.2f}'
+              f'{percentile(route, 50):>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
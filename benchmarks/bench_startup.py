@@ -0,0 +1,62 @@
+"""测量应用的启动耗时：导入app模块的耗时，以及从开始导入到首个请求返回的耗时
+
+每次测量都启动一个新的Python进程，数据库事先初始化好；同时统计导入期间执行的SQL语句数，应为0。
+
+用法: python benchmarks/bench_startup.py [次数]，默认10
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中执行：先在Engine类上挂监听器，再导入应用
+PROBE = r'''
+import json, sys, time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+import_statements = len(statements)
+response = app.test_client().get('/blog/')
+responded = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': imported - started, 'first_response': responded - started,
+                  'import_statements': import_statements}))
+'''
+
+
+def run_probe(env):
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    tmp_dir = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(tmp_dir, 'startup.db'),
+               SECRET_KEY='bench', TRACK_PAGE_VIEWS='0', PAGE_CACHE_ENABLED='0', FLASK_APP='app.py')
+    subprocess.run([sys.executable, '-m', 'flask', 'init-db'], cwd=ROOT, env=env, check=True,
+                   capture_output=True)
+    # 第一次运行用于预热字节码缓存，不计入结果
+    run_probe(env)
+    results = [run_probe(env) for _ in range(repeat)]
+
+    def median(key):
+        values = sorted(result[key] for result in results)
+        return values[len(values) // 2]
+
+    print(f'{repeat} runs')
+    print(f'import p50:          {median("import") * 1000:8.1f} ms')
+    print(f'first response p50:  {median("first_response") * 1000:8.1f} ms')
+    print(f'SQL during import:   {max(result["import_statements"] for result in results):8d}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""检查评论写入失败时不会悄悄丢失
+
+- 队列中的一批评论写入一直失败时，逐条写入，评论最终保存；
+- 逐条写入也失败时，评论从重复检测中移除，恢复后重新提交同样的评论能够保存；
+- 同步写入（COMMENT_ASYNC=0）失败后重新提交同样的评论能够保存；
+- 审核拒绝的评论在提交时就被拒绝，不进入写入队列，拒绝计数只加一次。
+
+不符合时以非零状态退出。
+
+用法: python benchmarks/check_comment_failures.py
+"""
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'comment_failures.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['TRACK_PAGE_VIEWS'] = '0'
+os.environ['PAGE_CACHE_ENABLED'] = '0'
+os.environ['COMMENT_RATE_PER_MINUTE'] = '0'
+os.environ['COMMENT_IP_RATE_PER_MINUTE'] = '0'
+
+import app as blog
+from app import app, db, User, Post, Comment, init_database
+
+URL = '/blog/post/failures'
+
+
+def seed():
+    with app.app_context():
+        admin = User.query.filter_by(username='admin').first()
+        post = Post(title='失败', content='<p>内容</p>', excerpt='内容', author_id=admin.id, slug='failures')
+        post.render_content()
+        db.session.add(post)
+        db.session.commit()
+
+
+def failing(rows):
+    raise RuntimeError('database is locked')
+
+
+def stored(content):
+    with app.app_context():
+        return db.session.query(Comment).filter_by(content=content).count()
+
+
+def submit(client, content):
+    response = client.post(URL, data={'author': '读者', 'content': content})
+    blog.comment_queue.close()  # 等待队列中的评论处理完
+    return response.status_code
+
+
+def main():
+    with app.app_context():
+        init_database(lambda message: None)
+    seed()
+    app.config['WTF_CSRF_ENABLED'] = False
+    logging.disable(logging.CRITICAL)  # 失败是故意制造的，不输出日志
+    queue = blog.comment_queue
+    queue.retry_delay = 0.01
+    write_comments = blog.write_comments
+    client = app.test_client()
+    failures = []
+
+    # 整批写入失败，逐条写入成功
+    queue._flush = failing
+    submit(client, '整批失败的评论')
+    queue._flush = write_comments
+    if stored('整批失败的评论') != 1:
+        failures.append('整批写入失败后评论没有逐条写入')
+
+    # 整批和逐条写入都失败，恢复后重新提交
+    queue._flush = failing
+    blog.write_comments = failing
+    submit(client, '全部失败的评论')
+    queue._flush = blog.write_comments = write_comments
+    if stored('全部失败的评论') != 0:
+        failures.append('写入失败的评论出现在数据库中')
+    submit(client, '全部失败的评论')
+    if stored('全部失败的评论') != 1:
+        failures.append('写入失败后重新提交的评论被当作重复提交丢弃')
+
+    # 审核拒绝的评论不进入队列
+    enqueued = queue.enqueued
+    rejected = blog.comment_moderator.stats()['rejected_links']
+    links = ' '.join(f'http://example.com/{i}' for i in range(app.config['COMMENT_MAX_LINKS'] + 1))
+    queue._flush = failing
+    submit(client, links)
+    queue._flush = write_comments
+    if queue.enqueued != enqueued or stored(links):
+        failures.append('审核拒绝的评论进入了写入队列')
+    if blog.comment_moderator.stats()['rejected_links'] != rejected + 1:
+        failures.append('审核拒绝的评论计数不为1')
+
+    # 同步写入失败，恢复后重新提交
+    app.config['COMMENT_ASYNC'] = False
+    blog.write_comments = failing
+    status = submit(client, '同步写入失败的评论')
+    blog.write_comments = write_comments
+    if status != 500:
+        failures.append(f'同步写入失败时返回 {status}，应为500')
+    submit(client, '同步写入失败的评论')
+    if stored('同步写入失败的评论') != 1:
+        failures.append('同步写入失败后重新提交的评论被当作重复提交丢弃')
+
+    for message in failures:
+        print(f'FAIL {message}')
+    if failures:
+        sys.exit(1)
+    print('评论写入失败后逐条写入或可以重新提交')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""检查文章详情页和评论接口的耗时、内存不随评论数增长
+
+在一篇文章上写入2万条评论，另一篇只有一页评论，比较两者详情页和评论接口的耗时及内存峰值，
+并通过评论接口翻完所有评论，确认每条评论恰好返回一次。超出限制时以非零状态退出。
+
+用法: python benchmarks/check_comment_pages.py [评论数]，默认20000
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'comments.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['TRACK_PAGE_VIEWS'] = '0'
+os.environ['PAGE_CACHE_ENABLED'] = '0'
+
+from sqlalchemy import event
+from app import app, db, User, Post, Comment, init_database
+
+# 大量评论的文章与只有一页评论的文章相比，允许的耗时和内存倍数
+MAX_RATIO = 2.0
+# 测量误差的绝对余量
+TIME_SLACK_MS = 5
+MEMORY_SLACK_BYTES = 256 * 1024
+
+
+def seed(total):
+    start = datetime(2024, 1, 1)
+    with app.app_context():
+        admin = User.query.filter_by(username='admin').first()
+        for slug, count in (('small', app.config['COMMENTS_PER_PAGE']), ('large', total)):
+            post = Post(title=slug, content='<p>内容</p>', excerpt='内容', author_id=admin.id, slug=slug,
+                        comment_count=count)
+            post.render_content()
+            db.session.add(post)
+            db.session.flush()
+            # 每10条评论使用相同的时间，检查游标在时间相同时不会漏掉或重复
+            db.session.execute(Comment.__table__.insert(), [
+                dict(content=f'评论 {i}' * 10, author=f'读者{i}', post_id=post.id,
+                     created_at=start + timedelta(seconds=i // 10))
+                for i in range(count)
+            ])
+        db.session.commit()
+
+
+def measure(client, url, repeat=20):
+    """返回(耗时中位数ms, 内存峰值字节, 查询数)"""
+    statements = []
+
+    def before_cursor_execute(*args):
+        statements.append(args[2])
+
+    client.get(url)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            tracemalloc.start()
+            response = client.get(url)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200, (url, response.status_code)
+    return sorted(timings)[len(timings) // 2], peak, len(statements)
+
+
+def walk_comments(client, slug):
+    ids = []
+    cursor = None
+    while True:
+        query = {'after': cursor} if cursor else {}
+        data = client.get(f'/blog/post/{slug}/comments', query_string=query).get_json()
+        ids.extend(comment['id'] for comment in data['comments'])
+        cursor = data['next_cursor']
+        if not cursor:
+            return ids
+
+
+def main():
+    with app.app_context():
+        init_database(lambda message: None)
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    seed(total)
+    client = app.test_client()
+    failures = 0
+    print(f'{"url":<34}{"p50(ms)":>9}{"peak(KB)":>10}{"queries":>9}')
+    for template in ('/blog/post/{}', '/blog/post/{}/comments'):
+        small = measure(client, template.format('small'))
+        large = measure(client, template.format('large'))
+        for slug, (elapsed, peak, queries) in (('small', small), ('large', large)):
+            print(f'{template.format(slug):<34}{elapsed:>9.2f}{peak / 1024:>10.0f}{queries:>9}')
+        if large[0] > small[0] * MAX_RATIO + TIME_SLACK_MS:
+            print(f'FAIL {template}: 耗时随评论数增长')
+            failures += 1
+        if large[1] > small[1] * MAX_RATIO + MEMORY_SLACK_BYTES:
+            print(f'FAIL {template}: 内存随评论数增长')
+            failures += 1
+        if large[2] != small[2]:
+            print(f'FAIL {template}: 查询数随评论数增长')
+            failures += 1
+
+    ids = walk_comments(client, 'large')
+    if len(ids) != total or len(set(ids)) != total:
+        print(f'FAIL 分页返回了 {len(ids)} 条评论（{len(set(ids))} 条不重复），应为 {total} 条')
+        failures += 1
+    else:
+        print(f'评论接口分页返回全部 {total} 条评论')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
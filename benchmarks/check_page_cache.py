@@ -0,0 +1,108 @@
+"""检查页面缓存的响应头和多进程间的失效
+
+- 不带表单的页面（首页）返回ETag，条件请求得到304；
+- 带表单的页面（文章详情页）命中缓存时也不返回ETag/Last-Modified，返回Cache-Control: no-cache, private，
+  条件请求仍得到完整页面，页面中的CSRF令牌属于当前会话，用它能发表评论；
+- 两个共用cache_invalidation表的页面缓存（相当于两个worker），一个按标签清除或全部清除后，
+  另一个也清除对应的页面，数据缓存的失效记录不影响页面缓存。
+
+不符合时以非零状态退出。
+
+用法: python benchmarks/check_page_cache.py
+"""
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'page_cache.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['TRACK_PAGE_VIEWS'] = '0'
+os.environ['PAGE_CACHE_ENABLED'] = '1'
+os.environ['COMMENT_ASYNC'] = '0'
+
+from app import app, db, User, Post, Comment, init_database
+from datacache import SQLInvalidationLog
+from pagecache import PageCache
+
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+def seed():
+    with app.app_context():
+        admin = User.query.filter_by(username='admin').first()
+        post = Post(title='表单', content='<p>内容</p>', excerpt='内容', author_id=admin.id, slug='form')
+        post.render_content()
+        db.session.add(post)
+        db.session.commit()
+
+
+def check(failures, ok, message):
+    if not ok:
+        print(f'FAIL {message}')
+        failures.append(message)
+
+
+def check_shared_invalidation(failures):
+    with app.app_context():
+        log = SQLInvalidationLog(lambda: db.engine)
+        workers = [PageCache(backend=log, check_interval=0) for _ in range(2)]
+        for worker in workers:
+            worker.get('/')  # 第一次读取失效记录
+            worker.set('/blog/post/a', b'a', ['post:1'])
+            worker.set('/blog/post/b', b'b', ['post:2'])
+        first, second = workers
+        log.publish(['post:1'])  # 数据缓存的键，不带页面缓存的前缀
+        check(failures, second.get('/blog/post/a') is not None, '数据缓存的失效记录清除了页面缓存')
+        first.invalidate('post:1')
+        check(failures, second.get('/blog/post/a') is None, '另一个进程中被清除标签的页面没有失效')
+        check(failures, second.get('/blog/post/b') is not None, '另一个进程中其他标签的页面被清除')
+        first.clear()
+        check(failures, second.get('/blog/post/b') is None, '全部清除没有同步到另一个进程')
+
+
+def main():
+    with app.app_context():
+        init_database(lambda message: None)
+    seed()
+    failures = []
+
+    client = app.test_client()
+    client.get('/blog/')
+    response = client.get('/blog/')
+    check(failures, response.headers.get('X-Cache') == 'HIT', '首页第二次请求没有命中缓存')
+    check(failures, response.headers.get('ETag'), '首页没有返回ETag')
+    response = client.get('/blog/', headers={'If-None-Match': response.headers.get('ETag', '')})
+    check(failures, response.status_code == 304, f'首页条件请求返回 {response.status_code}，应为304')
+
+    url = '/blog/post/form'
+    app.test_client().get(url)  # 由另一个会话填充缓存
+    response = client.get(url)
+    check(failures, response.headers.get('X-Cache') == 'HIT', '详情页第二次请求没有命中缓存')
+    check(failures, response.headers.get('Cache-Control') == 'no-cache, private',
+          f'详情页的Cache-Control为 {response.headers.get("Cache-Control")!r}')
+    check(failures, 'ETag' not in response.headers and 'Last-Modified' not in response.headers,
+          '详情页返回了ETag或Last-Modified')
+    response = client.get(url, headers={'If-None-Match': '*', 'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    check(failures, response.status_code == 200, f'详情页条件请求返回 {response.status_code}，应为200')
+
+    token = CSRF_TOKEN.search(response.get_data(as_text=True))
+    check(failures, token, '详情页中没有CSRF令牌')
+    if token:
+        response = client.post(url, data={'csrf_token': token.group(1), 'author': '读者', 'content': '缓存页面上的评论'})
+        check(failures, response.status_code == 302, f'用缓存页面中的令牌发表评论返回 {response.status_code}')
+        with app.app_context():
+            stored = db.session.query(Comment).filter_by(content='缓存页面上的评论').count()
+        check(failures, stored == 1, f'评论保存了 {stored} 条，应为1条')
+
+    check_shared_invalidation(failures)
+    if failures:
+        sys.exit(1)
+    print('页面缓存的响应头和多进程失效符合要求')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""检查各路由的SQL查询数量不随文章数量增长
+
+分别在少量和大量文章的数据库上请求每个路由并统计查询次数，
+两次结果不一致（存在N+1查询）时以非零状态退出。
+
+用法: python benchmarks/check_query_counts.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'counts.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['PAGE_CACHE_ENABLED'] = '0'
+os.environ['TRACK_PAGE_VIEWS'] = '0'
+# 直接写库的测试数据不经过缓存失效，检查未缓存时的查询数
+os.environ['DATA_CACHE_ENABLED'] = '0'
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app import app, db, User, Post, Comment, init_database
+from htmltext import make_excerpt
+import tagging
+import related
+
+ROUTES = ('/blog/', '/blog/category/分类1', '/blog/tag/标签1', '/blog/post/post-1', '/admin')
+
+
+def seed(total):
+    """补足文章数量到total，文章轮流属于多个作者以暴露按行加载作者的问题"""
+    with app.app_context():
+        authors = User.query.filter_by(username='admin').all()
+        for i in range(5):
+            if not User.query.filter_by(username=f'author{i}').first():
+                db.session.add(User(username=f'author{i}', password=generate_password_hash('password')))
+        db.session.commit()
+        authors += User.query.filter(User.username.like('author%')).all()
+        for i in range(Post.query.count(), total):
+            content = f'<p>内容 {i}</p>'
+            post = Post(title=f'Post {i}', content=content, excerpt=make_excerpt(content),
+                        author_id=authors[i % len(authors)].id, slug=f'post-{i}', category=f'分类{i % 3}', tags=f'标签{i % 3}, 通用')
+            post.render_content()
+            db.session.add(post)
+            db.session.flush()
+            tagging.sync_post(db.session, post.id, post.tag_names)
+            db.session.add(Comment(content='评论', author='读者', post_id=post.id))
+        related.rebuild(db.session)
+        db.session.commit()
+
+
+def count_queries(client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            status = client.get(url).status_code
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return status, len(statements)
+
+
+def run():
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    # 预热一次，排除会话初始化等一次性查询
+    for url in ROUTES:
+        client.get(url)
+    return {url: count_queries(client, url) for url in ROUTES}
+
+
+def main():
+    with app.app_context():
+        init_database(lambda message: None)
+    seed(3)
+    small = run()
+    seed(60)
+    large = run()
+    failures = 0
+    print(f'{"route":<24}{"3 posts":>10}{"60 posts":>10}')
+    for url in ROUTES:
+        (small_status, small_count), (large_status, large_count) = small[url], large[url]
+        ok = small_status == large_status == 200 and small_count == large_count
+        failures += not ok
+        print(f'{url:<24}{small_count:>10}{large_count:>10}  {"ok" if ok else "FAIL"}')
+    if failures:
+        sys.exit(f'{failures} routes issue more queries as the number of posts grows')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""检查各路由执行的SQL是否都能使用索引
+
+对每个路由发起请求并记录执行的SELECT语句，再用EXPLAIN QUERY PLAN检查执行计划，
+出现对热点表的全表扫描（SCAN且未使用索引）时以非零状态退出。
+
+用法: python benchmarks/check_query_plans.py
+"""
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'plans.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['PAGE_CACHE_ENABLED'] = '0'
+os.environ['PAGE_VIEW_ASYNC'] = '0'
+# 关闭数据缓存，每个请求都执行全部查询
+os.environ['DATA_CACHE_ENABLED'] = '0'
+
+from sqlalchemy import event
+from app import app, db, User, Post, Comment, init_database
+import tagging
+import related
+
+# 需要检查的热点表，user等小表不检查
+CHECKED_TABLES = {'post', 'comment', 'page_view', 'tag', 'post_tag', 'related_post'}
+TABLE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+
+
+def seed():
+    with app.app_context():
+        admin = User.query.filter_by(username='admin').first()
+        for i in range(30):
+            post = Post(title=f'Post {i}', content='<p>内容</p>', author_id=admin.id,
+                        slug=f'post-{i}', category=f'分类{i % 3}', tags='Python, Flask')
+            post.render_content()
+            db.session.add(post)
+            db.session.flush()
+            tagging.sync_post(db.session, post.id, post.tag_names)
+            db.session.add(Comment(content='评论', author='读者', post_id=post.id))
+        related.rebuild(db.session)
+        db.session.commit()
+
+
+def capture(client, url, statements):
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            response = client.get(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    statements[url] = (response.status_code, captured)
+
+
+def table_scans(statement, parameters):
+    with app.app_context():
+        rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    scans = []
+    for row in rows:
+        match = TABLE_SCAN.match(row[-1])
+        if match and match.group(1) in CHECKED_TABLES:
+            scans.append(row[-1])
+    return scans
+
+
+def main():
+    with app.app_context():
+        init_database(lambda message: None)
+    seed()
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    statements = {}
+    for url in ('/blog/', '/blog/category/分类1', '/blog/tag/Python', '/blog/post/post-1', '/blog/post/post-1/comments'):
+        capture(client, url, statements)
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    capture(client, '/admin', statements)
+
+    failures = 0
+    for url, (status, captured) in statements.items():
+        print(f'{url} [{status}] {len(captured)} queries')
+        if status != 200:
+            failures += 1
+        for statement, parameters in captured:
+            scans = table_scans(statement, parameters)
+            if scans:
+                failures += 1
+                print(f'  FULL SCAN {", ".join(scans)}: {" ".join(statement.split())}')
+    if failures:
+        sys.exit(f'{failures} failures: full table scans or failed requests')
+    print('all queries use an index')
+
+
+if __name__ == '__main__':
+    main()
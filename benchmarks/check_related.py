@@ -0,0 +1,87 @@
+"""检查同分类但不共享标签和关键词的文章也能互为相关文章
+
+写入两篇同分类、内容和标签都不同的文章以及一篇其他分类的文章，全量计算后两篇同分类文章应互相出现在
+对方的列表中，其他分类的文章不应出现；再按保存文章的流程新建一篇同分类文章，增量更新后它的列表
+应包含原来两篇，原来两篇的列表也应包含它。不符合时以非零状态退出。
+
+用法: python benchmarks/check_related.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'related.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['TRACK_PAGE_VIEWS'] = '0'
+os.environ['PAGE_CACHE_ENABLED'] = '0'
+
+from sqlalchemy import text
+from app import app, db, User, Post, init_database
+import related
+import search
+import tagging
+
+POSTS = [
+    ('python', '技术', 'Python装饰器', 'python, 装饰器', '<p>函数装饰器的写法和闭包</p>'),
+    ('sqlite', '技术', 'SQLite索引', '数据库', '<p>联合索引的最左前缀原则</p>'),
+    ('travel', '旅行', '云南游记', '云南', '<p>大理古城和洱海的风景</p>'),
+]
+
+
+def add_post(slug, category, title, tags, content, created_at):
+    """按新建文章的流程写入文章、全文索引、标签，并增量更新相关文章"""
+    admin = User.query.filter_by(username='admin').first()
+    post = Post(title=title, content=content, excerpt=title, author_id=admin.id, slug=slug, category=category,
+                tags=tags, created_at=created_at)
+    post.render_content()
+    db.session.add(post)
+    db.session.flush()
+    search.index_post(db.session, post.id, post.title, post.tags, post.content)
+    tagging.sync_post(db.session, post.id, post.tag_names)
+    related.update_post(db.session, post.id, post.title, post.tags, post.content)
+    db.session.commit()
+    return post.id
+
+
+def related_ids(post_id):
+    return set(db.session.execute(text('SELECT related_id FROM related_post WHERE post_id = :id'),
+                                  {'id': post_id}).scalars())
+
+
+def main():
+    with app.app_context():
+        init_database(lambda message: None)
+    failures = []
+    start = datetime(2024, 1, 1)
+    with app.app_context():
+        ids = {slug: add_post(slug, category, title, tags, content, start + timedelta(days=i))
+               for i, (slug, category, title, tags, content) in enumerate(POSTS)}
+        related.rebuild(db.session)
+        db.session.commit()
+        python, sqlite, travel = ids['python'], ids['sqlite'], ids['travel']
+        if related_ids(python) != {sqlite} or related_ids(sqlite) != {python}:
+            failures.append(f'全量计算后同分类文章的相关文章为 {related_ids(python)} / {related_ids(sqlite)}')
+        if related_ids(travel):
+            failures.append(f'其他分类的文章出现了相关文章 {related_ids(travel)}')
+
+        new = add_post('git', '技术', 'Git分支', 'git', '<p>变基与合并的区别</p>', start + timedelta(days=10))
+        if related_ids(new) != {python, sqlite}:
+            failures.append(f'新文章的相关文章为 {related_ids(new)}，应为同分类的两篇')
+        for post_id in (python, sqlite):
+            if new not in related_ids(post_id):
+                failures.append(f'文章{post_id}的相关文章中没有同分类的新文章')
+        db.session.remove()
+
+    for message in failures:
+        print(f'FAIL {message}')
+    if failures:
+        sys.exit(1)
+    print('同分类、不共享特征的文章互为相关文章')
+
+
+if __name__ == '__main__':
+    main()
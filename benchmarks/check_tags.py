@@ -0,0 +1,75 @@
+"""检查名称中带'/'的标签（如CI/CD）的标签页
+
+详情页上的标签链接应能打开标签页并列出文章，静态导出应生成对应的页面；
+名称中含有'..'段的标签不应导出到其他页面的位置。不符合时以非零状态退出。
+
+用法: python benchmarks/check_tags.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp_dir, 'tags.db')
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ['TRACK_PAGE_VIEWS'] = '0'
+os.environ['PAGE_CACHE_ENABLED'] = '0'
+
+from flask import url_for
+from app import app, db, User, Post, init_database
+import search
+import tagging
+from static_export import export, page_path
+
+TAGS = ['CI/CD', 'TCP/IP/协议']
+
+
+def seed():
+    with app.app_context():
+        admin = User.query.filter_by(username='admin').first()
+        post = Post(title='持续集成', content='<p>流水线</p>', excerpt='流水线', author_id=admin.id, slug='ci',
+                    tags=', '.join(TAGS))
+        post.render_content()
+        db.session.add(post)
+        db.session.flush()
+        search.index_post(db.session, post.id, post.title, post.tags, post.content)
+        tagging.sync_post(db.session, post.id, post.tag_names)
+        db.session.commit()
+
+
+def main():
+    with app.app_context():
+        init_database(lambda message: None)
+    seed()
+    failures = []
+    client = app.test_client()
+    with app.test_request_context():
+        urls = [url_for('tag_posts', tag=tag) for tag in TAGS]
+    detail = client.get('/blog/post/ci').get_data(as_text=True)
+    for tag, url in zip(TAGS, urls):
+        if f'href="{url}"' not in detail:
+            failures.append(f'详情页中没有标签{tag}的链接 {url}')
+        response = client.get(url)
+        if response.status_code != 200 or '持续集成' not in response.get_data(as_text=True):
+            failures.append(f'标签{tag}的页面 {url} 返回 {response.status_code}')
+
+    output = os.path.join(tmp_dir, 'dist')
+    with app.app_context():
+        export(output, workers=1, echo=lambda message: None)
+    for tag, url in zip(TAGS, urls):
+        if not os.path.exists(page_path(output, url)):
+            failures.append(f'静态导出没有生成标签{tag}的页面')
+    if page_path(output, '/blog/tag/a/../../category/x') is not None:
+        failures.append("含有'..'段的标签页路径没有被拒绝")
+
+    for message in failures:
+        print(f'FAIL {message}')
+    if failures:
+        sys.exit(1)
+    print("名称中带'/'的标签页可以访问和导出")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""对运行中的博客做读写混合的压力测试，输出吞吐量和延迟分位数
+
+读请求随机访问首页、分类页、标签页和文章详情页，写请求在文章详情页发表评论。
+所有连接来自同一个IP，评论比例较高时大部分评论会被限流（429），单独计数，不算作错误。
+先启动服务（如 ./run.sh --prod），再运行:
+
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --duration 30 --concurrency 16 --write-ratio 0.1
+"""
+import argparse
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+POST_LINK = re.compile(r'href="(/blog/post/[^"?#/]+)"')
+LIST_LINK = re.compile(r'href="(/blog/(?:category|tag)/[^"?#]+)"')
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def discover(base):
+    """从首页收集文章和列表页的链接"""
+    html = urllib.request.urlopen(base + '/blog/').read().decode()
+    posts = sorted(set(POST_LINK.findall(html)))
+    lists = sorted(set(LIST_LINK.findall(html)))
+    if posts:
+        html = urllib.request.urlopen(base + posts[0]).read().decode()
+        posts = sorted(set(posts) | set(POST_LINK.findall(html)))
+    return posts, ['/blog/'] + lists
+
+
+class Worker(threading.Thread):
+    def __init__(self, base, posts, lists, write_ratio, deadline, seed):
+        super().__init__(daemon=True)
+        self.base = base
+        self.posts = posts
+        self.lists = lists
+        self.write_ratio = write_ratio
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), NoRedirect)
+        self.results = {'read': [], 'comment': []}
+        self.errors = {'read': 0, 'comment': 0}
+        self.limited = 0
+
+    def request(self, kind, url, data=None):
+        started = time.perf_counter()
+        try:
+            response = self.opener.open(self.base + url, data=data, timeout=30)
+            body = response.read()
+        except urllib.error.HTTPError as error:
+            # 发表评论成功后重定向回文章页
+            if error.code == 429:
+                self.limited += 1
+                return None
+            if error.code != 302:
+                self.errors[kind] += 1
+                return None
+            body = b''
+        except OSError:
+            self.errors[kind] += 1
+            return None
+        self.results[kind].append(time.perf_counter() - started)
+        return body
+
+    def comment(self):
+        url = self.rng.choice(self.posts)
+        # 取得表单的CSRF令牌，这次请求不计入统计
+        html = self.opener.open(self.base + url, timeout=30).read().decode()
+        match = CSRF_TOKEN.search(html)
+        if not match:
+            self.errors['comment'] += 1
+            return
+        data = urllib.parse.urlencode({
+            'csrf_token': match.group(1),
+            'author': f'压测{self.rng.randrange(1000)}',
+            'content': '压力测试评论',
+        }).encode()
+        self.request('comment', url, data)
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            if self.rng.random() < self.write_ratio:
+                self.comment()
+            elif self.rng.random() < 0.7:
+                self.request('read', self.rng.choice(self.posts))
+            else:
+                self.request('read', self.rng.choice(self.lists))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--duration', type=float, default=30, help='持续时间（秒）')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发连接数')
+    parser.add_argument('--write-ratio', type=float, default=0.1, help='发表评论的请求比例')
+    args = parser.parse_args()
+
+    base = args.url.rstrip('/')
+    posts, lists = discover(base)
+    if not posts:
+        raise SystemExit('首页上没有文章，请先初始化数据')
+    started = time.monotonic()
+    workers = [Worker(base, posts, lists, args.write_ratio, started + args.duration, seed)
+               for seed in range(args.concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+
+    print(f'{len(posts)} posts, {args.concurrency} connections, {elapsed:.1f} s, write ratio {args.write_ratio}')
+    print(f'{"kind":<10}{"requests":>10}{"errors":>8}{"req/s":>9}{"p50(ms)":>10}{"p99(ms)":>10}')
+    total = 0
+    for kind in ('read', 'comment'):
+        timings = [t for worker in workers for t in worker.results[kind]]
+        errors = sum(worker.errors[kind] for worker in workers)
+        total += len(timings)
+        if not timings:
+            print(f'{kind:<10}{0:>10}{errors:>8}')
+            continue
+        print(f'{kind:<10}{len(timings):>10}{errors:>8}{len(timings) / elapsed:>9.1f}'
+              f'{percentile(timings, 50) * 1000:>10.1f}{percentile(timings, 99) * 1000:>10.1f}')
+    print(f'total     {total:>10}{"":>8}{total / elapsed:>9.1f}')
+    print(f'rate limited comments: {sum(worker.limited for worker in workers)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""评论提交：限流、重复检测、审核和批量写入
+
+评论请求依次经过：
+- 按IP和会话的令牌桶限流，超出时直接返回429，不访问数据库；
+- 自动审核，链接过多或含屏蔽词的评论直接拒绝，每条评论只审核一次；
+- 按文章和规范化后正文的哈希检测一段时间内的重复提交，重复的提交视为已成功；
+- 放入有界的写入队列，后台线程按批取出，在一个短事务中写入并更新文章评论数，每批只清除一次页面缓存；
+  整批重试后仍然失败时逐条写入，写入失败的评论从重复检测中移除，可以重新提交。
+
+限流和重复检测的状态都保存在进程内，多进程部署时每个进程单独计数。
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from batchwriter import BatchWriter
+
+_LINK = re.compile(r'https?://|www\.', re.IGNORECASE)
+
+
+def fingerprint(post_id, content):
+    """重复检测用的指纹：文章id和忽略大小写、空白差异后的正文的SHA-1"""
+    normalized = ' '.join((content or '').lower().split())
+    return hashlib.sha1(f'{post_id}\n{normalized}'.encode('utf-8')).hexdigest()
+
+
+class RateLimiter:
+    """按键的令牌桶：每个键最多积攒burst个令牌，每秒补充rate个，rate不大于0时不限流
+
+    最多保存max_keys个桶，超出时丢弃最久未使用的桶（相当于把它补满）。
+    """
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (令牌数, 更新时间)
+        self._lock = threading.Lock()
+        # 统计计数
+        self.allowed = 0
+        self.limited = 0
+
+    def acquire(self, key, now=None):
+        """从key的桶中取一个令牌，成功返回0，否则返回需要等待的秒数"""
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+                self.allowed += 1
+            else:
+                wait = (1 - tokens) / self.rate
+                self.limited += 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self):
+        return {'keys': len(self._buckets), 'allowed': self.allowed, 'limited': self.limited}
+
+
+class DuplicateFilter:
+    """记住window秒内出现过的指纹，最多max_entries个"""
+
+    def __init__(self, window=3600, max_entries=100000):
+        self.window = window
+        self.max_entries = max_entries
+        self._seen = OrderedDict()  # 指纹 -> 第一次出现的时间，按时间排列
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def check(self, key, now=None):
+        """key在window秒内出现过时返回True，否则记下key并返回False"""
+        if self.window <= 0:
+            return False
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            seen = self._seen
+            while seen:
+                oldest = next(iter(seen.values()))
+                if now - oldest < self.window and len(seen) < self.max_entries:
+                    break
+                seen.popitem(last=False)
+            if key in seen:
+                self.duplicates += 1
+                return True
+            seen[key] = now
+            return False
+
+    def forget(self, key):
+        """提交没有被接受（如队列已满）时删除记下的key，允许重新提交"""
+        with self._lock:
+            self._seen.pop(key, None)
+
+    def stats(self):
+        return {'fingerprints': len(self._seen), 'duplicates': self.duplicates}
+
+
+class Moderator:
+    """自动审核：链接数超过max_links或包含屏蔽词（不区分大小写）的评论不发表"""
+
+    def __init__(self, max_links=2, blocked_words=()):
+        self.max_links = max_links
+        self.blocked_words = [word.lower() for word in blocked_words if word]
+        self.rejected = Counter()
+
+    def check(self, content):
+        """返回拒绝的原因，可以发表时返回None"""
+        reason = None
+        if len(_LINK.findall(content)) > self.max_links:
+            reason = 'links'
+        elif self.blocked_words:
+            lowered = content.lower()
+            if any(word in lowered for word in self.blocked_words):
+                reason = 'blocked_words'
+        if reason:
+            self.rejected[reason] += 1
+        return reason
+
+    def stats(self):
+        return {'rejected_links': self.rejected['links'], 'rejected_blocked_words': self.rejected['blocked_words']}
+
+
+class CommentQueue(BatchWriter):
+    """已通过审核的评论的有界队列，后台线程按数量或时间阈值取出一批交给写入函数"""
+
+    thread_name = 'comment-writer'
@@ -0,0 +1,141 @@
+"""小而很少变化的数据（分类列表、热门标签、按id查找的用户）的进程内缓存
+
+条目在ttl秒后过期，数据变化时由写入路径调用invalidate按键清除。
+配置共享后端时，invalidate同时在后端登记一条失效记录，每个进程最多每隔check_interval秒
+读取一次新的失效记录并清除对应条目，多进程部署时其他进程最多滞后check_interval秒。
+后端不可用时只记录错误，缓存退化为按ttl过期。
+"""
+import logging
+import threading
+import time
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# 失效记录的键为ALL时清除所有条目
+ALL = '*'
+
+
+class SQLInvalidationLog:
+    """把失效记录保存在数据库表cache_invalidation(cache_key, version)中，version全局递增"""
+
+    def __init__(self, get_engine):
+        self.get_engine = get_engine
+
+    def publish(self, keys):
+        with self.get_engine().begin() as conn:
+            for key in keys:
+                conn.execute(text(
+                    'INSERT INTO cache_invalidation (cache_key, version) '
+                    'VALUES (:key, (SELECT coalesce(max(version), 0) + 1 FROM cache_invalidation)) '
+                    'ON CONFLICT (cache_key) DO UPDATE SET version = excluded.version'
+                ), {'key': key})
+
+    def changes(self, since):
+        """返回(version大于since的键列表, 最新的version)；since为None时只返回最新的version"""
+        with self.get_engine().connect() as conn:
+            if since is None:
+                return [], conn.execute(text('SELECT coalesce(max(version), 0) FROM cache_invalidation')).scalar()
+            rows = conn.execute(text(
+                'SELECT cache_key, version FROM cache_invalidation WHERE version > :since ORDER BY version'
+            ), {'since': since}).all()
+        return [key for key, _ in rows], rows[-1][1] if rows else since
+
+
+class DataCache:
+    """按键缓存加载函数的结果，线程安全"""
+
+    _MISSING = object()
+
+    def __init__(self, ttl=300, backend=None, check_interval=1.0, enabled=True):
+        self.ttl = ttl
+        self.backend = backend
+        self.check_interval = check_interval
+        self.enabled = enabled
+        self._entries = {}  # key -> (value, 过期时间)
+        self._lock = threading.Lock()
+        self._generation = 0  # 每次清除条目时加1，加载期间发生过清除的结果不写入缓存
+        self._version = None  # 已读取到的后端失效记录版本
+        self._checked = 0.0
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.backend_errors = 0
+
+    def get(self, key, loader):
+        """返回key对应的缓存值，不存在或已过期时调用loader()加载并缓存"""
+        if not self.enabled:
+            return loader()
+        self._sync()
+        now = time.monotonic()
+        with self._lock:
+            value, expires = self._entries.get(key, (self._MISSING, 0))
+            if value is not self._MISSING and now < expires:
+                self.hits += 1
+                return value
+            self.misses += 1
+            generation = self._generation
+        value = loader()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (value, now + self.ttl)
+        return value
+
+    def _drop(self, keys):
+        with self._lock:
+            if ALL in keys:
+                self._entries.clear()
+            else:
+                for key in keys:
+                    self._entries.pop(key, None)
+            self._generation += 1
+
+    def invalidate(self, *keys):
+        """清除给定的键，配置了共享后端时通知其他进程"""
+        self._drop(keys)
+        self.invalidations += len(keys)
+        if self.backend is not None:
+            try:
+                self.backend.publish(keys)
+            except Exception:
+                self.backend_errors += 1
+                logger.exception('发布缓存失效记录失败')
+
+    def clear(self):
+        """清除所有条目，包括其他进程中的"""
+        self.invalidate(ALL)
+
+    def _sync(self):
+        """每隔check_interval秒从共享后端读取新的失效记录"""
+        if self.backend is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked < self.check_interval:
+                return
+            self._checked = now
+            since = self._version
+        try:
+            keys, version = self.backend.changes(since)
+        except Exception:
+            self.backend_errors += 1
+            logger.exception('读取缓存失效记录失败')
+            return
+        if since is None:
+            # 第一次读取成功前缓存的条目无法确认是否失效，全部清除，之后从当前版本开始跟踪
+            self._drop([ALL])
+        elif keys:
+            self._drop(keys)
+        with self._lock:
+            if self._version is None or version > self._version:
+                self._version = version
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'backend_errors': self.backend_errors,
+        }
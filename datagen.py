@@ -0,0 +1,324 @@
+"""按接近真实站点的分布批量生成测试数据
+
+生成用户、文章、评论和访问记录，用于在生产规模的数据上复现性能问题和运行基准测试：
+- 文章的热度服从Zipf分布，评论和访问量都按热度分配，少数文章占大部分流量；
+- 访问记录按会话生成：每天的流量有随机起伏，会话开始时间有日内高峰，
+  会话内连续浏览几页、请求间隔很短，访问记录成簇出现；
+- 作者和标签也服从Zipf分布，分类有明显的大小之分。
+
+所有数据绕过ORM，用executemany按批写入，每批一个事务。文章同时写入摘要、预渲染正文、全文索引和标签表；
+相关文章和访问汇总表依赖全部数据，由调用方在生成结束后全量重建。
+相同的参数和随机种子总是生成相同的数据。
+"""
+import bisect
+import itertools
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+import search
+from htmltext import make_excerpt, strip_html
+from tagging import parse_tags
+from rendering import render
+from retention import ValueDictionary
+
+# 预设的数据规模，可用单独的参数覆盖
+PRESETS = {
+    'small': dict(users=10, posts=1000, comments=10000, page_views=100000, days=90),
+    'medium': dict(users=50, posts=10000, comments=100000, page_views=1000000, days=365),
+    'large': dict(users=200, posts=100000, comments=1000000, page_views=10000000, days=730),
+}
+
+# 生成的用户的统一密码，只计算一次哈希
+USER_PASSWORD = 'password'
+# 文章热度的Zipf指数，越大流量越集中
+POPULARITY_EXPONENT = 1.1
+# 会话平均浏览页数和页面之间的平均间隔（秒）
+SESSION_PAGES = 4
+PAGE_GAP_SECONDS = 40
+# 每小时的相对流量，晚上最高、凌晨最低
+HOURLY_TRAFFIC = [2, 1, 1, 1, 1, 2, 3, 5, 7, 8, 8, 8, 9, 8, 8, 8, 8, 9, 10, 12, 13, 12, 8, 4]
+
+CATEGORIES = ['技术', '生活', '读书', '旅行', '随笔', '工具', '前端', '数据库', '摄影', '音乐']
+COMMENT_PHRASES = [
+    '非常感谢分享，学到了很多！', '写得很棒，期待更多内容！', '这个主题很有意思，希望能深入探讨一下。',
+    '请问有完整的示例代码吗？', '按照文中的步骤操作成功了。', '有一处细节不太明白，能再解释一下吗？',
+    '收藏了，以后慢慢看。', '和我的经验不太一样，补充几点看法。', '好文，已转发给同事。', '图文并茂，讲得很清楚。',
+]
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_2) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148',
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+]
+_CHARS = ('的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行'
+          '学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前'
+          '外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系')
+_LATIN = 'Python Flask SQLite Redis Linux Docker Nginx Tailwind Git Vim JSON HTTP CSS HTML API'.split()
+
+
+def zipf_weights(count, exponent=1.0):
+    """返回count个按Zipf分布递减的累计权重，可直接传给random.choices的cum_weights"""
+    return list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(count)))
+
+
+def timestamp(value):
+    """按SQLAlchemy在SQLite中保存DateTime的格式转换为字符串"""
+    return value.isoformat(' ', 'microseconds')
+
+
+class Vocabulary:
+    """生成标题、正文和标签用的词表，词频服从Zipf分布"""
+
+    def __init__(self, rng, words=3000, tags=500):
+        pairs = dict.fromkeys(rng.choice(_CHARS) + rng.choice(_CHARS) for _ in range(words * 2))
+        self.words = list(pairs)[:words - len(_LATIN)] + _LATIN
+        rng.shuffle(self.words)
+        self.word_weights = zipf_weights(len(self.words))
+        self.tags = [f'标签{i}' for i in range(tags - len(_LATIN))] + _LATIN
+        rng.shuffle(self.tags)
+        self.tag_weights = zipf_weights(len(self.tags))
+        self.category_weights = zipf_weights(len(CATEGORIES), 0.8)
+
+    def sentence(self, rng, words):
+        return ''.join(rng.choices(self.words, cum_weights=self.word_weights, k=words))
+
+    def title(self, rng):
+        return self.sentence(rng, rng.randint(3, 6))
+
+    def content(self, rng):
+        paragraphs = []
+        for _ in range(rng.randint(3, 8)):
+            sentences = [self.sentence(rng, rng.randint(4, 10)) for _ in range(rng.randint(3, 8))]
+            paragraphs.append('<p>' + '，'.join(sentences) + '。</p>')
+        heading = f'<h2>{self.sentence(rng, 3)}</h2>'
+        return heading + ''.join(paragraphs)
+
+    def post_tags(self, rng):
+        names = dict.fromkeys(rng.choices(self.tags, cum_weights=self.tag_weights, k=rng.randint(1, 4)))
+        return ', '.join(names)
+
+    def category(self, rng):
+        return rng.choices(CATEGORIES, cum_weights=self.category_weights)[0]
+
+
+def _max_id(conn, table):
+    return conn.execute(text(f'SELECT coalesce(max(id), 0) FROM "{table}"')).scalar()
+
+
+def _insert(conn, sql, rows):
+    """用DB-API的executemany直接写入元组，省去ORM和参数字典的开销"""
+    if rows:
+        conn.connection().exec_driver_sql(sql, rows)
+
+
+def generate_users(conn, count, now, rng):
+    """生成count个普通用户，返回作者id列表（没有生成用户时使用已有的用户）"""
+    if count:
+        from werkzeug.security import generate_password_hash
+        password = generate_password_hash(USER_PASSWORD)
+        first_id = _max_id(conn, 'user') + 1
+        _insert(conn, 'INSERT INTO "user" (id, username, password, created_at, is_admin) VALUES (?, ?, ?, ?, 0)', [
+            (first_id + i, f'user{first_id + i}', password, timestamp(now - timedelta(days=rng.randint(0, 1000))))
+            for i in range(count)
+        ])
+        return list(range(first_id, first_id + count))
+    return [row[0] for row in conn.execute(text('SELECT id FROM "user" ORDER BY id'))]
+
+
+def post_schedule(count, start, end, rng):
+    """文章发布时间：在时间段内随机分布，越接近现在发文越频繁"""
+    span = (end - start).total_seconds()
+    return sorted(start + timedelta(seconds=span * rng.random() ** 0.7) for _ in range(count))
+
+
+def generate_posts(conn, count, authors, comment_counts, start, end, vocabulary, rng, batch_size, echo):
+    """生成文章并写入摘要、预渲染正文、全文索引和标签表，返回[(id, slug, 发布时间, 分类, 标签列表)]"""
+    first_id = _max_id(conn, 'post') + 1
+    existing = {row[0] for row in conn.execute(text("SELECT slug FROM post WHERE slug LIKE 'post-%'"))}
+    author_weights = zipf_weights(len(authors))
+    schedule = post_schedule(count, start, end, rng)
+    posts = []
+    for offset in range(0, count, batch_size):
+        rows = []
+        entries = []
+        links = []
+        for i in range(offset, min(count, offset + batch_size)):
+            post_id = first_id + i
+            slug = f'post-{post_id}'
+            if slug in existing:
+                slug = f'{slug}-{rng.getrandbits(32):08x}'
+            title = vocabulary.title(rng)
+            content = vocabulary.content(rng)
+            tags = vocabulary.post_tags(rng)
+            category = vocabulary.category(rng)
+            created_at = schedule[i]
+            updated_at = created_at + timedelta(days=rng.random() * 3) if rng.random() < 0.2 else created_at
+            names = parse_tags(tags)
+            rendered = render(content)
+            rows.append((post_id, title, content, timestamp(created_at), timestamp(min(updated_at, end)),
+                         rng.choices(authors, cum_weights=author_weights)[0], slug, category, tags,
+                         make_excerpt(content), comment_counts.get(i, 0), rendered.html, rendered.content_hash,
+                         rendered.reading_time))
+            entries.append((post_id, search.index_text(title), search.index_text(tags),
+                            search.index_text(strip_html(content))))
+            links.extend((name, post_id) for name in names)
+            posts.append((post_id, slug, created_at, category, names))
+        _insert(conn, 'INSERT INTO post (id, title, content, created_at, updated_at, author_id, slug, category, tags, '
+                      'excerpt, comment_count, rendered_html, content_hash, reading_time) '
+                      'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        _insert(conn, 'INSERT INTO post_fts (rowid, title, tags, content) VALUES (?, ?, ?, ?)', entries)
+        _insert(conn, 'INSERT INTO tag (name, post_count) VALUES (?, 0) ON CONFLICT (name) DO NOTHING',
+                [(name,) for name in Counter(name for name, _ in links)])
+        _insert(conn, 'INSERT INTO post_tag (tag_id, post_id, created_at) '
+                      'SELECT tag.id, post.id, post.created_at FROM tag, post WHERE tag.name = ? AND post.id = ?', links)
+        conn.commit()
+        echo(f'已生成 {len(posts)} 篇文章')
+    conn.execute(text('UPDATE tag SET post_count = (SELECT count(*) FROM post_tag WHERE post_tag.tag_id = tag.id)'))
+    conn.commit()
+    return posts
+
+
+def generate_comments(conn, posts, comment_counts, end, rng, batch_size, echo):
+    """按comment_counts为文章生成评论，评论时间集中在文章发布后不久"""
+    rows = []
+    total = 0
+    for index, count in sorted(comment_counts.items()):
+        post_id, _, created_at, _, _ = posts[index]
+        # 评论的平均间隔随文章距今的时间缩放，较早的文章评论分布得更开
+        scale = max((end - created_at).total_seconds(), 60.0) / 20
+        for _ in range(count):
+            commented_at = min(created_at + timedelta(seconds=rng.expovariate(1.0 / scale)), end)
+            rows.append((rng.choice(COMMENT_PHRASES), timestamp(commented_at), post_id,
+                         f'读者{rng.randrange(5000)}'))
+        if len(rows) >= batch_size:
+            _insert(conn, 'INSERT INTO comment (content, created_at, post_id, author) VALUES (?, ?, ?, ?)', rows)
+            conn.commit()
+            total += len(rows)
+            rows = []
+            echo(f'已生成 {total} 条评论')
+    _insert(conn, 'INSERT INTO comment (content, created_at, post_id, author) VALUES (?, ?, ?, ?)', rows)
+    conn.commit()
+    return total + len(rows)
+
+
+def daily_quota(total, days, rng):
+    """把总访问量分到每一天：每天的流量有随机起伏，偶尔出现几倍于平常的高峰"""
+    weights = [rng.lognormvariate(0, 0.4) * (rng.uniform(3, 8) if rng.random() < 0.02 else 1) for _ in range(days)]
+    scale = total / sum(weights)
+    quota = [int(weight * scale) for weight in weights]
+    quota[-1] += total - sum(quota)
+    return quota
+
+
+def generate_page_views(conn, total, posts, popularity, start_day, days, rng, batch_size, echo):
+    """按会话生成访问记录，每天的记录按时间排序后写入
+
+    生成时时间用距start_day的秒数表示，排序后才转换为时间字符串，省去逐条的日期运算。
+    """
+    post_urls = [f'/blog/post/{slug}' for _, slug, _, _, _ in posts]
+    published = [(created_at - start_day).total_seconds() for _, _, created_at, _, _ in posts]
+    tag_urls = [f'/blog/tag/{name}' for name in sorted({name for *_, names in posts for name in names})]
+    category_urls = [f'/blog/category/{category}' for category in CATEGORIES]
+    # 访问记录只保存URL和User-Agent在字典表中的id，先写入字典表，再把各列表换成id
+    url_ids = ValueDictionary('page_url').ids(conn, post_urls + tag_urls + category_urls + ['/blog/'])
+    post_urls, tag_urls, category_urls = ([url_ids[url] for url in urls] for urls in (post_urls, tag_urls, category_urls))
+    home_url = url_ids['/blog/']
+    user_agent_ids = ValueDictionary('user_agent').ids(conn, USER_AGENTS)
+    user_agents = [user_agent_ids[user_agent] for user_agent in USER_AGENTS]
+    hour_weights = list(itertools.accumulate(HOURLY_TRAFFIC))
+    ips = [f'{rng.randint(1, 223)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randint(1, 254)}'
+           for _ in range(max(100, total // 20))]
+    # 每条记录都要抽样，直接用bisect代替random.choices
+    random_ = rng.random
+    expovariate = rng.expovariate
+    written = 0
+    rows = []
+    for day, quota in enumerate(daily_quota(total, days, rng)):
+        day_rows = []
+        append = day_rows.append
+        while len(day_rows) < quota:
+            hour = bisect.bisect(hour_weights, random_() * hour_weights[-1])
+            at = (day * 24 + hour + random_()) * 3600
+            bits = f'{rng.getrandbits(128):032x}'
+            session_id = f'{bits[:8]}-{bits[8:12]}-4{bits[13:16]}-{bits[16:20]}-{bits[20:]}'
+            ip = ips[int(random_() * len(ips))]
+            user_agent = user_agents[int(random_() * len(user_agents))]
+            pages = min(1 + int(expovariate(1.0 / (SESSION_PAGES - 1))), quota - len(day_rows))
+            for page in range(pages):
+                roll = random_()
+                if roll < 0.75 or page:
+                    # 文章按发布时间排序，只在已发布的文章中按热度抽样
+                    count = bisect.bisect(published, at)
+                    if count:
+                        url = post_urls[bisect.bisect(popularity, random_() * popularity[count - 1], 0, count)]
+                    else:
+                        url = home_url
+                elif roll < 0.85:
+                    url = home_url
+                elif roll < 0.93:
+                    url = category_urls[int(random_() * len(category_urls))]
+                else:
+                    url = tag_urls[int(random_() * len(tag_urls))] if tag_urls else home_url
+                append((at, ip, user_agent, url, session_id))
+                at += expovariate(1.0 / PAGE_GAP_SECONDS)
+        day_rows.sort()
+        rows.extend((ip, user_agent, url, timestamp(start_day + timedelta(0, at)), session_id)
+                    for at, ip, user_agent, url, session_id in day_rows)
+        if len(rows) >= batch_size or day == days - 1:
+            _insert(conn, 'INSERT INTO page_view (ip_address, user_agent_id, url_id, created_at, session_id) '
+                          'VALUES (?, ?, ?, ?, ?)', rows)
+            conn.commit()
+            written += len(rows)
+            rows = []
+            echo(f'已生成 {written} 条访问记录')
+    return written
+
+
+def generate(conn, users=50, posts=10000, comments=100000, page_views=1000000, days=365, seed=0,
+             batch_size=20000, now=None, echo=print):
+    """生成一整套测试数据，追加到已有数据之后，返回各类数据的条数和耗时
+
+    conn为数据库会话，每批数据写入后提交。需要在执行过迁移的数据库上调用。
+    """
+    rng = random.Random(seed)
+    end = (now or datetime.utcnow()).replace(microsecond=0)
+    start_day = (end - timedelta(days=days)).replace(hour=0, minute=0, second=0)
+    vocabulary = Vocabulary(rng)
+    timings = {}
+
+    started = time.perf_counter()
+    authors = generate_users(conn, users, end, rng)
+    conn.commit()
+    timings['users'] = time.perf_counter() - started
+
+    # 先按热度分配评论数，写文章时直接填入comment_count
+    ranks = list(range(posts))
+    rng.shuffle(ranks)
+    rank_weights = [1.0 / (rank + 1) ** POPULARITY_EXPONENT for rank in ranks]
+    popularity = list(itertools.accumulate(rank_weights))
+    comment_counts = Counter(rng.choices(range(posts), cum_weights=popularity, k=comments)) if posts else Counter()
+
+    started = time.perf_counter()
+    post_rows = generate_posts(conn, posts, authors, comment_counts, start_day, end, vocabulary, rng, batch_size, echo)
+    timings['posts'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    comment_total = generate_comments(conn, post_rows, comment_counts, end, rng, batch_size, echo)
+    timings['comments'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    view_total = generate_page_views(conn, page_views, post_rows, popularity, start_day, days, rng,
+                                     batch_size, echo) if post_rows else 0
+    timings['page_views'] = time.perf_counter() - started
+
+    return {
+        'users': (len(authors) if users else 0, timings['users']),
+        'posts': (len(post_rows), timings['posts']),
+        'comments': (comment_total, timings['comments']),
+        'page_views': (view_total, timings['page_views']),
+    }
@@ -0,0 +1,31 @@
+"""生产环境的Gunicorn配置
+
+用法: gunicorn -c gunicorn.conf.py app:app（或 ./run.sh --prod）
+各项参数可通过环境变量覆盖。
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+# SQLite同一时刻只允许一个写入者，进程过多只会增加锁等待，默认不超过4个进程
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 4)))
+# 多线程worker：请求大部分时间在等待数据库和网络，线程比进程更省内存
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 4))
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+# 定期重启worker，避免内存缓慢增长
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+# 在主进程中导入应用，worker通过fork共享已加载的代码；数据库迁移在启动前由flask upgrade-db执行
+preload_app = True
+accesslog = os.getenv('ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # fork出的worker不能复用主进程的数据库连接
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,52 @@
+import re
+from html.parser import HTMLParser
+
+EXCERPT_LENGTH = 120
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class _TextExtractor(HTMLParser):
+    # 块级元素结束时补一个空格，避免相邻段落的文字粘在一起
+    BLOCK_TAGS = {'p', 'div', 'br', 'li', 'ul', 'ol', 'pre', 'blockquote', 'tr', 'td', 'th',
+                  'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+    SKIP_TAGS = {'script', 'style'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skipping += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append(' ')
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+
+def strip_html(html):
+    """去掉HTML标签，返回合并空白后的纯文本"""
+    if not html:
+        return ''
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return _WHITESPACE.sub(' ', ''.join(parser.parts)).strip()
+
+
+def make_excerpt(html, length=EXCERPT_LENGTH):
+    """生成文章摘要：纯文本的前length个字符，超出部分用省略号表示"""
+    text = strip_html(html)
+    if len(text) > length:
+        return text[:length].rstrip() + '...'
+    return text
@@ -1,24 +1,23 @@
-from app import app, db, User, Post, Comment
-from werkzeug.security import generate_password_hash
-from datetime import datetime
+from app import app, db, User, Post, Comment, ensure_admin, data_cache, upgrade_database
+from htmltext import make_excerpt
+import search
+import tagging
+import related
 import random
-from app import app, db, User, Post, Comment
+
+# 只添加3篇示例文章；生成大量测试数据请使用 flask generate-data
 
 # 创建应用上下文
 with app.app_context():
-    # 确保数据库已创建
-    db.create_all()
+    # 确保数据库已创建并执行所有迁移
+    upgrade_database()
     
     # 检查是否已有管理员用户
-    admin = User.query.filter_by(username='admin').first()
-    if not admin:
-        # 创建管理员用户
-        admin = User(username='admin', password=generate_password_hash('admin123'))
-        db.session.add(admin)
-        db.session.commit()
+    if ensure_admin():
         print("管理员用户已创建：用户名=admin，密码=admin123")
     else:
         print("管理员用户已存在")
+    admin = User.query.filter_by(username='admin').first()
     
     # 检查是否已有示例文章
     if not Post.query.first():
@@ -44,44 +43,48 @@ with app.app_context():
         }
         ]
         
-        # 生成文章的slug
+        # 生成文章的slug，一次查询出已被占用的slug
         from slugify import slugify
+        slugs = [slugify(post_data['title']) for post_data in sample_posts]
+        taken = {row.slug for row in db.session.query(Post.slug).filter(Post.slug.in_(slugs))}
         
-        # 添加示例文章
-        for i, post_data in enumerate(sample_posts):
-            slug = slugify(post_data['title'])
-            # 检查slug是否已存在
-            if Post.query.filter_by(slug=slug).first():
-                slug = f"{slug}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+        sample_comments = [
+            {"author": "读者1", "content": "非常感谢分享，学到了很多！"},
+            {"author": "读者2", "content": "写得很棒，期待更多内容！"},
+            {"author": "读者3", "content": "这个主题很有意思，希望能深入探讨一下。"}
+        ]
+        
+        # 所有文章和评论在同一个事务中写入
+        for post_data, slug in zip(sample_posts, slugs):
+            if slug in taken:
+                slug = f"{slug}-{random.randrange(16 ** 6):06x}"
+            
+            # 随机添加1-3条评论
+            num_comments = random.randint(1, 3)
             
             post = Post(
                 title=post_data['title'],
                 content=post_data['content'],
+                excerpt=make_excerpt(post_data['content']),
                 author_id=admin.id,
                 slug=slug,
                 category=post_data['category'],
-                tags=post_data['tags']
+                tags=post_data['tags'],
+                comment_count=num_comments
             )
+            post.render_content()
             db.session.add(post)
-            db.session.commit()
-            
-            # 为每篇文章添加一些评论
-            sample_comments = [
-                {"author": "读者1", "content": "非常感谢分享，学到了很多！"},
-                {"author": "读者2", "content": "写得很棒，期待更多内容！"},
-                {"author": "读者3", "content": "这个主题很有意思，希望能深入探讨一下。"}
-            ]
-            
-            # 随机添加1-3条评论
-            num_comments = random.randint(1, 3)
-            for comment_data in sample_comments[:num_comments]:
-                comment = Comment(
-                    content=comment_data['content'],
-                    author=comment_data['author'],
-                    post_id=post.id
-                )
-                db.session.add(comment)
-                db.session.commit()
+            db.session.flush()
+            search.index_post(db.session, post.id, post.title, post.tags, post.content)
+            tagging.sync_post(db.session, post.id, post.tag_names)
+            related.update_post(db.session, post.id, post.title, post.tags, post.content)
+            db.session.add_all([
+                Comment(content=comment_data['content'], author=comment_data['author'], post_id=post.id)
+                for comment_data in sample_comments[:num_comments]
+            ])
+        db.session.commit()
+        # 通知运行中的应用进程重新加载分类和标签
+        data_cache.invalidate('categories', 'popular_tags')
             
         print(f"已添加{len(sample_posts)}篇示例文章和相关评论")
     else:
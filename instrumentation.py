@@ -0,0 +1,183 @@
+"""请求级性能统计
+
+每个请求用一个RequestStats记录SQL查询数、SQL总耗时、模板渲染耗时和最慢的一条语句，
+由数据库引擎事件和模板渲染信号累加；请求结束时汇总到RequestMetrics，
+以Prometheus文本格式输出，并生成Server-Timing响应头。超过阈值的请求写入慢请求日志。
+
+计数只在进程内累加，多进程部署时每个worker各自统计。
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+# 请求耗时直方图的桶上界（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 慢请求日志中语句的最大长度
+MAX_STATEMENT_LENGTH = 500
+
+
+class RequestStats:
+    """一个请求的性能统计"""
+
+    __slots__ = ('started', 'queries', 'sql_time', 'slowest_time', 'slowest_statement',
+                 'render_time', '_render_started', '_render_sql_time', '_query_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.render_time = 0.0
+        self._render_started = None
+        self._render_sql_time = 0.0
+        self._query_started = None
+
+    def query_started(self):
+        self._query_started = time.perf_counter()
+
+    def query_finished(self, statement):
+        if self._query_started is None:
+            return
+        elapsed = time.perf_counter() - self._query_started
+        self._query_started = None
+        self.queries += 1
+        self.sql_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+    def render_started(self):
+        self._render_started = time.perf_counter()
+        self._render_sql_time = self.sql_time
+
+    def render_finished(self):
+        """累加渲染耗时，模板中触发的查询（如延迟加载）计入SQL耗时而不重复计入渲染耗时"""
+        if self._render_started is None:
+            return
+        elapsed = time.perf_counter() - self._render_started
+        self.render_time += elapsed - (self.sql_time - self._render_sql_time)
+        self._render_started = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, duration, cache=None):
+        """生成Server-Timing响应头的值，耗时单位为毫秒"""
+        parts = [
+            f'db;dur={self.sql_time * 1000:.2f};desc="{self.queries} queries"',
+            f'render;dur={self.render_time * 1000:.2f}',
+            f'total;dur={duration * 1000:.2f}',
+        ]
+        if cache:
+            parts.append(f'cache;desc="{cache}"')
+        return ', '.join(parts)
+
+
+def _labels(**labels):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+class RequestMetrics:
+    """按路由累计请求数、耗时分布、SQL和渲染耗时，线程安全"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = {}  # (endpoint, method, status) -> 请求数
+        self._endpoints = {}  # endpoint -> [各桶计数, 耗时总和, 查询数, SQL耗时, 渲染耗时, 慢请求数]
+
+    def observe(self, endpoint, method, status, duration, stats, slow=False):
+        index = bisect.bisect_left(self.buckets, duration)
+        with self._lock:
+            key = (endpoint, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = [[0] * (len(self.buckets) + 1), 0.0, 0, 0.0, 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += duration
+            entry[2] += stats.queries
+            entry[3] += stats.sql_time
+            entry[4] += stats.render_time
+            entry[5] += slow
+
+    def render(self, gauges=()):
+        """输出Prometheus文本格式，gauges为额外的[(指标名, 说明, 值)]"""
+        with self._lock:
+            requests = dict(self._requests)
+            endpoints = {endpoint: [list(entry[0])] + entry[1:] for endpoint, entry in self._endpoints.items()}
+        lines = [
+            '# HELP blog_http_requests_total 请求数',
+            '# TYPE blog_http_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f'blog_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+        lines += [
+            '# HELP blog_http_request_duration_seconds 请求耗时',
+            '# TYPE blog_http_request_duration_seconds histogram',
+        ]
+        for endpoint, (counts, total, *_) in sorted(endpoints.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'blog_http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=le)} {cumulative}')
+            lines.append(f'blog_http_request_duration_seconds_sum{_labels(endpoint=endpoint)} {total:.6f}')
+            lines.append(f'blog_http_request_duration_seconds_count{_labels(endpoint=endpoint)} {cumulative}')
+        for index, name, help, kind in (
+            (2, 'blog_db_queries_total', 'SQL查询数', 'counter'),
+            (3, 'blog_db_query_seconds_total', 'SQL查询总耗时', 'counter'),
+            (4, 'blog_template_render_seconds_total', '模板渲染总耗时（不含模板中的查询）', 'counter'),
+            (5, 'blog_slow_requests_total', '超过阈值的慢请求数', 'counter'),
+        ):
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+            for endpoint, entry in sorted(endpoints.items()):
+                value = entry[index]
+                lines.append(f'{name}{_labels(endpoint=endpoint)} {value:.6f}' if isinstance(value, float)
+                             else f'{name}{_labels(endpoint=endpoint)} {value}')
+        for name, help, value in gauges:
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+class SlowRequestLog:
+    """按大小轮转的慢请求日志，第一次写入时才创建目录和文件；path为空时写入fallback日志器"""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5, fallback=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.fallback = fallback
+        self._logger = None
+        self._lock = threading.Lock()
+
+    def _get_logger(self):
+        with self._lock:
+            if self._logger is None:
+                if not self.path:
+                    self._logger = self.fallback or logging.getLogger(__name__)
+                else:
+                    directory = os.path.dirname(os.path.abspath(self.path))
+                    os.makedirs(directory, exist_ok=True)
+                    handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes,
+                                                  backupCount=self.backup_count, encoding='utf-8')
+                    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+                    logger = logging.getLogger(f'{__name__}.slow_requests')
+                    logger.setLevel(logging.INFO)
+                    logger.propagate = False
+                    logger.addHandler(handler)
+                    self._logger = logger
+            return self._logger
+
+    def write(self, method, path, status, duration, stats):
+        statement = ' '.join((stats.slowest_statement or '').split())[:MAX_STATEMENT_LENGTH]
+        self._get_logger().warning(
+            '%s %s %s %.1fms queries=%d sql=%.1fms render=%.1fms slowest=%.1fms %s',
+            method, path, status, duration * 1000, stats.queries, stats.sql_time * 1000,
+            stats.render_time * 1000, stats.slowest_time * 1000, statement
+        )
@@ -0,0 +1,178 @@
+"""数据库版本迁移
+
+每个迁移是一个带版本号的函数，已执行的版本记录在schema_migrations表中。
+新增迁移时在末尾追加新版本，不要修改已经发布的迁移。
+
+迁移只做表结构变更和用SQL就能完成的数据补全，不调用应用中会继续修改的代码（渲染、分词、摘要等）：
+这些代码改动后，已发布的迁移在新旧数据库上的结果会不一致。需要用这些代码生成的数据在迁移中
+用backfill声明，由调用方在迁移完成后用当前代码补全（见app.upgrade_database）。
+"""
+from datetime import datetime
+from sqlalchemy import inspect, text
+
+MIGRATIONS = []
+
+
+def migration(version, name, backfill=None):
+    """注册一个迁移函数，函数接收一个处于事务中的数据库连接
+
+    backfill为迁移后需要补全的数据名称，执行了该迁移时由upgrade返回给调用方。
+    """
+    def decorator(func):
+        MIGRATIONS.append((version, name, func, backfill))
+        return func
+    return decorator
+
+
+def table_exists(conn, table):
+    return inspect(conn).has_table(table)
+
+
+def column_names(conn, table):
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+
+def create_indexes(conn, indexes):
+    for name, table, columns in indexes:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({", ".join(columns)})'))
+
+
+@migration(1, '为user表添加is_admin字段')
+def add_user_is_admin(conn):
+    if not table_exists(conn, 'user'):
+        return
+    if 'is_admin' not in column_names(conn, 'user'):
+        conn.execute(text('ALTER TABLE "user" ADD COLUMN is_admin BOOLEAN NOT NULL DEFAULT 0'))
+    # 确保admin用户是管理员
+    conn.execute(text('UPDATE "user" SET is_admin = 1 WHERE username = :username'), {'username': 'admin'})
+
+
+@migration(2, '为文章、评论和访问记录的查询列添加索引')
+def add_query_indexes(conn):
+    create_indexes(conn, [
+        ('ix_post_category_created_at', 'post', ('category', 'created_at')),
+        ('ix_post_created_at', 'post', ('created_at',)),
+        ('ix_comment_post_id', 'comment', ('post_id',)),
+        ('ix_page_view_created_at_session_id', 'page_view', ('created_at', 'session_id')),
+    ])
+
+
+@migration(3, '为post表添加摘要字段并生成已有文章的摘要', backfill='excerpts')
+def add_post_excerpt(conn):
+    if 'excerpt' not in column_names(conn, 'post'):
+        conn.execute(text('ALTER TABLE post ADD COLUMN excerpt VARCHAR(300)'))
+
+
+@migration(4, '创建文章全文搜索索引', backfill='search_index')
+def add_post_search_index(conn):
+    conn.execute(text(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(title, tags, content, tokenize=\'unicode61\')'
+    ))
+
+
+@migration(5, '把文章的标签字符串拆分到tag和post_tag表', backfill='post_tags')
+def add_post_tags(conn):
+    # tag和post_tag表由create_all创建，拆分标签字符串需要应用的规则，由backfill完成
+    pass
+
+
+@migration(6, '预计算相关文章', backfill='related_posts')
+def add_related_posts(conn):
+    # post_keyword和related_post表由create_all创建
+    conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS post_fts_vocab USING fts5vocab(post_fts, 'row')"))
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS related_term_df (term VARCHAR(100) PRIMARY KEY, doc INTEGER NOT NULL) WITHOUT ROWID'
+    ))
+
+
+@migration(7, '为post表添加评论数字段，评论索引改为(post_id, created_at)')
+def add_post_comment_count(conn):
+    if 'comment_count' not in column_names(conn, 'post'):
+        conn.execute(text('ALTER TABLE post ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0'))
+    conn.execute(text(
+        'UPDATE post SET comment_count = (SELECT count(*) FROM comment WHERE comment.post_id = post.id)'
+    ))
+    # 新索引以post_id开头，可以替代原来的单列索引
+    conn.execute(text('DROP INDEX IF EXISTS ix_comment_post_id'))
+    create_indexes(conn, [('ix_comment_post_id_created_at', 'comment', ('post_id', 'created_at'))])
+
+
+@migration(8, '访问记录的User-Agent和URL改为保存字典表中的id')
+def encode_page_view_strings(conn):
+    if 'url' not in column_names(conn, 'page_view'):
+        return
+    # user_agent和page_url表已由create_all创建；SQLite不能删除列，重建page_view表
+    for table, column in (('user_agent', 'user_agent'), ('page_url', 'url')):
+        conn.execute(text(
+            f'INSERT INTO {table} (value) SELECT DISTINCT {column} FROM page_view WHERE {column} IS NOT NULL '
+            f'ORDER BY 1 ON CONFLICT (value) DO NOTHING'
+        ))
+    conn.execute(text(
+        'CREATE TABLE page_view_new ('
+        'id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, '
+        'ip_address VARCHAR(100) NOT NULL, '
+        'user_agent_id INTEGER REFERENCES user_agent (id), '
+        'url_id INTEGER NOT NULL REFERENCES page_url (id), '
+        'created_at DATETIME, '
+        'session_id VARCHAR(200))'
+    ))
+    conn.execute(text(
+        'INSERT INTO page_view_new (id, ip_address, user_agent_id, url_id, created_at, session_id) '
+        'SELECT page_view.id, page_view.ip_address, user_agent.id, page_url.id, page_view.created_at, '
+        'page_view.session_id FROM page_view '
+        'LEFT JOIN user_agent ON user_agent.value = page_view.user_agent '
+        'JOIN page_url ON page_url.value = page_view.url '
+        'ORDER BY page_view.id'
+    ))
+    conn.execute(text('DROP TABLE page_view'))
+    conn.execute(text('ALTER TABLE page_view_new RENAME TO page_view'))
+    create_indexes(conn, [('ix_page_view_created_at_session_id', 'page_view', ('created_at', 'session_id'))])
+
+
+@migration(9, '为post表添加预渲染正文、内容哈希和阅读时间字段', backfill='rendered_html')
+def add_post_rendered_html(conn):
+    columns = column_names(conn, 'post')
+    for column, ddl in (('rendered_html', 'TEXT'), ('content_hash', 'VARCHAR(50)'), ('reading_time', 'INTEGER')):
+        if column not in columns:
+            conn.execute(text(f'ALTER TABLE post ADD COLUMN {column} {ddl}'))
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def upgrade(engine, metadata=None, echo=print):
+    """执行所有未执行的迁移，返回需要补全的数据名称列表（按迁移的版本号排列）
+
+    传入metadata时先创建模型中新增的表（已存在的表不受影响），
+    再按版本号依次执行迁移，每个迁移在独立的事务中完成。
+    """
+    if metadata is not None:
+        metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'version INTEGER PRIMARY KEY, '
+            'name VARCHAR(200) NOT NULL, '
+            'applied_at DATETIME NOT NULL)'
+        ))
+        applied = applied_versions(conn)
+
+    executed = 0
+    backfills = []
+    for version, name, func, backfill in sorted(MIGRATIONS, key=lambda item: item[0]):
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            func(conn)
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)'),
+                {'version': version, 'name': name, 'applied_at': datetime.utcnow()}
+            )
+        echo(f'已执行迁移 {version}: {name}')
+        executed += 1
+        if backfill is not None:
+            backfills.append(backfill)
+    if not executed:
+        echo('数据库已是最新版本')
+    return backfills
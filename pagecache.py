@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datacache import ALL
+
+logger = logging.getLogger(__name__)
+
+
+class CachedPage:
+    def __init__(self, body, tags, last_modified=None):
+        self.body = body
+        self.tags = frozenset(tags)
+        self.last_modified = last_modified
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.created = time.monotonic()
+
+
+class PageCache:
+    """渲染结果的LRU缓存，按条目数和总字节数限制大小
+
+    每个条目带有一组依赖标签（如'post:1'、'category:技术'），
+    数据变化时按标签清除所有相关页面。配置共享后端（如datacache.SQLInvalidationLog）时，
+    清除的标签加上namespace前缀登记到后端，每个进程最多每隔check_interval秒读取一次
+    并清除本进程中带有这些标签的页面；后端不可用时退化为按ttl过期，ttl为0时不过期。
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=64 * 1024 * 1024, ttl=0, backend=None, check_interval=1.0,
+                 namespace='page:'):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.backend = backend
+        self.check_interval = check_interval
+        self.namespace = namespace
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._version = None  # 已读取到的后端失效记录版本
+        self._checked = 0.0
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.backend_errors = 0
+
+    def get(self, key):
+        self._sync()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry.created > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, body, tags, last_modified=None):
+        entry = CachedPage(body, tags, last_modified)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _drop(self, tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.get(tag, set())
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def _drop_all(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def _publish(self, tags):
+        if self.backend is None:
+            return
+        try:
+            self.backend.publish([self.namespace + tag for tag in tags])
+        except Exception:
+            self.backend_errors += 1
+            logger.exception('发布页面缓存失效记录失败')
+
+    def invalidate(self, *tags):
+        """清除带有任一给定标签的所有页面，返回本进程中清除的条目数；配置了共享后端时通知其他进程"""
+        count = self._drop(tags)
+        self._publish(tags)
+        return count
+
+    def clear(self):
+        """清除所有页面，包括其他进程中的"""
+        self._drop_all()
+        self._publish([ALL])
+
+    def _sync(self):
+        """每隔check_interval秒从共享后端读取新的失效记录，只处理本缓存命名空间下的标签"""
+        if self.backend is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked < self.check_interval:
+                return
+            self._checked = now
+            since = self._version
+        try:
+            keys, version = self.backend.changes(since)
+        except Exception:
+            self.backend_errors += 1
+            logger.exception('读取页面缓存失效记录失败')
+            return
+        tags = [key[len(self.namespace):] for key in keys if key.startswith(self.namespace)]
+        if since is None or ALL in tags:
+            # 第一次读取成功前缓存的页面无法确认是否失效，全部清除，之后从当前版本开始跟踪
+            self._drop_all()
+        elif tags:
+            self._drop(tags)
+        with self._lock:
+            if self._version is None or version > self._version:
+                self._version = version
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'backend_errors': self.backend_errors,
+        }
@@ -0,0 +1,7 @@
+from batchwriter import BatchWriter
+
+
+class PageViewBuffer(BatchWriter):
+    """页面访问记录的内存缓冲区，请求钩子只把记录放进队列，由后台线程批量写入数据库"""
+
+    thread_name = 'pageview-writer'
@@ -0,0 +1,65 @@
+from datetime import datetime
+from sqlalchemy import tuple_
+
+CURSOR_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+def encode_cursor(created_at, id):
+    return f'{created_at.strftime(CURSOR_FORMAT)}-{id}'
+
+
+def decode_cursor(cursor):
+    """解析游标，格式不正确时返回None"""
+    if not cursor:
+        return None
+    try:
+        created_at, id = cursor.split('-', 1)
+        return datetime.strptime(created_at, CURSOR_FORMAT), int(id)
+    except ValueError:
+        return None
+
+
+class KeysetPage:
+    """按(created_at, id)倒序排列的一页数据，提供上一页/下一页的游标"""
+
+    def __init__(self, items, has_prev, has_next):
+        self.items = items
+        self.has_prev = has_prev
+        self.has_next = has_next
+
+    @property
+    def prev_cursor(self):
+        if self.has_prev and self.items:
+            return encode_cursor(self.items[0].created_at, self.items[0].id)
+        return None
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.items:
+            return encode_cursor(self.items[-1].created_at, self.items[-1].id)
+        return None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(query, created_at, id, per_page, after=None, before=None):
+    """基于游标的分页，耗时与当前页大小有关，与翻到第几页无关
+
+    after为上一页最后一条的游标，返回更早的数据；before为下一页第一条的游标，返回更新的数据。
+    """
+    key = tuple_(created_at, id)
+    before_key = decode_cursor(before)
+    after_key = decode_cursor(after)
+    if before_key is not None:
+        rows = query.filter(key > before_key).order_by(created_at.asc(), id.asc()).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        return KeysetPage(list(reversed(rows[:per_page])), has_prev, True)
+
+    if after_key is not None:
+        query = query.filter(key < after_key)
+    rows = query.order_by(created_at.desc(), id.desc()).limit(per_page + 1).all()
+    return KeysetPage(rows[:per_page], after_key is not None, len(rows) > per_page)
@@ -0,0 +1,255 @@
+"""相关文章的预计算
+
+每篇文章提取一个稀疏特征向量：标签（按标签的文章数计算idf）和标题、正文中tf-idf最高的若干个词，
+两组特征分别归一化后乘以各自的权重，存入post_keyword表。两篇文章的相似度为特征向量的点积，
+同分类再加一个固定分；每篇文章得分最高的若干篇存入related_post表，详情页只需一次查询。
+同分类但不共享任何特征的文章得分都是CATEGORY_WEIGHT，其中最新的TOP_N篇也作为候选，
+共享特征的文章不足时由它们补足列表。
+
+全量计算时在内存中建立倒排表，只对共享特征的文章对累加得分；文章保存和删除时只重新计算受影响的文章：
+本文与其他文章的得分通过post_keyword的term索引求出，列表中原来包含本文的文章重新计算自己的列表，
+其他文章在本文得分超过其列表最低分时把本文加入列表。只因同分类而成为候选的文章仅限同分类最新的TOP_N篇，
+更早的同分类文章列表中补位的文章在下次全量计算时更新。
+
+词的文档频率在全量计算时从全文搜索索引的词表中读出，保存到related_term_df表；
+直接查询词表需要遍历每个词的倒排列表，高频词很慢，因此增量更新时使用上次全量计算的快照。
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from sqlalchemy import bindparam, text
+
+import search
+from htmltext import strip_html
+from tagging import parse_tags
+
+TOP_N = 10  # 每篇文章保存的相关文章数
+MAX_TERMS = 20  # 每篇文章保留的正文关键词数
+TAG_WEIGHT = 0.5
+TEXT_WEIGHT = 0.3
+CATEGORY_WEIGHT = 0.2
+# 出现在超过该比例文章中的词和标签区分度低，且倒排表过长，不作为特征；
+# 比例换算成篇数后限制在[MIN_DF_LIMIT, MAX_DF_LIMIT]之间，使全量计算的耗时随文章数近似线性增长
+MAX_DF_RATIO = 0.02
+MIN_DF_LIMIT = 50
+MAX_DF_LIMIT = 500
+TAG_PREFIX = '#'
+
+# 得分相同时较新的文章（id较大）优先
+_RANK_KEY = lambda item: (item[1], item[0])
+
+
+def create_tables(conn):
+    """创建全文索引的词表视图和文档频率快照表"""
+    conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS post_fts_vocab USING fts5vocab(post_fts, 'row')"))
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS related_term_df (term VARCHAR(100) PRIMARY KEY, doc INTEGER NOT NULL) WITHOUT ROWID'
+    ))
+
+
+def term_counts(title, content):
+    return Counter(token for token in search.tokenize(f'{title} {strip_html(content)}') if len(token) > 1)
+
+
+def _normalize(weights, block_weight):
+    norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+    if not norm:
+        return {}
+    scale = math.sqrt(block_weight) / norm
+    return {term: weight * scale for term, weight in weights.items()}
+
+
+def features(counts, tags, total, term_df, tag_df):
+    """计算文章的特征向量，total为文章总数，term_df和tag_df为词和标签的文档频率"""
+    max_df = min(max(MAX_DF_RATIO * total, MIN_DF_LIMIT), MAX_DF_LIMIT)
+    text_weights = {}
+    for term, count in counts.items():
+        df = max(term_df.get(term, 1), 1)
+        if df <= max_df and df < total:
+            text_weights[term] = (1 + math.log(count)) * math.log(total / df)
+    text_weights = dict(heapq.nlargest(MAX_TERMS, text_weights.items(), key=_RANK_KEY))
+    tag_weights = {}
+    for name in tags:
+        df = max(tag_df.get(name, 1), 1)
+        if df <= max_df and df < total:
+            tag_weights[TAG_PREFIX + name] = math.log(total / df)
+    vector = _normalize(text_weights, TEXT_WEIGHT)
+    vector.update(_normalize(tag_weights, TAG_WEIGHT))
+    return vector
+
+
+def _top(scores):
+    # 直接比较(得分, id)元组，比传入key函数快
+    return [(id, score) for score, id in heapq.nlargest(TOP_N, zip(scores.values(), scores.keys()))]
+
+
+def _save_keywords(conn, post_id, vector):
+    conn.execute(text('DELETE FROM post_keyword WHERE post_id = :id'), {'id': post_id})
+    if vector:
+        conn.execute(
+            text('INSERT INTO post_keyword (post_id, term, weight) VALUES (:post_id, :term, :weight)'),
+            [{'post_id': post_id, 'term': term, 'weight': weight} for term, weight in vector.items()]
+        )
+
+
+def _save_list(conn, post_id, scores):
+    conn.execute(text('DELETE FROM related_post WHERE post_id = :id'), {'id': post_id})
+    top = _top(scores)
+    if top:
+        conn.execute(
+            text('INSERT INTO related_post (post_id, related_id, score) VALUES (:post_id, :related_id, :score)'),
+            [{'post_id': post_id, 'related_id': related_id, 'score': score} for related_id, score in top]
+        )
+
+
+def _scores(conn, post_id):
+    """通过post_keyword的term索引计算本文与所有共享特征的文章的得分，并加入同分类最新的TOP_N篇文章"""
+    rows = conn.execute(text(
+        'SELECT other.post_id, SUM(own.weight * other.weight), post.category = own_post.category '
+        'FROM post_keyword AS own '
+        'JOIN post_keyword AS other ON other.term = own.term AND other.post_id != own.post_id '
+        'JOIN post ON post.id = other.post_id '
+        'JOIN post AS own_post ON own_post.id = own.post_id '
+        'WHERE own.post_id = :id GROUP BY other.post_id'
+    ), {'id': post_id}).all()
+    scores = {other: score + (CATEGORY_WEIGHT if same else 0) for other, score, same in rows}
+    # 已经在得分中的同分类文章不算补位，多取这么多篇
+    shared = sum(1 for _, _, same in rows if same)
+    recent = conn.execute(text(
+        'SELECT id FROM post WHERE category = (SELECT category FROM post WHERE id = :id) AND id != :id '
+        'ORDER BY created_at DESC LIMIT :limit'
+    ), {'id': post_id, 'limit': TOP_N + shared}).scalars()
+    _fill_category(scores, recent)
+    return scores
+
+
+def _fill_category(scores, recent):
+    """把同分类、不共享特征的文章按从新到旧的顺序以CATEGORY_WEIGHT分加入候选，最多TOP_N篇"""
+    added = 0
+    for other in recent:
+        if added >= TOP_N:
+            break
+        if other not in scores:
+            scores[other] = CATEGORY_WEIGHT
+            added += 1
+
+
+def _referrers(conn, post_id):
+    rows = conn.execute(text('SELECT post_id FROM related_post WHERE related_id = :id'), {'id': post_id})
+    return {row[0] for row in rows}
+
+
+def update_post(conn, post_id, title, tags, content):
+    """重新计算一篇文章的特征和相关文章，并更新受影响文章的列表
+
+    需在文章、全文索引和标签写入后的同一事务中调用。返回相关文章列表有变化的其他文章id。
+    """
+    counts = term_counts(title, content)
+    names = parse_tags(tags)
+    total = conn.execute(text('SELECT count(*) FROM post')).scalar()
+    term_df = dict(conn.execute(
+        text('SELECT term, doc FROM related_term_df WHERE term IN :terms').bindparams(bindparam('terms', expanding=True)),
+        {'terms': list(counts)}
+    ).all()) if counts else {}
+    tag_df = dict(conn.execute(
+        text('SELECT name, post_count FROM tag WHERE name IN :names').bindparams(bindparam('names', expanding=True)),
+        {'names': names}
+    ).all()) if names else {}
+    _save_keywords(conn, post_id, features(counts, names, total, term_df, tag_df))
+
+    scores = _scores(conn, post_id)
+    _save_list(conn, post_id, scores)
+    # 原来列表中包含本文的文章，本文得分可能下降，重新计算它们的列表
+    affected = _referrers(conn, post_id)
+    for other in affected:
+        _save_list(conn, other, _scores(conn, other))
+    # 其他文章在本文得分超过其列表最低分时把本文加入列表
+    candidates = [other for other in scores if other not in affected]
+    for start in range(0, len(candidates), 500):
+        chunk = candidates[start:start + 500]
+        lists = defaultdict(list)
+        rows = conn.execute(
+            text('SELECT post_id, related_id, score FROM related_post WHERE post_id IN :ids')
+            .bindparams(bindparam('ids', expanding=True)),
+            {'ids': chunk}
+        )
+        for other, related_id, score in rows:
+            lists[other].append((related_id, score))
+        for other in chunk:
+            current = lists[other]
+            lowest = min(current, key=_RANK_KEY) if current else None
+            if len(current) >= TOP_N and _RANK_KEY((post_id, scores[other])) <= _RANK_KEY(lowest):
+                continue
+            if len(current) >= TOP_N:
+                conn.execute(text('DELETE FROM related_post WHERE post_id = :post_id AND related_id = :related_id'),
+                             {'post_id': other, 'related_id': lowest[0]})
+            conn.execute(
+                text('INSERT INTO related_post (post_id, related_id, score) VALUES (:post_id, :related_id, :score)'),
+                {'post_id': other, 'related_id': post_id, 'score': scores[other]}
+            )
+            affected.add(other)
+    return affected
+
+
+def remove_post(conn, post_id):
+    """删除文章的特征和相关文章，返回相关文章列表有变化的其他文章id"""
+    conn.execute(text('DELETE FROM post_keyword WHERE post_id = :id'), {'id': post_id})
+    conn.execute(text('DELETE FROM related_post WHERE post_id = :id'), {'id': post_id})
+    affected = _referrers(conn, post_id)
+    conn.execute(text('DELETE FROM related_post WHERE related_id = :id'), {'id': post_id})
+    for other in affected:
+        _save_list(conn, other, _scores(conn, other))
+    return affected
+
+
+def rebuild(conn):
+    """全量重新计算所有文章的特征和相关文章，返回文章数"""
+    total = conn.execute(text('SELECT count(*) FROM post')).scalar()
+    # 只出现在一篇文章中的词不需要保存，查不到时按1处理
+    conn.execute(text('DELETE FROM related_term_df'))
+    conn.execute(text('INSERT INTO related_term_df (term, doc) SELECT term, doc FROM post_fts_vocab WHERE doc > 1'))
+    term_df = dict(conn.execute(text('SELECT term, doc FROM related_term_df')).all())
+    tag_df = dict(conn.execute(text('SELECT name, post_count FROM tag')).all())
+    vectors = {}
+    categories = {}
+    by_category = defaultdict(list)  # 分类 -> 按从新到旧排列的文章id
+    for id, category, title, tags, content in conn.execute(
+            text('SELECT id, category, title, tags, content FROM post ORDER BY created_at DESC')):
+        vectors[id] = features(term_counts(title, content), parse_tags(tags), total, term_df, tag_df)
+        categories[id] = category
+        if category is not None:
+            by_category[category].append(id)
+    del term_df
+
+    conn.execute(text('DELETE FROM post_keyword'))
+    conn.execute(text('DELETE FROM related_post'))
+    keywords = [{'post_id': id, 'term': term, 'weight': weight}
+                for id, vector in vectors.items() for term, weight in vector.items()]
+    if keywords:
+        conn.execute(text('INSERT INTO post_keyword (post_id, term, weight) VALUES (:post_id, :term, :weight)'),
+                     keywords)
+    del keywords
+
+    # 倒排表：特征 -> [(文章id, 权重)]，只有共享特征的文章之间才需要计算得分
+    postings = defaultdict(list)
+    for id, vector in vectors.items():
+        for term, weight in vector.items():
+            postings[term].append((id, weight))
+    rows = []
+    for id, vector in vectors.items():
+        scores = defaultdict(float)
+        for term, weight in vector.items():
+            for other, other_weight in postings[term]:
+                scores[other] += weight * other_weight
+        scores.pop(id, None)
+        category = categories[id]
+        if category is not None:
+            for other in scores:
+                if categories[other] == category:
+                    scores[other] += CATEGORY_WEIGHT
+            _fill_category(scores, (other for other in by_category[category] if other != id))
+        rows.extend({'post_id': id, 'related_id': other, 'score': score} for other, score in _top(scores))
+    if rows:
+        conn.execute(text('INSERT INTO related_post (post_id, related_id, score) VALUES (:post_id, :related_id, :score)'),
+                     rows)
+    return len(vectors)
@@ -0,0 +1,243 @@
+"""保存文章时预渲染正文HTML
+
+render()依次完成：
+- 清理HTML：只保留白名单中的标签和属性，删除script、style等元素及其内容，
+  链接和图片地址只允许http(s)、mailto和站内地址；
+- 为h2、h3标题生成锚点，标题不少于两个时在正文前插入目录；
+- 图片加上loading="lazy"和decoding="async"，站内图片补上宽高（需要Pillow），避免加载时页面跳动；
+- 按中文字数和英文单词数估算阅读时间。
+
+结果和内容哈希一起保存在post表中，详情页直接输出保存的HTML。渲染规则变化时增加RENDER_VERSION，
+再执行flask rerender-posts重新渲染版本不一致的文章。
+"""
+import hashlib
+import html
+import math
+import os
+import re
+from collections import namedtuple
+from html.parser import HTMLParser
+
+# 渲染规则的版本，写在content_hash的开头
+RENDER_VERSION = 1
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'code', 'dd', 'del', 'div', 'dl', 'dt', 'em', 'figcaption', 'figure',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'kbd', 'li', 'mark', 'ol', 'p', 'pre', 's', 'span',
+    'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'abbr': {'title'},
+    'img': {'src', 'alt', 'title', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan'},
+    # 代码高亮使用的language-*类名
+    'code': {'class'},
+    'pre': {'class'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+ALLOWED_SCHEMES = {'http', 'https', 'mailto'}
+VOID_TAGS = {'br', 'hr', 'img'}
+# 连同内容一起删除的元素
+DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'noscript', 'template', 'textarea', 'select'}
+TOC_TAGS = ('h2', 'h3')
+# 开始这些元素时，自动结束未闭合的同级元素，如<li>one<li>two
+IMPLIED_END_TAGS = {
+    'li': {'li'}, 'dt': {'dt', 'dd'}, 'dd': {'dt', 'dd'}, 'tr': {'tr'}, 'td': {'td', 'th'}, 'th': {'td', 'th'},
+}
+# 自动结束只在最近的列表或表格之内查找
+LIST_TAGS = {'ul', 'ol', 'dl', 'table', 'thead', 'tbody', 'tfoot'}
+
+# 阅读速度：每分钟中文字数和英文单词数
+CJK_CHARS_PER_MINUTE = 400
+WORDS_PER_MINUTE = 200
+
+_SCHEME = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.-]*):')
+_URL_IGNORED = re.compile(r'[\x00-\x20\x7f]+')
+_ANCHOR_INVALID = re.compile(r'[^\w-]+')
+_CJK = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]')
+_WORD = re.compile(r'[A-Za-z0-9]+(?:[\'’-][A-Za-z0-9]+)*')
+
+Rendered = namedtuple('Rendered', 'html reading_time content_hash')
+
+
+def content_hash(content):
+    """渲染结果的版本标识：渲染规则版本和正文的SHA-1"""
+    return f'{RENDER_VERSION}:{hashlib.sha1((content or "").encode("utf-8")).hexdigest()}'
+
+
+def safe_url(url):
+    """允许的链接地址原样返回，javascript:、data:等返回None"""
+    url = url.strip()
+    match = _SCHEME.match(_URL_IGNORED.sub('', url))
+    if match and match.group(1).lower() not in ALLOWED_SCHEMES:
+        return None
+    return url
+
+
+def static_image_size(src, static_folder):
+    """站内静态图片的(宽, 高)，不是站内图片、文件不存在或未安装Pillow时返回None"""
+    if not static_folder or not src.startswith('/static/'):
+        return None
+    root = os.path.abspath(static_folder)
+    path = os.path.normpath(os.path.join(root, src[len('/static/'):].split('?')[0]))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except OSError:
+        return None
+
+
+def reading_time(text):
+    """估算阅读分钟数，至少1分钟"""
+    minutes = len(_CJK.findall(text)) / CJK_CHARS_PER_MINUTE + len(_WORD.findall(text)) / WORDS_PER_MINUTE
+    return max(1, math.ceil(minutes))
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self, static_folder=None):
+        super().__init__(convert_charrefs=True)
+        self.static_folder = static_folder
+        self.parts = []
+        self.open_tags = []
+        self.dropping = 0
+        self.heading = None  # (标签, 开始标签在parts中的位置, 标题文字)
+        self.headings = []  # [(标签, 锚点, 标题文字)]
+        self.anchors = set()
+        self.texts = []
+
+    def _attributes(self, tag, attrs):
+        allowed = ALLOWED_ATTRIBUTES.get(tag, ())
+        result = {}
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES:
+                value = safe_url(value)
+                if value is None:
+                    continue
+            if name == 'class':
+                value = ' '.join(item for item in value.split() if item.startswith('language-'))
+                if not value:
+                    continue
+            result[name] = value
+        if tag == 'img':
+            if 'src' not in result:
+                return None
+            if 'width' not in result and 'height' not in result:
+                size = static_image_size(result['src'], self.static_folder)
+                if size:
+                    result['width'], result['height'] = map(str, size)
+            result['loading'] = 'lazy'
+            result['decoding'] = 'async'
+        return result
+
+    def _start_tag(self, tag, attributes):
+        return '<' + tag + ''.join(f' {name}="{html.escape(value)}"' for name, value in attributes.items()) + '>'
+
+    def handle_starttag(self, tag, attrs):
+        if self.dropping or tag in DROP_CONTENT_TAGS:
+            if tag in DROP_CONTENT_TAGS:
+                self.dropping += 1
+            return
+        if tag not in ALLOWED_TAGS:
+            return
+        attributes = self._attributes(tag, attrs)
+        if attributes is None:
+            return
+        if tag in VOID_TAGS:
+            self.parts.append(self._start_tag(tag, attributes))
+            return
+        implied = IMPLIED_END_TAGS.get(tag, ())
+        for open_tag in reversed(self.open_tags if implied else ()):
+            if open_tag in implied:
+                self.handle_endtag(open_tag)
+                break
+            if open_tag in LIST_TAGS:
+                break
+        if tag in TOC_TAGS and self.heading is None:
+            # 标题的锚点要等读完标题文字才能确定，先占位
+            self.heading = (tag, len(self.parts), [])
+            self.parts.append(None)
+        else:
+            self.parts.append(self._start_tag(tag, attributes))
+        self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping = max(0, self.dropping - 1)
+            return
+        if self.dropping or tag not in self.open_tags:
+            return
+        # 关闭未闭合的内层元素
+        while self.open_tags:
+            current = self.open_tags.pop()
+            self.parts.append(f'</{current}>')
+            if self.heading and current == self.heading[0]:
+                self._finish_heading()
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.parts.append(html.escape(data, quote=False))
+        self.texts.append(data)
+        if self.heading:
+            self.heading[2].append(data)
+
+    def _finish_heading(self):
+        tag, index, texts = self.heading
+        self.heading = None
+        text = ' '.join(''.join(texts).split())
+        base = _ANCHOR_INVALID.sub('-', text.lower()).strip('-') or 'section'
+        anchor = base
+        suffix = 2
+        while anchor in self.anchors:
+            anchor = f'{base}-{suffix}'
+            suffix += 1
+        self.anchors.add(anchor)
+        self.parts[index] = f'<{tag} id="{html.escape(anchor)}">'
+        if text:
+            self.headings.append((tag, anchor, text))
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.handle_endtag(self.open_tags[-1])
+
+
+def table_of_contents(headings):
+    items = ''.join(
+        f'<li class="toc-{tag}"><a href="#{html.escape(anchor)}">{html.escape(text)}</a></li>'
+        for tag, anchor, text in headings
+    )
+    return f'<nav class="toc"><p class="toc-title">目录</p><ul>{items}</ul></nav>'
+
+
+def render(content, static_folder=None):
+    """渲染文章正文，返回Rendered(html, reading_time, content_hash)"""
+    sanitizer = _Sanitizer(static_folder)
+    sanitizer.feed(content or '')
+    sanitizer.close()
+    body = ''.join(sanitizer.parts)
+    if len(sanitizer.headings) >= 2:
+        body = table_of_contents(sanitizer.headings) + body
+    return Rendered(body, reading_time(' '.join(sanitizer.texts)), content_hash(content))
+
+
+def render_many(contents, static_folder=None):
+    """渲染一批正文，供进程池使用"""
+    return [render(content, static_folder) for content in contents]
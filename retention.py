@@ -0,0 +1,146 @@
+"""访问记录的存储：字典编码、保留期限和归档
+
+page_view表不再直接保存User-Agent和URL，而是保存它们在user_agent、page_url字典表中的id，
+重复的长字符串只存一份。写入时通过ValueDictionary把字符串换成id，进程内缓存已知的映射。
+
+超过保留天数的原始记录按天导出为gzip压缩的JSONL文件（YYYY/MM/YYYY-MM-DD.jsonl.gz），
+导出的文件登记在page_view_archive表中后，再按id分批删除，每批一个短事务，
+避免长时间占用写锁。某天在归档后又出现新记录时，追加一个分段文件（YYYY-MM-DD.1.jsonl.gz）。
+归档文件先写入临时文件再改名，中途失败后重新执行不会丢失或重复记录。
+"""
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import DateTime, bindparam, text
+
+# 每条IN查询最多带的参数个数，低于SQLite的变量数上限
+LOOKUP_CHUNK = 500
+
+
+class ValueDictionary:
+    """把字符串映射为字典表（id, value）中的id，缺失的值先插入
+
+    缓存只在进程内有效，超过max_cached个条目时清空。插入与调用方的写入在同一事务中，
+    事务回滚时调用方必须调用clear()，否则缓存中会留下不存在的id。
+    """
+
+    def __init__(self, table, max_cached=10000):
+        self.table = table
+        self.max_cached = max_cached
+        self._cache = {}
+
+    def clear(self):
+        self._cache = {}
+
+    def ids(self, conn, values):
+        """返回{值: id}，values中的None被忽略"""
+        cache = self._cache
+        result = {}
+        missing = []
+        for value in set(values):
+            if value is None:
+                continue
+            id = cache.get(value)
+            if id is None:
+                missing.append(value)
+            else:
+                result[value] = id
+        if not missing:
+            return result
+        conn.execute(text(f'INSERT INTO {self.table} (value) VALUES (:value) ON CONFLICT (value) DO NOTHING'),
+                     [{'value': value} for value in missing])
+        select = text(f'SELECT value, id FROM {self.table} WHERE value IN :values').bindparams(
+            bindparam('values', expanding=True)
+        )
+        for start in range(0, len(missing), LOOKUP_CHUNK):
+            result.update(conn.execute(select, {'values': missing[start:start + LOOKUP_CHUNK]}).all())
+        if len(cache) + len(missing) > self.max_cached:
+            cache = self._cache = {}
+        if len(missing) <= self.max_cached:
+            cache.update((value, result[value]) for value in missing)
+        return result
+
+
+def _statement(sql, *datetimes):
+    """时间参数按DateTime类型绑定，与模型写入的格式一致"""
+    return text(sql).bindparams(*(bindparam(name, type_=DateTime()) for name in datetimes))
+
+
+def day_range(day):
+    return day, day + timedelta(days=1)
+
+
+def archive_path(day, part):
+    suffix = f'.{part}' if part else ''
+    return os.path.join(f'{day:%Y}', f'{day:%m}', f'{day:%Y-%m-%d}{suffix}.jsonl.gz')
+
+
+def archived_last_id(conn, day):
+    """返回某天已归档的最大记录id和分段数"""
+    row = conn.execute(_statement('SELECT max(last_id), count(*) FROM page_view_archive WHERE day = :day', 'day'),
+                       {'day': day}).one()
+    return row[0] or 0, row[1]
+
+
+def export_day(conn, day, archive_dir, after_id=0):
+    """把某天id大于after_id的访问记录导出为一个归档文件并登记，返回(文件相对路径, 行数, 最大id)
+
+    没有需要导出的记录时返回None。文件写完并改名后才登记，登记与调用方的事务一起提交。
+    """
+    start, end = day_range(day)
+    _, parts = archived_last_id(conn, day)
+    rows = conn.execute(_statement(
+        'SELECT page_view.id, page_view.created_at, page_view.ip_address, user_agent.value, page_url.value, '
+        'page_view.session_id FROM page_view '
+        'LEFT JOIN user_agent ON user_agent.id = page_view.user_agent_id '
+        'LEFT JOIN page_url ON page_url.id = page_view.url_id '
+        'WHERE page_view.created_at >= :start AND page_view.created_at < :end AND page_view.id > :after_id '
+        'ORDER BY page_view.id', 'start', 'end'
+    ), {'start': start, 'end': end, 'after_id': after_id})
+    relative = archive_path(day, parts)
+    path = os.path.join(archive_dir, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    count = 0
+    first_id = last_id = None
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        for id, created_at, ip_address, user_agent, url, session_id in rows:
+            f.write(json.dumps({
+                'id': id, 'created_at': str(created_at), 'ip_address': ip_address,
+                'user_agent': user_agent, 'url': url, 'session_id': session_id,
+            }, ensure_ascii=False) + '\n')
+            first_id = first_id or id
+            last_id = id
+            count += 1
+    if not count:
+        os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, path)
+    conn.execute(_statement(
+        'INSERT INTO page_view_archive (day, path, rows, first_id, last_id, created_at) '
+        'VALUES (:day, :path, :rows, :first_id, :last_id, :created_at)', 'day', 'created_at'
+    ), {'day': day, 'path': relative.replace(os.sep, '/'), 'rows': count, 'first_id': first_id, 'last_id': last_id,
+        'created_at': datetime.utcnow()})
+    return relative, count, last_id
+
+
+def purge_day(conn, day, last_id, batch_size=2000, pause=0.0, commit=None):
+    """按id分批删除某天已归档（id不大于last_id）的访问记录，每批之后调用commit，返回删除的行数"""
+    start, end = day_range(day)
+    deleted = 0
+    while True:
+        result = conn.execute(_statement(
+            'DELETE FROM page_view WHERE id IN ('
+            'SELECT id FROM page_view WHERE created_at >= :start AND created_at < :end AND id <= :last_id '
+            'LIMIT :limit)', 'start', 'end'
+        ), {'start': start, 'end': end, 'last_id': last_id, 'limit': batch_size})
+        if commit:
+            commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+        if pause:
+            # 让出写锁，使访问记录写入和发表评论等请求不被长时间阻塞
+            time.sleep(pause)
@@ -35,19 +35,36 @@ init_data() {
     python init_data.py
 }
 
+# 执行数据库迁移
+migrate_db() {
+    echo "正在执行数据库迁移..."
+    flask upgrade-db
+}
+
 # 启动开发服务器
 start_dev() {
+    flask init-db
     echo "正在启动开发服务器..."
     flask run
 }
 
+# 启动生产服务器（Gunicorn多进程多线程，配置见gunicorn.conf.py）
+start_prod() {
+    # 应用导入时不再建表和迁移，启动worker前先执行一次
+    migrate_db
+    echo "正在启动生产服务器..."
+    exec gunicorn -c gunicorn.conf.py app:app
+}
+
 # 显示帮助信息
 show_help() {
     echo "使用方法: ./run.sh [选项]"
     echo "选项:" 
     echo "  --install    安装项目依赖"
     echo "  --init       初始化数据库和示例数据"
+    echo "  --migrate    执行数据库迁移"
     echo "  --dev        启动开发服务器"
+    echo "  --prod       启动生产服务器"
     echo "  --all        执行安装、初始化并启动开发服务器"
     echo "  --help       显示帮助信息"
 }
@@ -60,9 +77,15 @@ case "$1" in
     --init)
         init_data
         ;;
+    --migrate)
+        migrate_db
+        ;;
     --dev)
         start_dev
         ;;
+    --prod)
+        start_prod
+        ;;
     --all)
         install_deps
         init_data
@@ -77,6 +100,7 @@ case "$1" in
         echo "  ./run.sh --install  # 安装依赖"
         echo "  ./run.sh --init     # 初始化数据"
         echo "  ./run.sh --dev      # 启动开发服务器"
+        echo "  ./run.sh --prod     # 启动生产服务器"
         echo "  ./run.sh --all      # 执行所有操作"
         echo "使用 ./run.sh --help 查看所有选项。"
         ;;
@@ -0,0 +1,99 @@
+"""基于SQLite FTS5的文章全文搜索
+
+FTS5自带的unicode61分词器不会切分中文，因此写入索引前先在Python中分词：
+连续的中日韩字符切成重叠的二元组（并保留每段的最后一个字，使单字查询可以用前缀匹配），
+其他文字按单词切分并转为小写。查询词用同样的规则切分后组成短语查询。
+"""
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import text
+
+from htmltext import strip_html
+
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_TOKEN = re.compile(f'([{_CJK}]+)|([^\\W_{_CJK}]+)')
+
+# bm25权重：标题、标签、正文
+RANK = 'bm25(post_fts, 10.0, 5.0, 1.0)'
+
+
+def tokenize(value):
+    tokens = []
+    for cjk, word in _TOKEN.findall(value or ''):
+        if word:
+            tokens.append(word.lower())
+            continue
+        tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        tokens.append(cjk[-1])
+    return tokens
+
+
+def index_text(value):
+    return ' '.join(tokenize(value))
+
+
+def match_query(query):
+    """把用户输入转换为FTS5查询语句，多个词之间为AND关系；没有可搜索的词时返回None"""
+    terms = []
+    for cjk, word in _TOKEN.findall(query or ''):
+        if word:
+            terms.append(f'"{word.lower()}"*')
+        elif len(cjk) == 1:
+            terms.append(f'"{cjk}"*')
+        else:
+            terms.append('"' + ' '.join(cjk[i:i + 2] for i in range(len(cjk) - 1)) + '"')
+    return ' '.join(terms) or None
+
+
+def create_index(conn):
+    conn.execute(text(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(title, tags, content, tokenize=\'unicode61\')'
+    ))
+
+
+def index_post(conn, post_id, title, tags, content):
+    """写入或更新一篇文章的索引，需在文章写入的同一事务中调用"""
+    remove_post(conn, post_id)
+    conn.execute(
+        text('INSERT INTO post_fts (rowid, title, tags, content) VALUES (:id, :title, :tags, :content)'),
+        {'id': post_id, 'title': index_text(title), 'tags': index_text(tags),
+         'content': index_text(strip_html(content))}
+    )
+
+
+def remove_post(conn, post_id):
+    conn.execute(text('DELETE FROM post_fts WHERE rowid = :id'), {'id': post_id})
+
+
+def search_ids(conn, query, limit, offset=0):
+    """按相关度返回匹配文章的id列表"""
+    match = match_query(query)
+    if match is None:
+        return []
+    rows = conn.execute(
+        text(f'SELECT rowid FROM post_fts WHERE post_fts MATCH :match ORDER BY {RANK} LIMIT :limit OFFSET :offset'),
+        {'match': match, 'limit': limit, 'offset': offset}
+    )
+    return [row[0] for row in rows]
+
+
+def highlight(content, query, width=120):
+    """从正文中截取包含查询词的片段，并用<mark>标出查询词"""
+    plain = strip_html(content)
+    terms = sorted({term.lower() for term in (query or '').split() if term}, key=len, reverse=True)
+    if not terms:
+        return Markup(escape(plain[:width]))
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+    match = pattern.search(plain)
+    start = max(0, match.start() - width // 3) if match else 0
+    fragment = plain[start:start + width]
+    parts = []
+    position = 0
+    for found in pattern.finditer(fragment):
+        parts.append(escape(fragment[position:found.start()]))
+        parts.append(Markup('<mark>') + escape(found.group()) + Markup('</mark>'))
+        position = found.end()
+    parts.append(escape(fragment[position:]))
+    prefix = '...' if start > 0 else ''
+    suffix = '...' if start + width < len(plain) else ''
+    return Markup(prefix) + Markup('').join(parts) + Markup(suffix)
@@ -0,0 +1,88 @@
+import json
+import zlib
+from collections import Counter
+
+
+class SpaceSaving:
+    """可合并的高频项草图（Space-Saving算法），用于统计热门页面、文章等
+
+    最多保存capacity个计数器，每个计数器记录(计数, 误差)：计数是真实次数的上界，计数减误差是下界，
+    真实次数超过total/capacity的项一定在草图中。合并采用可合并摘要的做法：不在一方草图中的项
+    按该方被丢弃项的次数上界估计，相加后保留计数最大的capacity项。序列化时使用zlib压缩的JSON。
+    """
+
+    def __init__(self, capacity=100, counters=None, total=0, floor=0):
+        if capacity < 1:
+            raise ValueError('capacity must be positive')
+        self.capacity = capacity
+        self.counters = dict(counters or {})  # 项 -> (计数, 误差)
+        self.total = total
+        self.floor = floor  # 已丢弃的项的次数上界
+
+    @classmethod
+    def from_counts(cls, counts, capacity=100):
+        """由精确计数{项: 次数}构造，超过capacity项时只保留次数最多的"""
+        counts = Counter(counts)
+        items = counts.most_common(capacity)
+        floor = items[-1][1] if len(counts) > capacity else 0
+        return cls(capacity, {item: (count, 0) for item, count in items}, sum(counts.values()), floor)
+
+    def _missing(self):
+        """不在草图中的项的次数上界：草图未满时为已丢弃项的上界，满了以后不超过最小计数"""
+        if len(self.counters) < self.capacity:
+            return self.floor
+        return max(self.floor, min(count for count, _ in self.counters.values()))
+
+    def update(self, items):
+        """累计一批项，返回草图本身"""
+        merged = self.merge(self.from_counts(Counter(items), self.capacity))
+        self.counters, self.total, self.floor = merged.counters, merged.total, merged.floor
+        return self
+
+    def merge(self, other):
+        """合并另一个草图，返回新的草图（容量取两者中较大的）"""
+        capacity = max(self.capacity, other.capacity)
+        left_missing = self._missing()
+        right_missing = other._missing()
+        counters = {}
+        for item in self.counters.keys() | other.counters.keys():
+            left_count, left_error = self.counters.get(item, (left_missing, left_missing))
+            right_count, right_error = other.counters.get(item, (right_missing, right_missing))
+            counters[item] = (left_count + right_count, left_error + right_error)
+        floor = left_missing + right_missing
+        if len(counters) > capacity:
+            kept = sorted(counters.items(), key=lambda item: item[1][0], reverse=True)
+            floor = max(floor, kept[capacity][1][0])
+            counters = dict(kept[:capacity])
+        return SpaceSaving(capacity, counters, self.total + other.total, floor)
+
+    def top(self, n=10):
+        """计数最多的n项，返回[(项, 计数, 误差)]"""
+        items = sorted(self.counters.items(), key=lambda item: (-item[1][0], item[0]))[:n]
+        return [(item, count, error) for item, (count, error) in items]
+
+    def __len__(self):
+        return len(self.counters)
+
+    def to_bytes(self):
+        data = {
+            'capacity': self.capacity,
+            'total': self.total,
+            'floor': self.floor,
+            'counters': [[item, count, error] for item, (count, error) in self.counters.items()],
+        }
+        return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 1)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = json.loads(zlib.decompress(data))
+        counters = {item: (count, error) for item, count, error in data['counters']}
+        return cls(data['capacity'], counters, data['total'], data['floor'])
+
+    @classmethod
+    def merge_all(cls, sketches, capacity=100):
+        """合并多个草图，没有草图时返回容量为capacity的空草图"""
+        result = None
+        for sketch in sketches:
+            result = sketch if result is None else result.merge(sketch)
+        return result if result is not None else cls(capacity)
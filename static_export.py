@@ -0,0 +1,174 @@
+"""把前台页面预渲染为静态HTML文件，由nginx直接提供给读者
+
+每个页面写入<输出目录><路径>/index.html。导出状态保存在输出目录的.export-state.json中，
+再次导出时只重新渲染上次导出后有变化的文章及受其影响的页面。
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from urllib.parse import unquote
+
+from flask import url_for
+from app import app, db, Post, Comment, RelatedPost
+from tagging import parse_tags
+
+STATE_FILE = '.export-state.json'
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def page_path(output, url):
+    """URL对应的文件路径，路径超出输出目录或含有'.'、'..'段（如分类名为'..'、标签名为'a/..'）时返回None
+
+    标签名中可以有'/'，含有'..'段的路径即使仍在输出目录中，也可能覆盖其他页面。
+    """
+    relative = unquote(url).strip('/')
+    if any(part in ('.', '..') for part in relative.split('/')):
+        return None
+    directory = os.path.normpath(os.path.join(output, relative))
+    if not directory.startswith(output + os.sep):
+        return None
+    return os.path.join(directory, 'index.html')
+
+
+def load_state(output):
+    try:
+        with open(os.path.join(output, STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(output, state):
+    path = os.path.join(output, STATE_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+def configure_export():
+    # 渲染时不记录访问、不使用页面缓存，评论表单改为指向动态页面的链接
+    app.config.update(TRACK_PAGE_VIEWS=False, PAGE_CACHE_ENABLED=False, STATIC_EXPORT=True)
+
+
+def _init_worker():
+    configure_export()
+    # fork出的进程不能复用父进程的数据库连接
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def render_pages(output, urls):
+    """在当前进程中渲染一组页面并写入文件，返回写入的页面数"""
+    client = app.test_client()
+    written = 0
+    for url in urls:
+        response = client.get(url)
+        if response.status_code != 200:
+            continue
+        path = page_path(output, url)
+        if path is None:
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(response.get_data())
+        os.replace(path + '.tmp', path)
+        written += 1
+    return written
+
+
+def plan(state, full):
+    """计算需要渲染的页面和需要删除的页面，返回(渲染URL列表, 删除URL列表, 新状态)"""
+    with app.test_request_context():
+        rows = db.session.query(Post.slug, Post.category, Post.tags).all()
+        posts = {slug: category for slug, category, _ in rows}
+        post_tags = {slug: parse_tags(tags) for slug, _, tags in rows}
+        categories = {category for category in posts.values() if category}
+        tags = {name for names in post_tags.values() for name in names}
+        related_posts = {}
+        related = db.aliased(Post)
+        for slug, related_slug in db.session.query(Post.slug, related.slug).join(
+                RelatedPost, RelatedPost.post_id == Post.id).join(related, related.id == RelatedPost.related_id) \
+                .order_by(Post.id, RelatedPost.score.desc()):
+            related_posts.setdefault(slug, []).append(related_slug)
+        new_state = {'posts': posts, 'tags': post_tags, 'related': related_posts}
+        post_url = lambda slug: url_for('post_detail', slug=slug)
+        category_url = lambda category: url_for('category_posts', category=category)
+        tag_url = lambda tag: url_for('tag_posts', tag=tag)
+        index_url = url_for('index')
+
+        # 旧版本的导出状态没有记录标签和相关文章，需要完整导出一次
+        if full or state is None or 'tags' not in state or 'related' not in state:
+            urls = [index_url] + [category_url(c) for c in sorted(categories)] + \
+                [tag_url(t) for t in sorted(tags)] + [post_url(s) for s in posts]
+            return urls, [], new_state
+
+        since = datetime.strptime(state['exported_at'], TIME_FORMAT)
+        old_posts = state['posts']
+        old_categories = {category for category in old_posts.values() if category}
+        old_post_tags = state['tags']
+        old_tags = {name for names in old_post_tags.values() for name in names}
+        changed = {slug for (slug,) in db.session.query(Post.slug).filter(Post.updated_at > since)}
+        # 新评论不会更新文章的updated_at，单独查询
+        changed |= {slug for (slug,) in db.session.query(Post.slug).join(Comment, Comment.post_id == Post.id)
+                    .filter(Comment.created_at > since).distinct()}
+        changed |= {slug for slug, category in posts.items() if old_posts.get(slug, category) != category}
+        removed = set(old_posts) - set(posts)
+        old_related = state['related']
+        # 相关文章列表变化，或列表中的文章有修改（标题等）时，详情页需要重新渲染
+        related_changed = {slug for slug in posts if related_posts.get(slug, []) != old_related.get(slug, [])}
+        related_changed |= {slug for slug, slugs in related_posts.items() if changed.intersection(slugs)}
+        if not changed and not removed and not related_changed:
+            return [], [], new_state
+
+        affected_categories = {posts.get(slug) for slug in changed} | {old_posts.get(slug) for slug in changed | removed}
+        affected_categories -= {None}
+        urls = {index_url} | {post_url(slug) for slug in changed | related_changed}
+        if categories != old_categories:
+            # 分类导航变化，所有分类页都需要重新渲染
+            affected_categories |= categories
+        urls |= {category_url(category) for category in affected_categories & categories}
+        affected_tags = set()
+        for slug in changed | removed:
+            affected_tags.update(post_tags.get(slug, ()), old_post_tags.get(slug, ()))
+        urls |= {tag_url(tag) for tag in affected_tags & tags}
+        stale = [post_url(slug) for slug in removed] + [category_url(c) for c in old_categories - categories] + \
+            [tag_url(t) for t in old_tags - tags]
+        return sorted(urls), stale, new_state
+
+
+def export(output, workers=None, full=False, echo=print):
+    started = time.perf_counter()
+    exported_at = datetime.utcnow()
+    output = os.path.abspath(output)
+    os.makedirs(output, exist_ok=True)
+    state = load_state(output)
+    urls, stale, new_state = plan(state, full)
+
+    for url in stale:
+        path = page_path(output, url)
+        if path is not None:
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+    configure_export()
+    workers = workers or os.cpu_count() or 1
+    written = 0
+    if urls:
+        if workers == 1 or len(urls) < workers * 2:
+            written = render_pages(output, urls)
+        else:
+            chunks = [urls[i::workers] for i in range(workers)]
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker) as pool:
+                written = sum(pool.map(render_pages, [output] * len(chunks), chunks))
+
+    new_state['exported_at'] = exported_at.strftime(TIME_FORMAT)
+    save_state(output, new_state)
+    elapsed = time.perf_counter() - started
+    rate = written / elapsed if elapsed else 0
+    echo(f'渲染 {written} 个页面，删除 {len(stale)} 个页面，耗时 {elapsed:.2f} 秒（{rate:.1f} 页/秒）')
+    return written
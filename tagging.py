@@ -0,0 +1,58 @@
+"""文章标签的规范化存储
+
+Post.tags仍保存用户输入的逗号分隔字符串，另外维护tag和post_tag两张表：
+post_tag冗余了文章的发布时间，标签页按(tag_id, created_at)索引分页；
+tag.post_count在文章保存和删除时增量更新，标签云和标签计数不需要扫描文章表。
+"""
+import re
+from sqlalchemy import text
+
+MAX_TAG_LENGTH = 50
+
+_SEPARATOR = re.compile('[,，]')
+
+
+def parse_tags(value):
+    """拆分逗号分隔的标签字符串（支持中英文逗号），去掉空白和重复的标签"""
+    names = []
+    for name in _SEPARATOR.split(value or ''):
+        name = name.strip()[:MAX_TAG_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def post_tag_names(conn, post_id):
+    rows = conn.execute(
+        text('SELECT tag.name FROM post_tag JOIN tag ON tag.id = post_tag.tag_id WHERE post_tag.post_id = :id'),
+        {'id': post_id}
+    )
+    return {row[0] for row in rows}
+
+
+def sync_post(conn, post_id, names):
+    """把文章的标签关联更新为names，并增量调整标签的文章数，返回有变化的标签名
+
+    需在文章写入的同一事务中、文章行已写入数据库后调用。
+    """
+    old = post_tag_names(conn, post_id)
+    new = set(names)
+    added = [{'name': name, 'post_id': post_id} for name in new - old]
+    removed = [{'name': name, 'post_id': post_id} for name in old - new]
+    if added:
+        conn.execute(text('INSERT INTO tag (name, post_count) VALUES (:name, 0) ON CONFLICT (name) DO NOTHING'), added)
+        conn.execute(text(
+            'INSERT INTO post_tag (tag_id, post_id, created_at) '
+            'SELECT tag.id, post.id, post.created_at FROM tag, post WHERE tag.name = :name AND post.id = :post_id'
+        ), added)
+        conn.execute(text('UPDATE tag SET post_count = post_count + 1 WHERE name = :name'), added)
+    if removed:
+        conn.execute(text(
+            'DELETE FROM post_tag WHERE post_id = :post_id AND tag_id = (SELECT id FROM tag WHERE name = :name)'
+        ), removed)
+        conn.execute(text('UPDATE tag SET post_count = post_count - 1 WHERE name = :name'), removed)
+    return (new - old) | (old - new)
+
+
+def remove_post(conn, post_id):
+    return sync_post(conn, post_id, ())
@@ -0,0 +1,140 @@
+"""访问记录的流式热门统计
+
+写入访问记录的线程把每批记录交给TopListStream，按天、按维度累计到Space-Saving草图中，
+内存占用与访问量无关。每隔snapshot_interval秒把累计的增量合并进page_view_top_list表中
+当天的草图（各进程的增量可以直接相加），仪表盘读取最近几天的草图合并后取前几名，
+不需要对page_view表做GROUP BY。
+
+维度：
+- url：所有访问的路径；
+- post：非爬虫访问的文章详情页，值为文章slug；
+- referrer：从其他网站链接过来的访问的来源域名；
+- user_agent：浏览器家族，爬虫和脚本为"bot:名称"。
+"""
+import functools
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+from spacesaving import SpaceSaving
+
+DIMENSIONS = ('url', 'post', 'referrer', 'user_agent')
+BOT_PREFIX = 'bot:'
+
+_POST_URL = re.compile(r'^/blog/post/([^/]+)$')
+_BOT_TOKEN = re.compile(r'[\w.-]*(?:bot|crawl|spider|slurp)[\w.-]*', re.IGNORECASE)
+_SCRIPT = re.compile(r'\b(?:curl|wget|python-requests|python-urllib|go-http-client|okhttp|httpx|aiohttp|scrapy|'
+                     r'libwww-perl|HeadlessChrome|PhantomJS)\b', re.IGNORECASE)
+# 按顺序匹配，Edge和Opera的User-Agent中也包含Chrome和Safari
+_BROWSERS = (
+    ('Edge', re.compile(r'\bEdg(?:e|A|iOS)?/')),
+    ('Opera', re.compile(r'\bOPR/|\bOpera\b')),
+    ('Firefox', re.compile(r'\b(?:Firefox|FxiOS)/')),
+    ('Chrome', re.compile(r'\b(?:Chrome|CriOS)/')),
+    ('Safari', re.compile(r'\bAppleWebKit/.*\b(?:Safari|Mobile)/')),
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def user_agent_family(user_agent):
+    """把User-Agent归为浏览器家族，爬虫和脚本返回bot:名称；同样的User-Agent反复出现，结果缓存"""
+    if not user_agent:
+        return 'Unknown'
+    match = _BOT_TOKEN.search(user_agent) or _SCRIPT.search(user_agent)
+    if match:
+        return BOT_PREFIX + match.group(0)
+    for family, pattern in _BROWSERS:
+        if pattern.search(user_agent):
+            return family
+    return 'Other'
+
+
+def referrer_host(referrer, host=None):
+    """来源地址的域名，没有来源或来自本站（host）时返回None"""
+    if not referrer:
+        return None
+    try:
+        hostname = urlsplit(referrer).hostname
+    except ValueError:
+        return None
+    if not hostname or (host and hostname == urlsplit('//' + host).hostname):
+        return None
+    return hostname
+
+
+def post_slug(url):
+    match = _POST_URL.match(url)
+    return match.group(1) if match else None
+
+
+def dimension_values(row):
+    """一条访问记录在各维度上的取值，返回[(维度, 值)]"""
+    family = user_agent_family(row.get('user_agent'))
+    values = [('url', row['url']), ('user_agent', family)]
+    slug = post_slug(row['url'])
+    if slug and not family.startswith(BOT_PREFIX):
+        values.append(('post', slug))
+    host = referrer_host(row.get('referrer'), row.get('host'))
+    if host:
+        values.append(('referrer', host))
+    return values
+
+
+def day_bucket(created_at):
+    return created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def count_top_lists(rows, capacity):
+    """把一批访问记录按(天, 维度)累计为草图，返回{(天, 维度): SpaceSaving}"""
+    values = {}
+    for row in rows:
+        day = day_bucket(row['created_at'])
+        for dimension, value in dimension_values(row):
+            values.setdefault((day, dimension), []).append(value)
+    return {key: SpaceSaving.from_counts(items, capacity) for key, items in values.items()}
+
+
+class TopListStream:
+    """进程内累计、尚未保存的热门统计增量，线程安全"""
+
+    def __init__(self, capacity=200, snapshot_interval=60.0):
+        self.capacity = capacity
+        self.snapshot_interval = snapshot_interval
+        self._pending = {}  # (天, 维度) -> SpaceSaving
+        self._lock = threading.Lock()
+        self._last_snapshot = time.monotonic()
+        # 统计计数
+        self.observed = 0
+        self.snapshots = 0
+
+    def _add(self, sketches):
+        for key, sketch in sketches.items():
+            pending = self._pending.get(key)
+            self._pending[key] = sketch if pending is None else pending.merge(sketch)
+
+    def observe(self, rows):
+        """累计一批已写入数据库的访问记录"""
+        sketches = count_top_lists(rows, self.capacity)
+        with self._lock:
+            self._add(sketches)
+            self.observed += len(rows)
+
+    def due(self):
+        return bool(self._pending) and time.monotonic() - self._last_snapshot >= self.snapshot_interval
+
+    def take(self):
+        """取出全部增量用于保存，返回{(天, 维度): SpaceSaving}"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_snapshot = time.monotonic()
+            if pending:
+                self.snapshots += 1
+        return pending
+
+    def restore(self, pending):
+        """保存失败时放回取出的增量"""
+        with self._lock:
+            self._add(pending)
+
+    def stats(self):
+        return {'pending': len(self._pending), 'observed': self.observed, 'snapshots': self.snapshots}